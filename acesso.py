@@ -0,0 +1,66 @@
+# acesso.py
+# Usuários e permissões compilados uma vez por conteúdo dos secrets ([auth] e [permissoes]).
+import hashlib
+import hmac
+import json
+
+TODAS = "ALL"  # permissão de administrador (todas as UFs)
+
+
+def _hash(senha):
+    return hashlib.sha256(str(senha).encode()).hexdigest()
+
+
+def impressao(auth, permissoes):
+    """Digest das seções [auth] e [permissoes]: muda só quando os secrets mudam."""
+    dados = json.dumps([dict(auth or {}), dict(permissoes or {})], sort_keys=True, default=str)
+    return hashlib.sha256(dados.encode()).hexdigest()
+
+
+class Usuario:
+    """Permissões já resolvidas de um usuário.
+
+    `ufs` é a lista como no secrets (["ALL"] para admin); `ufs_filtro` é o
+    que os filtros do Snapshot recebem: None para admin (todas as UFs) ou um
+    frozenset de UFs normalizadas, o mesmo para todo usuário com a mesma
+    permissão (e portanto a mesma chave no cache de da_uf).
+    """
+
+    __slots__ = ("nome", "hash_senha", "ufs", "admin", "ufs_filtro")
+
+    def __init__(self, nome, hash_senha, permissao):
+        self.nome = nome
+        self.hash_senha = hash_senha
+        if str(permissao or "").strip().upper() == TODAS:
+            self.ufs = [TODAS]
+        else:
+            self.ufs = [u.strip().upper() for u in str(permissao or "").split(",") if u.strip()]
+        self.admin = TODAS in self.ufs
+        self.ufs_filtro = None if self.admin else frozenset(self.ufs)
+
+
+SEM_ACESSO = Usuario("", None, "")
+
+
+class Registro:
+    """Usuários e permissões do processo. Montado por impressao() dos secrets."""
+
+    def __init__(self, auth, permissoes):
+        auth, permissoes = dict(auth or {}), dict(permissoes or {})
+        self.usuarios = {
+            nome: Usuario(nome, _hash(auth[nome]) if nome in auth else None, permissoes.get(nome, ""))
+            for nome in set(auth) | set(permissoes)
+        }
+        # conjuntos iguais viram o mesmo objeto (chaves de cache compartilhadas)
+        iguais = {}
+        for u in self.usuarios.values():
+            if u.ufs_filtro is not None:
+                u.ufs_filtro = iguais.setdefault(u.ufs_filtro, u.ufs_filtro)
+
+    def usuario(self, nome):
+        return self.usuarios.get(nome, SEM_ACESSO)
+
+    def verificar(self, nome, senha):
+        """True se `senha` confere com a do usuário (comparação em tempo constante)."""
+        hash_salvo = self.usuario(nome).hash_senha
+        return bool(hash_salvo) and hmac.compare_digest(hash_salvo, _hash(senha))
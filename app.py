@@ -1,25 +1,46 @@
 # app.py
 import streamlit as st
 import pandas as pd
-import hashlib
 from datetime import datetime
 import io
-import requests
-import base64
 import os
 import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import acesso
+import armazenamento
+import audit_log
+import engine
+import exportacao
+import github_api
+import importacao
+import journal
+import metricas
+import particoes
+import versoes
 
 # =========================
 # CONFIGURAÇÃO - GitHub / Arquivos
 # =========================
 REPO_RAW_BASE = "https://raw.githubusercontent.com/otavilobato/pecas1/main"
-REPO_API_BASE = "https://api.github.com/repos/otavilobato/pecas1/contents"
+REPO_API_BASE = armazenamento.REPO_API_BASE  # onde ficam planilha, journal e arquivos por UF
 
 EXCEL_RAW_URL = f"{REPO_RAW_BASE}/SALDO_PECAS.xlsx"
-EXCEL_API_URL = f"{REPO_API_BASE}/SALDO_PECAS.xlsx"
 
 LOGS_RAW_URL = f"{REPO_RAW_BASE}/logs.csv"
-LOGS_API_URL = f"{REPO_API_BASE}/logs.csv"
+LOGS_API_URL = f"{REPO_API_BASE}/logs.csv"          # arquivo único antigo (só leitura até migrar)
+LOGS_PARTICOES_URL = f"{REPO_API_BASE}/logs"         # logs/AAAA-MM.csv + logs/manifest.json
+LOG_GRANULARIDADE = "mes"                            # ou "dia"
+
+# Atualização em segundo plano: a thread revalida a cada ATUALIZACAO_INTERVALO;
+# a página só consulta a API sozinha se a thread ficar REVALIDACAO_MAXIMA sem rodar
+ATUALIZACAO_INTERVALO = 5   # segundos
+REVALIDACAO_MAXIMA = 300    # segundos
+ESPERA_ATUALIZACAO = 15     # segundos que o botão "Atualizar agora" espera pela API
+
+# Snapshots parseados da planilha, por sha do blob (sobrevivem a reinícios do processo)
+SNAPSHOT_DIR = os.getenv("PECAS_CACHE_DIR", ".cache_pecas")
 
 # =========================
 # CREDENCIAIS / USUÁRIOS (via secrets)
@@ -28,42 +49,26 @@ LOGS_API_URL = f"{REPO_API_BASE}/logs.csv"
 # [token] GITHUB_TOKEN = "..."
 # [auth] ... users ...
 # [permissoes] ... mapping ...
-RAW_USERS = st.secrets["auth"]
-USUARIOS = {u: hashlib.sha256(RAW_USERS[u].encode()).hexdigest() for u in RAW_USERS}
+# Hashes e permissões são montados uma vez por processo (acesso.Registro) e
+# só refeitos quando o conteúdo dessas seções muda; a cada rerun só a
+# impressão dos secrets é recalculada.
+@st.cache_resource(max_entries=1)
+def _registro_acesso(impressao, _auth, _permissoes):
+    return acesso.Registro(_auth, _permissoes)
 
+RAW_USERS = st.secrets["auth"]
 RAW_PERMISSOES = st.secrets["permissoes"]
-PERMISSOES = {
-    user: (["ALL"] if RAW_PERMISSOES[user] == "ALL" else RAW_PERMISSOES[user].split(","))
-    for user in RAW_PERMISSOES
-}
+ACESSO = _registro_acesso(acesso.impressao(RAW_USERS, RAW_PERMISSOES), RAW_USERS, RAW_PERMISSOES)
 
 def ufs_do_usuario(usuario):
-    return PERMISSOES.get(usuario, [])
+    return ACESSO.usuario(usuario).ufs
 
-def is_admin(usuario):
-    ufs = ufs_do_usuario(usuario)
-    return "ALL" in ufs
+def ufs_filtro(usuario):
+    # None (todas) para admin; senão o conjunto de UFs que os filtros do snapshot recebem
+    return ACESSO.usuario(usuario).ufs_filtro
 
-# =========================
-# UTILITÁRIOS: datas e parsing
-# =========================
-def parse_data_possivel(valor):
-    if isinstance(valor, datetime):
-        return valor
-    if pd.isna(valor):
-        return None
-    try:
-        if isinstance(valor, (int, float)):
-            # Excel numeric date fallback
-            return datetime.fromordinal(datetime(1900, 1, 1).toordinal() + int(valor) - 2)
-        for fmt in ("%d/%m/%Y", "%d/%m/%y", "%Y-%m-%d"):
-            try:
-                return datetime.strptime(str(valor).strip(), fmt)
-            except ValueError:
-                continue
-        return None
-    except:
-        return None
+def is_admin(usuario):
+    return ACESSO.usuario(usuario).admin
 
 # =========================
 # FUNÇÕES GERAIS DE I/O COM GITHUB
@@ -84,167 +89,274 @@ def get_github_token():
 
     return token
 
-def _get_headers():
-    token = get_github_token()
-    return {"Authorization": f"token {token}"} if token else {}
+@st.cache_resource
+def _sessao_github():
+    # Uma sessão por processo: conexões keep-alive, timeout e retry (github_api.SessaoGitHub);
+    # o token vai no cabeçalho da sessão, lido uma vez só
+    return github_api.SessaoGitHub(get_github_token())
+
+# =========================
+# VERSÃO DOS DADOS (invalidação do st.cache_data por conjunto)
+# - Funções com cache_data recebem versao(<conjunto>) como argumento; uma
+#   gravação só incrementa a versão do conjunto gravado
+# - Hoje só os logs passam por cache_data. A planilha não precisa de versão:
+#   o snapshot é um por sha, e cada gravação já troca o snapshot em memória
+#   (ArquivoRevalidado.registrar_escrita)
+# =========================
+LOGS = "logs"
+
+@st.cache_resource
+def _versoes():
+    return versoes.VersoesDeDados()
+
+def versao(conjunto):
+    return _versoes().atual(conjunto)
+
+def dados_alterados(conjunto):
+    _versoes().incrementar(conjunto)
 
 # =========================
 # CARREGAMENTO DO EXCEL (USANDO API DO GITHUB)
-# - Cache reduzido (ttl=2) PARA MINIMIZAR ESPELHAMENTO
+# - Stale-while-revalidate: a página lê o último snapshot em memória e uma
+#   thread do processo (_atualizador) revalida, parseia e aquece as versões
+#   novas a cada ATUALIZACAO_INTERVALO segundos
 # - Leitura via API (conteúdo base64) evita delay do CDN raw.githubusercontent
+# - Revalidação por ETag: se o arquivo não mudou (304) reaproveita o snapshot já lido
+# - Snapshot em disco por sha: um sha já visto não passa de novo pelo openpyxl
+# - O snapshot (engine.Snapshot) é compartilhado por todas as sessões e guarda
+#   o que é derivado da planilha (datas normalizadas etc.), calculado uma vez por versão
+# - Edições de linha não regravam a planilha: vão para o journal e são
+#   aplicadas sobre ela na leitura; a compactação incorpora o journal na planilha
 # =========================
-@st.cache_data(ttl=2)
-def carregar_planilha_principal():
-    headers = _get_headers()
+@st.cache_resource
+def _planilha_unica():
+    return armazenamento.planilha_unica(sessao=_sessao_github(), dir_cache=SNAPSHOT_DIR,
+                                        intervalo=REVALIDACAO_MAXIMA)
+
+@st.cache_resource
+def _planilha_por_uf():
+    return armazenamento.planilha_por_uf(sessao=_sessao_github(), dir_cache=SNAPSHOT_DIR,
+                                         intervalo=REVALIDACAO_MAXIMA)
+
+def _planilha(esperar=True):
+    # leituras passam esperar=False: na partida a frio sem manifesto no disco
+    # servem a planilha única até a thread de atualização ler o manifesto
+    return armazenamento.escolher(_planilha_unica(), _planilha_por_uf(), esperar)
+
+@st.cache_resource
+def _atualizador():
+    # roda fora do contexto do Streamlit: usa os objetos já criados, não as funções em cache
+    unica, por_uf = _planilha_unica(), _planilha_por_uf()
+    ultimo = None
+
+    def atualizar_planilha():
+        nonlocal ultimo
+        por_uf.atualizar_manifesto()
+        if por_uf.ativa():
+            # só as UFs que alguma sessão já pediu; as junções em uso saem aquecidas
+            status, versao_atual = por_uf.atualizar()
+        else:
+            status, versao_atual = unica.atualizar()
+            if versao_atual is not None and versao_atual is not ultimo:
+                versao_atual.aquecer()
+        if status not in (200, 304):
+            raise IOError(f"código {status} ao ler a planilha")
+        if versao_atual is not None:
+            ultimo = versao_atual
+
+    return github_api.Atualizador([atualizar_planilha], intervalo=ATUALIZACAO_INTERVALO,
+                                  nome="atualizador-planilha")
+
+def _ler_planilha(planilha, filtro):
+    # sem Streamlit: também roda nas threads de pré-carga
+    if isinstance(planilha, particoes.PlanilhaPorUF):
+        return planilha.obter(ufs=filtro)
+    return planilha.obter()
+
+def obter_planilha():
+    """Snapshot atual da planilha (somente leitura). Para editar use registrar_operacoes().
+
+    No layout por UF traz só as UFs do usuário logado (todas para admin).
+    """
     try:
-        # USAR API do GitHub para obter o conteúdo (base64)
-        r = requests.get(EXCEL_API_URL, headers=headers)
-        if r.status_code == 200:
-            j = r.json()
-            # O campo 'content' vem base64-encoded; pode vir com quebras de linha
-            content_b64 = j.get("content", "")
-            if not content_b64:
+        _atualizador()
+        status, snap = _ler_planilha(_planilha(esperar=False), ufs_filtro(st.session_state.get("usuario")))
+        if status in (200, 304):
+            if snap is None:
                 st.error("❌ Arquivo encontrado, mas conteúdo vazio.")
-                return pd.DataFrame()
-            content_bytes = base64.b64decode(content_b64)
-            return pd.read_excel(io.BytesIO(content_bytes), sheet_name="PRINCIPAL")
+                return engine.Snapshot(pd.DataFrame())
+            return snap
         else:
             # fallback informativo
-            st.error(f"❌ Falha ao carregar planilha (código {r.status_code}).")
-            return pd.DataFrame()
+            st.error(f"❌ Falha ao carregar planilha (código {status}).")
+            return engine.Snapshot(pd.DataFrame())
     except Exception as e:
         st.error(f"Erro ao tentar carregar planilha: {e}")
-        return pd.DataFrame()
+        return engine.Snapshot(pd.DataFrame())
 
-def salvar_planilha_principal(df):
+def carregar_planilha_principal():
+    return engine.para_editar(obter_planilha().df)
+
+def registrar_operacoes(ops, descricao):
+    # Grava operações de linha (journal.inserir / atualizar / remover) num único commit
     try:
-        token = get_github_token()
-        if not token:
+        if not get_github_token():
             st.error("❌ Token do GitHub não configurado.")
             return False
+        commit_message = f"{descricao} ({datetime.now().strftime('%d/%m/%Y %H:%M')})"
+        ok, erro = _planilha().registrar(ops, mensagem=commit_message)
+        if not ok:
+            st.error(f"Erro ao salvar no GitHub: {erro}")
+        return ok
+    except Exception as e:
+        st.error(f"Erro ao tentar salvar: {e}")
+        return False
 
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df.to_excel(writer, sheet_name="PRINCIPAL", index=False)
-        content = output.getvalue()
-        encoded_content = base64.b64encode(content).decode("utf-8")
-
-        headers = {"Authorization": f"token {token}"}
-        resp_get = requests.get(EXCEL_API_URL, headers=headers)
-        sha = resp_get.json().get("sha") if resp_get.status_code == 200 else None
+# Regrava a planilha inteira (migrações / correções em massa). `base` é o
+# snapshot de obter_planilha() a partir do qual df foi editado: a gravação
+# leva o sha dele e, se alguém gravou antes, as linhas não conflitantes são
+# mescladas automaticamente (journal.PlanilhaComJournal.substituir).
+def salvar_planilha_principal(df, base):
+    try:
+        if not get_github_token():
+            st.error("❌ Token do GitHub não configurado.")
+            return False
 
         commit_message = f"Atualização automática SALDO_PECAS ({datetime.now().strftime('%d/%m/%Y %H:%M')})"
-        data = {"message": commit_message, "content": encoded_content}
-        if sha:
-            data["sha"] = sha
-
-        resp_put = requests.put(EXCEL_API_URL, headers=headers, json=data)
-        if resp_put.status_code in (200, 201):
-            # Limpa cache imediatamente para forçar leitura atualizada
-            try:
-                st.cache_data.clear()
-            except Exception:
-                pass
+        ok, erro, conflitos = _planilha().substituir(df, base, mensagem=commit_message)
+        if ok:
             return True
-        else:
-            st.error(f"Erro ao salvar planilha no GitHub: {resp_put.status_code}")
-            st.text(resp_put.text)
-            return False
+        st.error(f"Erro ao salvar planilha no GitHub: {erro}")
+        if conflitos:
+            st.text("Linhas em conflito: " + ", ".join(map(str, conflitos)))
+        return False
     except Exception as e:
         st.error(f"Erro ao tentar salvar planilha: {e}")
         return False
 
 # =========================
-# LOGS: carregar / salvar / registrar (também usando API)
+# LOGS: carregar / registrar (também usando API)
+# - registrar_log só grava no spool local (logs_local.csv), sem rede
+# - uma thread de fundo anexa os eventos pendentes à partição do mês
+#   (logs/AAAA-MM.csv) em um commit por intervalo (LOG_INTERVALO_ENVIO) ou
+#   por lote (LOG_LOTE_ENVIO); logs/manifest.json lista as partições
+# - a página de logs só baixa as partições do período escolhido
 # =========================
-@st.cache_data(ttl=2)
-def carregar_logs():
-    headers = _get_headers()
+LOG_COLS = ["data_hora","usuario","acao","detalhes","antes","depois"]
+LOG_SPOOL = "logs_local.csv"
+LOG_INTERVALO_ENVIO = 15  # segundos
+LOG_LOTE_ENVIO = 50       # eventos
+
+def _ler_logs_bytes(content_bytes):
+    return pd.read_csv(io.BytesIO(content_bytes), dtype=str, keep_default_na=False)
+
+@st.cache_resource
+def _logs_remotos():
+    # logs.csv antigo, anterior às partições
+    return github_api.ArquivoRevalidado(LOGS_API_URL, _ler_logs_bytes, sessao=_sessao_github(), intervalo=60)
+
+@st.cache_resource
+def _logs_particionados():
+    return audit_log.LogsParticionados(LOGS_PARTICOES_URL, LOG_COLS, sessao=_sessao_github(),
+                                       granularidade=LOG_GRANULARIDADE)
+
+def _legado_pendente():
+    # logs.csv ainda não foi copiado para as partições
+    return not _logs_particionados().ler_manifesto().get("legado_migrado")
+
+# versao_logs entra na chave: um envio deste processo invalida na hora; o TTL
+# cobre o que outros processos gravaram
+@st.cache_data(ttl=30, max_entries=50)
+def carregar_logs(inicio, fim, versao_logs):
+    """Eventos gravados no GitHub entre as datas inicio e fim (inclusive), mais recentes primeiro."""
     try:
-        r = requests.get(LOGS_API_URL, headers=headers)
-        if r.status_code == 200:
-            j = r.json()
-            content_b64 = j.get("content", "")
-            if content_b64:
-                content_bytes = base64.b64decode(content_b64)
-                df = pd.read_csv(io.BytesIO(content_bytes))
-                return df
-            else:
-                # arquivo pode estar vazio
-                cols = ["data_hora","usuario","acao","detalhes","antes","depois"]
-                return pd.DataFrame(columns=cols)
-        else:
-            cols = ["data_hora","usuario","acao","detalhes","antes","depois"]
-            return pd.DataFrame(columns=cols)
-    except Exception:
-        cols = ["data_hora","usuario","acao","detalhes","antes","depois"]
-        return pd.DataFrame(columns=cols)
+        df = _logs_particionados().carregar(inicio, fim)
+        if _legado_pendente():
+            status, legado = _logs_remotos().obter()
+            if status in (200, 304) and legado is not None:
+                df = pd.concat([df, audit_log.filtrar(legado, inicio, fim)], ignore_index=True)
+        return df
+    except Exception as e:
+        print("Erro ao carregar logs:", e)
+        return pd.DataFrame(columns=LOG_COLS)
 
-def salvar_logs(df_log):
-    try:
-        token = get_github_token()
-        if not token:
-            st.error("❌ Token do GitHub não configurado para salvar logs.")
-            return False
+LOGS_DIAS_PADRAO = 30  # período que a página de Logs abre (e que a pré-carga do login lê)
 
-        csv_bytes = df_log.to_csv(index=False).encode("utf-8")
-        encoded = base64.b64encode(csv_bytes).decode("utf-8")
-
-        headers = {"Authorization": f"token {token}"}
-        resp_get = requests.get(LOGS_API_URL, headers=headers)
-        sha = resp_get.json().get("sha") if resp_get.status_code == 200 else None
-
-        commit_message = f"Atualização automática logs ({datetime.now().strftime('%d/%m/%Y %H:%M')})"
-        data = {"message": commit_message, "content": encoded}
-        if sha:
-            data["sha"] = sha
-
-        resp_put = requests.put(LOGS_API_URL, headers=headers, json=data)
-        if resp_put.status_code in (200, 201):
-            # Limpa cache de logs para leitura imediata
-            try:
-                st.cache_data.clear()
-            except Exception:
-                pass
-            return True
-        else:
-            st.error(f"Erro ao salvar logs no GitHub: {resp_put.status_code}")
-            st.text(resp_put.text)
-            return False
-    except Exception as e:
-        st.error(f"Erro ao tentar salvar logs: {e}")
+def periodo_logs_padrao():
+    hoje = datetime.today().date()
+    return hoje - pd.Timedelta(days=LOGS_DIAS_PADRAO), hoje
+
+def _enviar_lote_logs(linhas_csv, n_eventos):
+    # Roda na thread da fila: não pode usar st.error / st.text
+    if not get_github_token():
+        print("Token do GitHub não configurado para salvar logs.")
         return False
+    commit_message = f"Atualização automática logs ({datetime.now().strftime('%d/%m/%Y %H:%M')}, {n_eventos} eventos)"
+    ok = _logs_particionados().anexar_csv(linhas_csv, mensagem=commit_message)
+    if ok:
+        dados_alterados(LOGS)
+    return ok
+
+@st.cache_resource
+def _fila_logs():
+    return audit_log.FilaDeLogs(LOG_SPOOL, LOG_COLS, _enviar_lote_logs,
+                                intervalo=LOG_INTERVALO_ENVIO, lote=LOG_LOTE_ENVIO)
 
 def registrar_log(usuario, acao, detalhes="", antes=None, depois=None, salvar_remote=True):
     try:
-        df_log = carregar_logs()
         nova = {
             "data_hora": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
             "usuario": usuario,
             "acao": acao,
             "detalhes": detalhes,
-            "antes": json.dumps(antes, ensure_ascii=False) if antes is not None else "",
-            "depois": json.dumps(depois, ensure_ascii=False) if depois is not None else ""
+            "antes": json.dumps(antes, ensure_ascii=False, default=str) if antes is not None else "",
+            "depois": json.dumps(depois, ensure_ascii=False, default=str) if depois is not None else ""
         }
-        df_log = pd.concat([df_log, pd.DataFrame([nova])], ignore_index=True)
         if salvar_remote:
-            ok = salvar_logs(df_log)
-            if not ok:
-                try:
-                    df_log.to_csv("logs_local.csv", index=False)
-                except:
-                    pass
+            _fila_logs().registrar(nova)
         return True
     except Exception as e:
         print("Erro registrar_log:", e)
         return False
 
 # =========================
-# AUTENTICAÇÃO / LOGIN (com verificar_senha) e rerun seguro
+# PRÉ-CARGA NO LOGIN
+# - Assim que a senha confere, a planilha (só as UFs do usuário), as visões
+#   filtradas dele e, para admin, os logs do período padrão começam a ser
+#   lidos em paralelo, enquanto a Home é desenhada
+# - As leituras passam pelos mesmos objetos das páginas (ArquivoRevalidado,
+#   st.cache_data), então uma página aberta antes do fim espera a leitura em
+#   andamento em vez de baixar de novo
 # =========================
-def verificar_senha(hash_salvo, senha_digitada):
-    return hashlib.sha256(senha_digitada.encode()).hexdigest() == hash_salvo
+@st.cache_resource
+def _pool_precarga():
+    return ThreadPoolExecutor(max_workers=4, thread_name_prefix="precarga")
+
+def _precarregar_planilha(planilha, filtro):
+    with metricas.medir("precarga.planilha"):
+        status, snap = _ler_planilha(planilha, filtro)
+        if status not in (200, 304) or snap is None:
+            return
+        snap.aquecer()
+        if filtro is not None:
+            snap.da_uf(filtro)
+        snap.vencidas(datetime.today(), ufs=filtro)
+
+def _precarregar_logs(inicio, fim, versao_logs):
+    with metricas.medir("precarga.logs"):
+        carregar_logs(inicio, fim, versao_logs)
+
+def precarregar(usuario):
+    # tudo o que depende de st.* é resolvido aqui, na thread da sessão
+    _atualizador()
+    pool = _pool_precarga()
+    pool.submit(_precarregar_planilha, _planilha(esperar=False), ufs_filtro(usuario))
+    if is_admin(usuario):
+        pool.submit(_precarregar_logs, *periodo_logs_padrao(), versao(LOGS))
 
+# =========================
+# AUTENTICAÇÃO / LOGIN (com ACESSO.verificar) e rerun seguro
+# =========================
 def login_page():
     st.title("🔐 Login")
 
@@ -263,10 +375,10 @@ def login_page():
         if not usuario or not senha:
             st.error("Informe usuário e senha.")
         else:
-            hash_salvo = USUARIOS.get(usuario)
-            if hash_salvo and verificar_senha(hash_salvo, senha):
+            if ACESSO.verificar(usuario, senha):
                 st.session_state["usuario"] = usuario
                 st.session_state["pagina"] = "Home"
+                precarregar(usuario)
                 # registrar com o usuario efetivamente logado
                 registrar_log(st.session_state["usuario"], "LOGIN", "Login bem-sucedido")
                 # seta flag para rerun fora do form
@@ -283,13 +395,53 @@ def login_page():
 # =========================
 # FILTRAGEM POR USUÁRIO
 # =========================
-def filtrar_por_usuario(df, usuario):
-    ufs = ufs_do_usuario(usuario)
-    if "ALL" in ufs:
-        return df
-    if "UF" not in df.columns:
-        return df.iloc[0:0]
-    return df[df["UF"].isin(ufs)]
+# - Recebe o snapshot: admin ("ALL") usa a planilha inteira sem cópia e os
+#   demais usam o índice por UF do snapshot (mesmo DataFrame para o mesmo
+#   conjunto de UFs). O resultado é somente leitura.
+def filtrar_por_usuario(snap, usuario):
+    ufs = ufs_filtro(usuario)
+    if ufs is None:
+        return snap.df
+    if "UF" not in snap.df.columns:
+        return snap.df.iloc[0:0]
+    with metricas.medir("filtro.uf"):
+        return snap.da_uf(ufs)
+
+def buscar_do_usuario(snap, usuario, texto, substitutos=True):
+    # índice de busca do snapshot, só nas UFs do usuário
+    with metricas.medir("filtro.busca"):
+        return snap.buscar(texto, ufs=ufs_filtro(usuario), substitutos=substitutos)
+
+def vencidas_do_usuario(snap, usuario, hoje):
+    # busca binária no índice de vencimento do snapshot, só nas UFs do usuário
+    with metricas.medir("filtro.vencidas"):
+        return snap.vencidas(hoje, ufs=ufs_filtro(usuario))
+
+# =========================
+# EXPORTAÇÃO (arquivo gerado em blocos, só quando o usuário clica em Download)
+# =========================
+def exportar_dados(df, nome_arquivo, acao_log, descricao, chave, ocultar=()):
+    usuario = st.session_state["usuario"]
+    disponiveis = [c for c in df.columns if c not in ocultar]
+    with st.expander("⬇️ Exportar"):
+        colunas = st.multiselect("Colunas", disponiveis, default=disponiveis, key=f"{chave}_colunas")
+        col_filtro = st.selectbox("Filtrar pela coluna", ["(sem filtro)"] + disponiveis, key=f"{chave}_filtro")
+        texto = st.text_input("Contendo o texto", key=f"{chave}_texto") if col_filtro != "(sem filtro)" else ""
+        formato = st.radio("Formato", list(exportacao.FORMATOS), horizontal=True, key=f"{chave}_formato")
+
+        filtros = {col_filtro: texto} if texto else {}
+        n = len(exportacao.posicoes_filtradas(df, filtros))
+        extensao, mime, _sep = exportacao.FORMATOS[formato]
+        st.download_button(
+            f"Download {extensao.upper()} ({n} linhas)",
+            # callable: o Streamlit só gera o arquivo no clique, fora da execução da página
+            data=lambda: exportacao.para_buffer(exportacao.exportar(df, formato, colunas, filtros), extensao),
+            file_name=f"{nome_arquivo}.{extensao}",
+            mime=mime,
+            key=f"{chave}_download",
+            on_click=registrar_log,
+            args=(usuario, acao_log, f"{descricao} {extensao.upper()} ({n} linhas)"),
+        )
 
 # =========================
 # PÁGINA: CADASTRO
@@ -299,10 +451,9 @@ def pagina_cadastro():
     ufs_user = ufs_do_usuario(usuario)
 
     st.subheader("🧩 Cadastro de Peças")
-    df = carregar_planilha_principal()
 
     if "ALL" in ufs_user:
-        lista_uf = ["AM","BA","CE","DF","GO","MA","MG","PA","PE","RJ","TO"]
+        lista_uf = engine.UFS
     else:
         lista_uf = ufs_user
 
@@ -338,24 +489,83 @@ def pagina_cadastro():
             "DATA_FIM": data_contrato.strftime("%d/%m/%y"),
             "SLA": sla.upper(),
             "DATA_VERIFICACAO": datetime.now().strftime("%d/%m/%y"),
-            "STATUS": "DENTRO"
+            "STATUS": engine.status_da_data(data_contrato, datetime.today()),
+            **engine.campos_cliente(cliente.upper(), serial.upper(), data_contrato),
         }
 
         registrar_log(st.session_state["usuario"], "CADASTRO", f"FRU {fru.upper()}", antes=None, depois=nova_linha)
-        df = pd.concat([df, pd.DataFrame([nova_linha])], ignore_index=True)
-        ok = salvar_planilha_principal(df)
+        op = journal.inserir(nova_linha, usuario=usuario)
+        ok = registrar_operacoes([op], f"Cadastro FRU {fru.upper()}")
         if ok:
-            # Já limpamos o cache dentro de salvar_planilha_principal, mas reforçamos aqui
-            try:
-                st.cache_data.clear()
-            except Exception:
-                pass
             st.success("Peça cadastrada com sucesso!")
             # rerun para garantir que a UI mostre os dados atualizados
             st.experimental_rerun()
         else:
             st.error("Houve um erro ao salvar. Tente novamente.")
 
+# =========================
+# PÁGINA: IMPORTAÇÃO EM LOTE (CSV / XLSX)
+# =========================
+def linhas_importadas(validas):
+    # Mesmo formato do cadastro unitário, montado coluna a coluna
+    data = validas["DATA"].dt.strftime("%d/%m/%y")
+    return pd.DataFrame({
+        "UF": validas["UF"],
+        "FRU": validas["FRU"],
+        "SUB1": validas["SUB1"],
+        "SUB2": validas["SUB2"],
+        "SUB3": validas["SUB3"],
+        "DESCRICAO": validas["DESCRICAO"],
+        "MAQUINAS": validas["MAQUINAS"],
+        "CLIENTE": validas["CLIENTE"] + " - (" + validas["SERIAL"] + " " + data + "_" + validas["SLA"] + ") - " + validas["UF"],
+        "DATA_FIM": data,
+        "SLA": validas["SLA"],
+        "DATA_VERIFICACAO": datetime.now().strftime("%d/%m/%y"),
+        "STATUS": engine.calcular_status(validas["DATA"], datetime.today()).fillna(engine.STATUS_DENTRO),
+        "CLIENTE_NOME": validas["CLIENTE"],
+        "SERIAL": validas["SERIAL"],
+        "CONTRATO_DATA": data,
+    })
+
+def pagina_importacao():
+    usuario = st.session_state["usuario"]
+    st.subheader("📥 Importação em Lote")
+    st.write("Envie um CSV ou XLSX com as colunas: " + ", ".join(importacao.COLUNAS) + ".")
+    st.download_button("📄 Baixar modelo (CSV)", importacao.modelo_csv(), file_name="modelo_importacao.csv", mime="text/csv")
+
+    arquivo = st.file_uploader("Arquivo de peças", type=["csv", "xlsx"])
+    if arquivo is None:
+        return
+    try:
+        bruto = importacao.ler_arquivo(arquivo.name, arquivo.getvalue())
+        validas, erros = importacao.validar(bruto, ufs_do_usuario(usuario))
+    except Exception as e:
+        st.error(f"Não foi possível ler o arquivo: {e}")
+        return
+
+    st.write(f"**{len(bruto)}** linha(s) no arquivo: **{len(validas)}** válida(s), **{len(erros)}** com erro.")
+    if len(erros):
+        st.warning("As linhas abaixo não serão importadas:")
+        st.dataframe(erros, use_container_width=True, hide_index=True)
+    if validas.empty:
+        return
+
+    linhas = linhas_importadas(validas)
+    st.dataframe(linhas, use_container_width=True, hide_index=True)
+
+    if st.button(f"💾 Importar {len(linhas)} peça(s)"):
+        ops = [journal.inserir(linha, usuario=usuario) for linha in linhas.to_dict("records")]
+        # Todas as linhas num único commit do journal e um único registro de auditoria
+        if registrar_operacoes(ops, f"Importação de {len(ops)} peças ({arquivo.name})"):
+            registrar_log(
+                usuario, "IMPORTACAO", f"{len(ops)} peças importadas de {arquivo.name}",
+                antes=None,
+                depois={"ids": [op["id"] for op in ops], "FRU": linhas["FRU"].tolist(), "rejeitadas": len(erros)},
+            )
+            st.success(f"{len(ops)} peça(s) importada(s) com sucesso!")
+        else:
+            st.error("Houve um erro ao salvar. Nenhuma peça foi importada.")
+
 # =========================
 # PÁGINA: RENOVAÇÃO
 # =========================
@@ -363,15 +573,13 @@ def pagina_renovacao():
     usuario = st.session_state["usuario"]
     st.subheader("🔄 Renovação de Contrato")
 
-    df_full = carregar_planilha_principal()
-    df = filtrar_por_usuario(df_full, usuario)
+    snap = obter_planilha()
+    df = filtrar_por_usuario(snap, usuario)
     if df.empty:
         st.info("Nenhuma peça cadastrada para sua região.")
         return
 
-    hoje = datetime.today()
-    df["DATA_FIM_DT"] = df["DATA_FIM"].apply(parse_data_possivel)
-    vencidas = df[df["DATA_FIM_DT"].notna() & (df["DATA_FIM_DT"].dt.date < hoje.date())]
+    vencidas = vencidas_do_usuario(snap, usuario, datetime.today())
 
     if vencidas.empty:
         st.info("Nenhum contrato vencido.")
@@ -380,29 +588,36 @@ def pagina_renovacao():
     vencidas_mostrar = vencidas.drop(columns=["DATA_FIM_DT", "STATUS", "DATA_VERIFICACAO"], errors='ignore')
     st.dataframe(vencidas_mostrar)
 
-    indices_relativos = list(vencidas.index)
-    idx_pos = st.number_input("Selecione posição (número da linha mostrada acima)", min_value=0, max_value=len(indices_relativos)-1, step=1)
+    # várias linhas por vez: todas vão num único commit e num único registro de log
+    rotulos = {
+        idx: f"{pos} - {linha.FRU} - {linha.CLIENTE} ({linha.DATA_FIM})"
+        for pos, (idx, linha) in enumerate(vencidas[["FRU", "CLIENTE", "DATA_FIM"]].astype(str).iterrows())
+    }
+    if st.checkbox(f"Selecionar todas as {len(rotulos)} vencidas"):
+        selecionadas = list(rotulos)
+    else:
+        selecionadas = st.multiselect("Linhas (posição na tabela acima)", list(rotulos), format_func=rotulos.get)
 
     nova_data = st.date_input("Nova Data")
     novo_sla = st.text_input("Novo SLA (opcional)")
 
     if st.button("Atualizar Contrato"):
+        if not selecionadas:
+            st.warning("Selecione ao menos uma linha.")
+            return
         try:
-            idx_abs = indices_relativos[int(idx_pos)]
-            antes = df_full.loc[idx_abs].to_dict()
-            df_full.loc[idx_abs, "DATA_FIM"] = nova_data.strftime("%d/%m/%y")
-            df_full.loc[idx_abs, "STATUS"] = "DENTRO"
+            campos = {"DATA_FIM": nova_data.strftime("%d/%m/%y"),
+                      "STATUS": engine.status_da_data(nova_data, datetime.today())}
             if novo_sla:
-                df_full.loc[idx_abs, "SLA"] = novo_sla.upper()
-            depois = df_full.loc[idx_abs].to_dict()
-            registrar_log(st.session_state["usuario"], "RENOVACAO", f"Linha {idx_abs}", antes=antes, depois=depois)
-            ok = salvar_planilha_principal(df_full)
+                campos["SLA"] = novo_sla.upper()
+            antes = snap.df.loc[selecionadas]
+            depois = antes.assign(**campos)
+            registrar_log(usuario, "RENOVACAO", f"{len(selecionadas)} linha(s)",
+                          antes=antes.to_dict("index"), depois=depois.to_dict("index"))
+            ops = [journal.atualizar(idx, campos, usuario=usuario) for idx in selecionadas]
+            ok = registrar_operacoes(ops, f"Renovação de {len(ops)} linha(s)")
             if ok:
-                try:
-                    st.cache_data.clear()
-                except Exception:
-                    pass
-                st.success("Contrato atualizado com sucesso!")
+                st.success(f"{len(ops)} contrato(s) atualizado(s) com sucesso!")
                 st.experimental_rerun()
             else:
                 st.error("Erro ao salvar atualização.")
@@ -410,18 +625,17 @@ def pagina_renovacao():
             st.error(f"Erro ao atualizar: {e}")
 
     if st.button("❌ Excluir Contrato"):
+        if not selecionadas:
+            st.warning("Selecione ao menos uma linha.")
+            return
         try:
-            idx_abs = indices_relativos[int(idx_pos)]
-            antes = df_full.loc[idx_abs].to_dict()
-            df_full = df_full.drop(idx_abs).reset_index(drop=True)
-            registrar_log(st.session_state["usuario"], "EXCLUSAO", f"Linha {idx_abs}", antes=antes, depois=None)
-            ok = salvar_planilha_principal(df_full)
+            antes = snap.df.loc[selecionadas]
+            registrar_log(usuario, "EXCLUSAO", f"{len(selecionadas)} linha(s)",
+                          antes=antes.to_dict("index"), depois=None)
+            ops = [journal.remover(idx, usuario=usuario) for idx in selecionadas]
+            ok = registrar_operacoes(ops, f"Exclusão de {len(ops)} linha(s)")
             if ok:
-                try:
-                    st.cache_data.clear()
-                except Exception:
-                    pass
-                st.success("Contrato excluído com sucesso!")
+                st.success(f"{len(ops)} contrato(s) excluído(s) com sucesso!")
                 st.experimental_rerun()
             else:
                 st.error("Erro ao salvar exclusão.")
@@ -431,27 +645,95 @@ def pagina_renovacao():
 # =========================
 # PÁGINA: VISUALIZAR TUDO
 # =========================
+TAMANHOS_PAGINA = [25, 50, 100, 250, 500]
+
 def pagina_visualizar_tudo():
     usuario = st.session_state["usuario"]
     st.subheader("📋 Todos os registros (sua UF)")
 
-    df = filtrar_por_usuario(carregar_planilha_principal(), usuario)
+    snap = obter_planilha()
+    df = filtrar_por_usuario(snap, usuario)
     if df.empty:
         st.info("Nenhum registro encontrado para sua UF.")
         return
 
-    df_mostrar = df.drop(columns=["STATUS","DATA_VERIFICACAO"], errors='ignore')
+    # Filtro, ordenação e paginação no servidor (Snapshot.consulta, guardada por
+    # snapshot): só a página visível é enviada ao navegador
+    admin = is_admin(usuario)
+    opcoes_uf = snap.distintos("UF") if admin else sorted(ufs_filtro(usuario))
+    c1, c2, c3 = st.columns(3)
+    ufs_sel = c1.multiselect("UF", opcoes_uf)
+    fru = c2.text_input("FRU contém")
+    slas = c3.multiselect("SLA", snap.distintos("SLA"))
+    c4, c5, c6, c7 = st.columns(4)
+    data_de = c4.date_input("DATA_FIM de", value=None, format="DD/MM/YYYY")
+    data_ate = c5.date_input("DATA_FIM até", value=None, format="DD/MM/YYYY")
+    colunas = [c for c in df.columns if c not in ("STATUS", "DATA_VERIFICACAO")]
+    ordenar_por = c6.selectbox("Ordenar por", ["(planilha)"] + colunas)
+    decrescente = c7.checkbox("Decrescente")
+
+    if ufs_sel:
+        ufs = ufs_sel
+    else:
+        ufs = None if admin else opcoes_uf
+    with metricas.medir("filtro.consulta"):
+        pos = snap.consulta(
+            ufs=ufs, fru=fru, slas=slas, data_de=data_de, data_ate=data_ate,
+            ordenar_por=None if ordenar_por == "(planilha)" else ordenar_por, decrescente=decrescente,
+        )
+
+    c8, c9 = st.columns(2)
+    tamanho = c8.selectbox("Linhas por página", TAMANHOS_PAGINA, index=1)
+    n_paginas = max(1, -(-len(pos) // tamanho))
+    # filtros novos voltam para a primeira página
+    filtros_atuais = (tuple(ufs_sel), fru, tuple(slas), data_de, data_ate, ordenar_por, decrescente, tamanho)
+    if st.session_state.get("vis_filtros") != filtros_atuais:
+        st.session_state["vis_filtros"] = filtros_atuais
+        st.session_state["vis_pagina"] = 1
+    st.session_state["vis_pagina"] = min(st.session_state.get("vis_pagina", 1), n_paginas)
+    pagina = c9.number_input(f"Página (de {n_paginas})", min_value=1, max_value=n_paginas, step=1, key="vis_pagina")
+
+    inicio = (pagina - 1) * tamanho
+    df_mostrar = snap.df.take(pos[inicio:inicio + tamanho])[colunas]
+    if len(pos):
+        st.caption(f"Mostrando {inicio + 1}–{inicio + len(df_mostrar)} de {len(pos)} registros")
+    else:
+        st.caption("Nenhum registro com esses filtros.")
     st.dataframe(df_mostrar)
 
-    formato = st.radio("Formato para download", ["CSV","TXT"])
-    if formato == "CSV":
-        if st.button("⬇️ Exportar CSV (registros visíveis)"):
-            registrar_log(st.session_state["usuario"], "EXPORTACAO", f"Exportou CSV ({len(df_mostrar)} linhas)")
-            st.download_button("Download CSV", df_mostrar.to_csv(index=False).encode("utf-8"), "dados.csv")
-    else:
-        if st.button("⬇️ Exportar TXT (registros visíveis)"):
-            registrar_log(st.session_state["usuario"], "EXPORTACAO", f"Exportou TXT ({len(df_mostrar)} linhas)")
-            st.download_button("Download TXT", df_mostrar.to_csv(index=False, sep="\t").encode("utf-8"), "dados.txt")
+    exportar_dados(df, "dados", "EXPORTACAO", "Exportou", "exp_tudo", ocultar=["STATUS","DATA_VERIFICACAO"])
+
+# =========================
+# PÁGINA: BUSCA (FRU / SUBSTITUTAS / DESCRIÇÃO / MÁQUINAS / CLIENTE)
+# =========================
+BUSCA_MAX_LINHAS = 200
+
+def pagina_busca():
+    usuario = st.session_state["usuario"]
+    st.subheader("🔎 Buscar Peça")
+    st.caption("Busca por FRU, SUB1–SUB3, descrição, máquinas, cliente ou serial (início das palavras).")
+
+    texto = st.text_input("FRU, código ou texto")
+    substitutos = st.checkbox("Incluir peças substitutas (SUB1–SUB3)", value=True)
+    if not texto.strip():
+        return
+
+    inicio = time.perf_counter()
+    diretas, via_sub = buscar_do_usuario(obter_planilha(), usuario, texto, substitutos)
+    ms = (time.perf_counter() - inicio) * 1000
+    ocultar = ["STATUS", "DATA_VERIFICACAO"]
+
+    st.caption(f"{len(diretas)} resultado(s) e {len(via_sub)} via substitutas em {ms:.0f} ms")
+    if diretas.empty and via_sub.empty:
+        st.info("Nada encontrado nas suas UFs.")
+        return
+    if not diretas.empty:
+        st.dataframe(diretas.head(BUSCA_MAX_LINHAS).drop(columns=ocultar, errors='ignore'))
+    if not via_sub.empty:
+        st.markdown("**Peças substitutas** (compartilham FRU/SUB com os resultados acima)")
+        st.dataframe(via_sub.head(BUSCA_MAX_LINHAS).drop(columns=ocultar, errors='ignore'))
+    if max(len(diretas), len(via_sub)) > BUSCA_MAX_LINHAS:
+        st.caption(f"Mostrando até {BUSCA_MAX_LINHAS} linhas de cada lista; refine a busca para ver o resto.")
 
 # =========================
 # PÁGINA: RELATÓRIO (VENCIDAS)
@@ -460,14 +742,29 @@ def pagina_relatorio():
     usuario = st.session_state["usuario"]
     st.subheader("📄 Relatório de Peças Vencidas (sua UF)")
 
-    df = filtrar_por_usuario(carregar_planilha_principal(), usuario)
+    snap = obter_planilha()
+    df = filtrar_por_usuario(snap, usuario)
     if df.empty:
         st.info("Nenhum registro encontrado para sua UF.")
         return
 
     hoje = datetime.today()
-    df["DATA_FIM_DT"] = df["DATA_FIM"].apply(parse_data_possivel)
-    vencidas = df[df["DATA_FIM_DT"].notna() & (df["DATA_FIM_DT"].dt.date < hoje.date())]
+    vencidas = vencidas_do_usuario(snap, usuario, hoje)
+
+    with st.expander("⏳ A vencer"):
+        dias = st.number_input("Próximos N dias", min_value=1, max_value=365, value=30, step=1)
+        a_vencer = snap.a_vencer(hoje, dias, ufs=ufs_filtro(usuario))
+        if a_vencer.empty:
+            st.info(f"Nenhum contrato vence nos próximos {dias} dias.")
+        else:
+            st.dataframe(a_vencer.drop(columns=["STATUS","DATA_VERIFICACAO","DATA_FIM_DT"], errors='ignore'))
+
+    with st.expander("👥 Por cliente"):
+        resumo = snap.resumo_clientes(hoje, ufs=ufs_filtro(usuario))
+        if resumo.empty:
+            st.info("Nenhum cliente encontrado.")
+        else:
+            st.dataframe(resumo)
 
     if vencidas.empty:
         st.info("Nenhum contrato vencido.")
@@ -476,9 +773,8 @@ def pagina_relatorio():
     vencidas_mostrar = vencidas.drop(columns=["STATUS","DATA_VERIFICACAO","DATA_FIM_DT"], errors='ignore')
     st.dataframe(vencidas_mostrar)
 
-    if st.button("⬇️ Baixar Relatório CSV (vencidas)"):
-        registrar_log(st.session_state["usuario"], "EXPORTACAO_RELATORIO_VENCIDAS", f"Exportou relatório vencidas ({len(vencidas_mostrar)} linhas)")
-        st.download_button("Download CSV", vencidas_mostrar.to_csv(index=False).encode("utf-8"), "relatorio_vencidas.csv")
+    exportar_dados(vencidas_mostrar, "relatorio_vencidas", "EXPORTACAO_RELATORIO_VENCIDAS",
+                   "Exportou relatório vencidas", "exp_vencidas")
 
 # =========================
 # PÁGINA: LOGS (APENAS ADMIN)
@@ -491,21 +787,143 @@ def pagina_logs():
 
     st.subheader("📜 Logs do Sistema (detalhado)")
 
-    df_log = carregar_logs()
+    periodo = st.date_input("Período", value=periodo_logs_padrao(), format="DD/MM/YYYY")
+    if not isinstance(periodo, (tuple, list)) or len(periodo) != 2:
+        st.info("Escolha a data inicial e a final.")
+        return
+    inicio, fim = periodo
+
+    # só as partições que cruzam o período são baixadas
+    df_log = carregar_logs(inicio, fim, versao(LOGS))
+    pendentes = _fila_logs().pendentes()
+    if pendentes:
+        # eventos ainda não enviados ao GitHub
+        df_pend = audit_log.filtrar(pd.DataFrame(pendentes, columns=LOG_COLS), inicio, fim)
+        df_log = pd.concat([df_pend, df_log], ignore_index=True)
     if df_log.empty:
-        st.info("Nenhum log disponível.")
+        st.info("Nenhum log no período.")
         return
 
-    try:
-        df_show = df_log.sort_values("data_hora", ascending=False)
-    except:
-        df_show = df_log
+    c1, c2 = st.columns(2)
+    usuarios = c1.multiselect("Usuário", sorted(df_log["usuario"].dropna().unique()))
+    acoes = c2.multiselect("Ação", sorted(df_log["acao"].dropna().unique()))
+    df_show = audit_log.filtrar(df_log, inicio, fim, usuarios, acoes)
 
+    st.caption(f"{len(df_show)} evento(s)")
     st.dataframe(df_show)
 
-    if st.button("⬇️ Exportar Logs (CSV)"):
-        registrar_log(st.session_state["usuario"], "EXPORTAR_LOGS", f"Exportou logs ({len(df_log)} linhas)")
-        st.download_button("Download Logs CSV", df_log.to_csv(index=False).encode("utf-8"), "logs.csv")
+    exportar_dados(df_show, "logs", "EXPORTAR_LOGS", "Exportou logs", "exp_logs")
+
+# =========================
+# PÁGINA: DESEMPENHO (APENAS ADMIN)
+# - Spans de tempo deste processo (metricas.py): requisições ao GitHub,
+#   base64, read_excel/to_excel, parse, filtros e render de cada página
+# =========================
+JANELAS_DESEMPENHO = {"Últimos 5 minutos": 300, "Última hora": 3600, "Tudo": None}
+
+def pagina_desempenho():
+    usuario = st.session_state["usuario"]
+    if not is_admin(usuario):
+        st.error("⛔ Acesso restrito aos administradores.")
+        return
+
+    st.subheader("⏱ Desempenho")
+    janela = st.radio("Período", list(JANELAS_DESEMPENHO), horizontal=True)
+    segundos = JANELAS_DESEMPENHO[janela]
+    desde = time.time() - segundos if segundos else None
+
+    st.caption(f"Medições deste processo desde {datetime.fromtimestamp(metricas.PADRAO.desde):%d/%m/%Y %H:%M:%S} "
+               f"(até {metricas.MAX_SPANS} mais recentes).")
+    st.markdown("**Percentis por etapa (ms)**")
+    st.dataframe(metricas.PADRAO.percentis(desde), hide_index=True)
+
+    contadores = metricas.PADRAO.contadores()
+    if contadores:
+        st.markdown("**Contadores** (cache e respostas do GitHub)")
+        st.dataframe(pd.DataFrame({"contador": list(contadores), "valor": list(contadores.values())}),
+                     hide_index=True)
+
+    with st.expander("Spans recentes"):
+        spans = metricas.PADRAO.spans(desde)
+        spans = spans.assign(inicio=pd.to_datetime(spans["inicio"], unit="s")).iloc[::-1].head(500)
+        st.dataframe(spans, hide_index=True)
+
+    c1, c2, c3 = st.columns(3)
+    c1.download_button("Download JSON", data=metricas.PADRAO.exportar_json, file_name="desempenho.json",
+                       mime="application/json")
+    c2.download_button("Download CSV", data=metricas.PADRAO.exportar_csv, file_name="desempenho.csv",
+                       mime="text/csv")
+    if c3.button("Zerar medições"):
+        metricas.PADRAO.limpar()
+        st.rerun()
+
+# =========================
+# PÁGINA: MANUTENÇÃO (APENAS ADMIN)
+# =========================
+def pagina_manutencao():
+    usuario = st.session_state["usuario"]
+    if not is_admin(usuario):
+        st.error("⛔ Acesso restrito aos administradores.")
+        return
+
+    st.subheader("🛠 Manutenção da Planilha")
+    snap = obter_planilha()
+
+    st.markdown("**CLIENTE estruturado**: grava CLIENTE_NOME, SERIAL e CONTRATO_DATA "
+                "(e SLA/UF vazios) a partir do texto de CLIENTE.")
+    pendentes = engine.clientes_sem_migrar(snap.df)
+    if not pendentes:
+        st.success("Todas as linhas já têm as colunas estruturadas.")
+    else:
+        st.write(f"{pendentes} linha(s) a migrar.")
+        if st.button("Migrar CLIENTE"):
+            df_novo, n = engine.migrar_cliente(snap.df)
+            if salvar_planilha_principal(df_novo, snap):
+                registrar_log(usuario, "MIGRACAO_CLIENTE", f"{n} linhas com CLIENTE estruturado")
+                st.success(f"{n} linha(s) migrada(s).")
+
+    st.markdown("---")
+    st.markdown("**Um arquivo por UF**: copia a planilha para pecas/<UF>.xlsx. Depois disso cada "
+                "usuário baixa só as suas UFs e as gravações de UFs diferentes não conflitam. "
+                "A SALDO_PECAS.xlsx fica como cópia, sem novas gravações.")
+    por_uf = _planilha_por_uf()
+    if por_uf.ativa():
+        st.success(f"Planilha já dividida por UF ({', '.join(por_uf.ufs())}).")
+    else:
+        st.caption("Faça com o sistema parado: outros processos passam a usar os arquivos "
+                   "por UF em até alguns segundos.")
+        if st.button("Dividir planilha por UF"):
+            origem = _planilha_unica().base.sha
+            contagem = por_uf.migrar(snap, origem)
+            if contagem is None:
+                st.error("Falha ao dividir a planilha; nenhum usuário foi afetado. Tente novamente.")
+            else:
+                registrar_log(usuario, "MIGRACAO_UF", ", ".join(f"{uf}: {n}" for uf, n in contagem.items()),
+                              depois=origem)
+                st.success(f"Planilha dividida em {len(contagem)} arquivo(s).")
+
+    st.markdown("---")
+    st.markdown("**Logs por mês**: copia o logs.csv antigo para as partições (logs/AAAA-MM.csv).")
+    try:
+        legado_pendente = _legado_pendente()
+    except Exception as e:
+        st.error(f"Não foi possível ler o manifesto de logs: {e}")
+        return
+    if not legado_pendente:
+        st.success("logs.csv já foi migrado.")
+        return
+    status, legado = _logs_remotos().obter()
+    if status not in (200, 304) or legado is None:
+        st.info("Não há logs.csv antigo para migrar.")
+        return
+    st.write(f"{len(legado)} evento(s) no logs.csv.")
+    if st.button("Migrar logs.csv"):
+        if _logs_particionados().importar(legado):
+            dados_alterados(LOGS)
+            registrar_log(usuario, "MIGRACAO_LOGS", f"{len(legado)} eventos copiados para partições")
+            st.success("Logs migrados.")
+        else:
+            st.error("Falha ao migrar os logs; nada foi marcado como migrado. Tente novamente.")
 
 # =========================
 # PÁGINA: HOME / DASHBOARD (vertical - opção B)
@@ -519,6 +937,14 @@ def pagina_home():
         st.session_state["pagina"] = "Cadastro"
         st.rerun()
 
+    if st.button("🔎 Buscar Peça", use_container_width=True):
+        st.session_state["pagina"] = "Busca"
+        st.rerun()
+
+    if st.button("📥 Importação em Lote", use_container_width=True):
+        st.session_state["pagina"] = "Importação"
+        st.rerun()
+
     if st.button("🔄 Renovação", use_container_width=True):
         st.session_state["pagina"] = "Renovação"
         st.rerun()
@@ -538,6 +964,12 @@ def pagina_home():
             st.session_state["pagina"] = "Logs"
             st.rerun()
         st.write("Admins podem ver e exportar todos os logs.")
+        if st.button("⏱ Desempenho", use_container_width=True):
+            st.session_state["pagina"] = "Desempenho"
+            st.rerun()
+        if st.button("🛠 Manutenção da Planilha", use_container_width=True):
+            st.session_state["pagina"] = "Manutenção"
+            st.rerun()
 
     st.markdown("---")
     if st.button("🚪 Sair", use_container_width=True):
@@ -546,6 +978,21 @@ def pagina_home():
         st.info("Você saiu. Atualize a página para entrar novamente.")
         st.rerun()
 
+# =========================
+# DATA DOS DADOS / ATUALIZAR AGORA (barra lateral)
+# =========================
+def barra_atualizacao():
+    atualizador = _atualizador()
+    if st.sidebar.button("🔄 Atualizar agora"):
+        # a página é desenhada depois da barra lateral, já com a versão nova
+        if not atualizador.agora(esperar=ESPERA_ATUALIZACAO):
+            st.sidebar.warning("O GitHub não respondeu a tempo; mostrando os últimos dados lidos.")
+    momento = _planilha(esperar=False).atualizado_em
+    quando = datetime.fromtimestamp(momento).strftime("%d/%m/%Y %H:%M:%S") if momento else "ainda não carregados"
+    st.sidebar.caption(f"📅 Dados de {quando}")
+    if atualizador.ultimo_erro:
+        st.sidebar.caption(f"⚠️ Última atualização falhou: {atualizador.ultimo_erro}")
+
 # =========================
 # MENU PRINCIPAL (Navegação via pagina)
 # =========================
@@ -558,13 +1005,21 @@ def main_page():
     if st.sidebar.button("⬅️ Voltar ao início"):
         st.session_state["pagina"] = "Home"
         st.rerun()
+    barra_atualizacao()
 
     pagina_atual = st.session_state["pagina"]
+    with metricas.medir("render", pagina_atual):
+        _mostrar_pagina(pagina_atual)
 
+def _mostrar_pagina(pagina_atual):
     if pagina_atual == "Home":
         pagina_home()
     elif pagina_atual == "Cadastro":
         pagina_cadastro()
+    elif pagina_atual == "Busca":
+        pagina_busca()
+    elif pagina_atual == "Importação":
+        pagina_importacao()
     elif pagina_atual == "Renovação":
         pagina_renovacao()
     elif pagina_atual == "Relatório":
@@ -573,6 +1028,10 @@ def main_page():
         pagina_visualizar_tudo()
     elif pagina_atual == "Logs":
         pagina_logs()
+    elif pagina_atual == "Desempenho":
+        pagina_desempenho()
+    elif pagina_atual == "Manutenção":
+        pagina_manutencao()
     else:
         st.session_state["pagina"] = "Home"
         st.rerun()
@@ -583,6 +1042,7 @@ def main_page():
 st.set_page_config(page_title="Controle de Peças", layout="centered")
 
 if "usuario" not in st.session_state:
-    login_page()
+    with metricas.medir("render", "Login"):
+        login_page()
 else:
     main_page()
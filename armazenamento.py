@@ -0,0 +1,82 @@
+# armazenamento.py
+# Onde a planilha fica no GitHub e como abri-la (planilha única ou um arquivo por UF), sem Streamlit.
+#
+# Usado pelo app.py e pelos jobs de linha de comando (ver recalcular_status.py).
+import os
+from datetime import datetime
+
+import pandas as pd
+
+import engine
+import github_api
+import journal
+import particoes
+import snapshot_cache
+
+# PECAS_API_BASE permite apontar para uma Contents API local (ver fake_github.py)
+REPO_API_BASE = os.getenv("PECAS_API_BASE", "https://api.github.com/repos/otavilobato/pecas1/contents")
+
+ARQUIVO_PLANILHA = "SALDO_PECAS.xlsx"
+# Operações por linha ainda não incorporadas à planilha (ver journal.py)
+ARQUIVO_JOURNAL = "SALDO_PECAS.journal.jsonl"
+JOURNAL_MAX_OPS = 200            # compacta ao passar desse número de operações
+JOURNAL_MAX_IDADE = 24 * 3600    # ... ou quando a mais antiga tiver mais de 1 dia
+# Layout opcional com um arquivo por UF (ver particoes.py): passa a valer
+# quando pecas/manifest.json existe
+PASTA_POR_UF = "pecas"           # pecas/<UF>.xlsx + journal + manifest.json
+
+
+def planilha_unica(api_base=REPO_API_BASE, sessao=None, dir_cache=None, intervalo=0):
+    """SALDO_PECAS.xlsx + journal. Com `dir_cache`, snapshots parseados ficam em disco por sha."""
+    cache = cache_journal = None
+    if dir_cache:
+        cache = snapshot_cache.CacheDeSnapshots(os.path.join(dir_cache, f"planilha-v{engine.Snapshot.VERSAO}"))
+        # o journal também parte do disco: obter() não espera a API na partida a frio
+        cache_journal = snapshot_cache.CacheDeSnapshots(os.path.join(dir_cache, "journal"))
+    base = github_api.ArquivoRevalidado(f"{api_base}/{ARQUIVO_PLANILHA}", engine.ler_planilha, cache=cache,
+                                        intervalo=intervalo, sessao=sessao)
+    journal_remoto = github_api.ArquivoRevalidado(f"{api_base}/{ARQUIVO_JOURNAL}", journal.ler, cache=cache_journal,
+                                                  intervalo=intervalo, sessao=sessao)
+    return journal.PlanilhaComJournal(base, journal_remoto, engine.serializar_planilha,
+                                      max_ops=JOURNAL_MAX_OPS, max_idade=JOURNAL_MAX_IDADE)
+
+
+def planilha_por_uf(api_base=REPO_API_BASE, sessao=None, dir_cache=None, intervalo=0):
+    """Um arquivo por UF (particoes.PlanilhaPorUF); ativa() diz se a migração já foi feita."""
+    if dir_cache:
+        dir_cache = os.path.join(dir_cache, f"pecas-v{engine.Snapshot.VERSAO}")
+    return particoes.PlanilhaPorUF(f"{api_base}/{PASTA_POR_UF}", sessao=sessao, dir_cache=dir_cache,
+                                   intervalo=intervalo, max_ops=JOURNAL_MAX_OPS, max_idade=JOURNAL_MAX_IDADE)
+
+
+def escolher(unica, por_uf, esperar=True):
+    # um arquivo por UF depois da migração; até lá, a planilha única. Leituras
+    # podem passar esperar=False (ver PlanilhaPorUF.ativa); gravações não
+    return por_uf if por_uf.ativa(esperar) else unica
+
+
+# =========================
+# JOB: STATUS E DATA_VERIFICACAO
+# =========================
+def recalcular_status(planilha, hoje=None, dias=engine.DIAS_A_VENCER, headers=None, simular=False, tentativas=3):
+    """Recalcula STATUS e DATA_VERIFICACAO de todas as linhas e grava de uma vez.
+
+    `planilha` é a de escolher(). Retorna (ok, erro, contagem por STATUS).
+    Com simular=True só calcula, sem gravar.
+    """
+    hoje = pd.Timestamp.today().normalize() if hoje is None else pd.Timestamp(hoje).normalize()
+    mensagem = f"Recálculo de STATUS ({datetime.now().strftime('%d/%m/%Y %H:%M')})"
+    erro = ""
+    for _ in range(tentativas):
+        status, snap = planilha.obter(headers)
+        if status not in (200, 304) or snap is None:
+            return False, f"falha ao ler a planilha (código {status})", {}
+        df_novo = snap.com_status(hoje, dias)
+        contagem = df_novo["STATUS"].value_counts().to_dict()
+        if simular:
+            return True, "", contagem
+        ok, erro, conflitos = planilha.substituir(df_novo, snap, headers=headers, mensagem=mensagem)
+        if ok or not conflitos:
+            return ok, erro, contagem
+        # alguém editou linhas durante o cálculo: recalcula sobre a versão nova
+    return False, erro, {}
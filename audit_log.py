@@ -0,0 +1,313 @@
+# audit_log.py
+# Fila local (spool) de eventos de auditoria com envio em lote para o GitHub,
+# gravados em partições por mês (ou dia) com um manifesto.
+import atexit
+import csv
+import io
+import json
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+import github_api
+
+
+class FilaDeLogs:
+    """Grava cada evento num CSV local durável e envia em lote numa thread de fundo.
+
+    `enviar(linhas_csv, n_eventos)` recebe as linhas já em CSV (sem cabeçalho) e
+    retorna True quando o lote foi gravado no destino. Em caso de falha o lote
+    continua no disco e é reenviado na próxima rodada.
+    """
+
+    def __init__(self, caminho, colunas, enviar, intervalo=15, lote=50):
+        self.caminho = caminho
+        self.caminho_envio = caminho + ".enviando"
+        self.colunas = list(colunas)
+        self.enviar = enviar
+        self.intervalo = intervalo
+        self.lote = lote
+        self._lock = threading.Lock()
+        self._envio = threading.Lock()
+        self._acordar = threading.Event()
+        self._pendentes = 0
+        if os.path.exists(self.caminho) or os.path.exists(self.caminho_envio):
+            # sobras de uma execução anterior: envia já na primeira rodada
+            self._pendentes = 1
+        threading.Thread(target=self._loop, name="fila-logs", daemon=True).start()
+        atexit.register(self.descarregar)
+
+    def registrar(self, evento):
+        """Acrescenta um evento ao spool local. Não faz I/O de rede."""
+        with self._lock:
+            novo = not os.path.exists(self.caminho)
+            with open(self.caminho, "a", newline="", encoding="utf-8") as f:
+                w = csv.writer(f, lineterminator="\n")
+                if novo:
+                    w.writerow(self.colunas)
+                w.writerow([evento.get(c, "") for c in self.colunas])
+                f.flush()
+                os.fsync(f.fileno())
+            self._pendentes += 1
+            if self._pendentes >= self.lote:
+                self._acordar.set()
+
+    def pendentes(self):
+        """Eventos ainda não enviados (em envio ou no spool), como lista de dicts."""
+        eventos = []
+        with self._lock:
+            for caminho in (self.caminho_envio, self.caminho):
+                if os.path.exists(caminho):
+                    with open(caminho, newline="", encoding="utf-8") as f:
+                        eventos.extend(csv.DictReader(f))
+        return eventos
+
+    def descarregar(self):
+        """Envia tudo o que estiver no spool num único commit. Retorna True se não sobrou nada.
+
+        Uma sobra de envio anterior (.enviando) vai primeiro, e o spool atual
+        na rodada seguinte da mesma chamada.
+        """
+        with self._envio:
+            while True:
+                ok, sobra = self._enviar_lote()
+                with self._lock:
+                    restou = os.path.exists(self.caminho)
+                if not (ok and sobra and restou):
+                    return ok and not restou
+
+    def _enviar_lote(self):
+        """Envia o .enviando (sobra ou spool recém-renomeado). Retorna (ok, era sobra)."""
+        with self._lock:
+            sobra = os.path.exists(self.caminho_envio)
+            if not sobra:
+                if not os.path.exists(self.caminho):
+                    self._pendentes = 0
+                    return True, False
+                # rename atômico: novos eventos passam a ir para um spool novo
+                os.replace(self.caminho, self.caminho_envio)
+                self._pendentes = 0
+            with open(self.caminho_envio, newline="", encoding="utf-8") as f:
+                linhas = list(csv.reader(f))[1:]
+
+        ok = True
+        if linhas:
+            buf = io.StringIO()
+            csv.writer(buf, lineterminator="\n").writerows(linhas)
+            try:
+                ok = self.enviar(buf.getvalue().encode("utf-8"), len(linhas))
+            except Exception as e:
+                print("Erro ao enviar logs:", e)
+                ok = False
+
+        with self._lock:
+            if ok:
+                os.remove(self.caminho_envio)
+            else:
+                self._pendentes += 1
+        return ok, sobra
+
+    def _loop(self):
+        while True:
+            self._acordar.wait(self.intervalo)
+            self._acordar.clear()
+            if self._pendentes:
+                self.descarregar()
+
+
+# =========================
+# PARTIÇÕES NO GITHUB (logs/AAAA-MM.csv + logs/manifest.json)
+# =========================
+GRANULARIDADES = {"mes": 7, "dia": 10}  # tamanho do prefixo de data_hora que vira a chave
+
+
+class LogsParticionados:
+    """Logs gravados em um CSV por mês (ou dia) e um manifesto com o que existe.
+
+    anexar() só reescreve as partições dos eventos do lote (a do mês atual,
+    normalmente), e carregar() só baixa as partições que cruzam o período
+    pedido. O manifesto guarda, por partição, o número de linhas e o
+    primeiro/último data_hora; cada entrada é recalculada a partir do
+    conteúdo da partição, então regravar depois de um conflito é seguro.
+    """
+
+    def __init__(self, url_base, colunas, sessao=None, granularidade="mes", intervalo=2):
+        self.url_base = url_base.rstrip("/")
+        self.colunas = list(colunas)
+        self.sessao = sessao
+        self.tamanho_chave = GRANULARIDADES[granularidade]
+        self.intervalo = intervalo
+        self.manifesto = github_api.ArquivoRevalidado(
+            f"{self.url_base}/manifest.json", lambda b: json.loads(b.decode("utf-8")),
+            manter_bruto=True, intervalo=intervalo, sessao=sessao,
+        )
+        self._particoes = {}
+        self._lock = threading.Lock()
+
+    def _ler_csv(self, conteudo):
+        return pd.read_csv(io.BytesIO(conteudo), dtype=str, keep_default_na=False)
+
+    def chave(self, data_hora):
+        return str(data_hora)[:self.tamanho_chave]
+
+    def particao(self, chave):
+        with self._lock:
+            arq = self._particoes.get(chave)
+            if arq is None:
+                # partições fechadas não mudam mais: revalida bem menos
+                fechada = chave < time.strftime("%Y-%m-%d")[:self.tamanho_chave]
+                arq = github_api.ArquivoRevalidado(
+                    f"{self.url_base}/{chave}.csv", self._ler_csv, manter_bruto=True,
+                    intervalo=3600 if fechada else self.intervalo, sessao=self.sessao,
+                )
+                self._particoes[chave] = arq
+            return arq
+
+    def ler_manifesto(self):
+        """Manifesto atual ({"particoes": {chave: {...}}, ...}); vazio se ainda não existe."""
+        status, valor = self.manifesto.obter()
+        if status in (200, 304) and valor is not None:
+            return valor
+        if status == 404:
+            return {"particoes": {}}
+        raise IOError(f"falha ao ler manifesto de logs (código {status})")
+
+    # ---------- escrita ----------
+    def anexar(self, linhas, mensagem="Atualização automática logs", sem_repetir=False):
+        """Grava linhas (listas na ordem de `colunas`) nas suas partições. Retorna True/False.
+
+        Repetir o mesmo lote não duplica nada: uma partição que já tem as
+        linhas do lote, em sequência, não é regravada. Com sem_repetir=True,
+        linhas idênticas a uma já gravada também são puladas.
+        """
+        por_chave = {}
+        for linha in linhas:
+            por_chave.setdefault(self.chave(linha[0]), []).append(linha)
+        resumos = {}
+        for chave, grupo in sorted(por_chave.items()):
+            resumo = self._anexar_particao(chave, grupo, mensagem, sem_repetir)
+            if resumo is None:
+                return False
+            resumos[chave] = resumo
+        return self._atualizar_manifesto(resumos, mensagem)
+
+    def anexar_csv(self, linhas_csv, mensagem="Atualização automática logs"):
+        """Como anexar(), recebendo as linhas em CSV sem cabeçalho (formato da FilaDeLogs)."""
+        return self.anexar(list(csv.reader(io.StringIO(linhas_csv.decode("utf-8")))), mensagem)
+
+    def _anexar_particao(self, chave, linhas, mensagem, sem_repetir=False):
+        arq = self.particao(chave)
+        buf = io.StringIO()
+        csv.writer(buf, lineterminator="\n").writerows(linhas)
+        todas = buf.getvalue().encode("utf-8")
+        for tentativa in range(3):
+            if tentativa:
+                arq.invalidar()
+            status, _df = arq.obter()
+            if status in (200, 304):
+                base, sha = arq.conteudo or b"", arq.sha
+            elif status == 404:
+                base, sha = b"", None
+            else:
+                print(f"Erro ao ler partição de logs {chave}: {status}")
+                return None
+            if not base.strip():
+                base = (",".join(self.colunas) + "\n").encode("utf-8")
+            elif not base.endswith(b"\n"):
+                base += b"\n"
+            if (b"\n" + base).find(b"\n" + todas) >= 0:
+                # lote já gravado (com a data_hora de cada evento): PUT que
+                # chegou mas voltou com erro, ou reenvio da FilaDeLogs depois
+                # de uma falha no manifesto
+                return self._resumo(arq.valor)
+            novas = todas
+            if sem_repetir:
+                existentes = set(base.splitlines())
+                novas = b"".join(l + b"\n" for l in todas.splitlines() if l not in existentes)
+            conteudo = base + novas
+            resp = github_api.put_conteudo(arq.url, conteudo, f"{mensagem} [{chave}]", sha=sha, sessao=self.sessao)
+            if resp.status_code in (200, 201):
+                arq.registrar_escrita(github_api.sha_da_resposta(resp), conteudo=conteudo)
+                return self._resumo(arq.valor)
+            if resp.status_code not in (409, 422):
+                print(f"Erro ao salvar partição de logs {chave}: {resp.status_code} {resp.text}")
+                return None
+        return None
+
+    def _resumo(self, df):
+        datas = df["data_hora"] if "data_hora" in df.columns else pd.Series([], dtype=str)
+        return {"linhas": int(len(df)), "primeiro": min(datas, default=""), "ultimo": max(datas, default="")}
+
+    def _atualizar_manifesto(self, resumos, mensagem, extra=None):
+        for tentativa in range(3):
+            if tentativa:
+                self.manifesto.invalidar()
+            try:
+                atual = self.ler_manifesto()
+            except IOError as e:
+                print(e)
+                return False
+            novo = dict(atual)
+            novo["particoes"] = {**atual.get("particoes", {}), **resumos}
+            novo.update(extra or {})
+            conteudo = json.dumps(novo, ensure_ascii=False, indent=1, sort_keys=True).encode("utf-8")
+            resp = github_api.put_conteudo(self.manifesto.url, conteudo, f"{mensagem} [manifesto]",
+                                           sha=self.manifesto.sha, sessao=self.sessao)
+            if resp.status_code in (200, 201):
+                self.manifesto.registrar_escrita(github_api.sha_da_resposta(resp), conteudo=conteudo)
+                return True
+            if resp.status_code not in (409, 422):
+                print(f"Erro ao salvar manifesto de logs: {resp.status_code} {resp.text}")
+                return False
+        return False
+
+    def importar(self, df, mensagem="Migração de logs para partições"):
+        """Copia um DataFrame de logs antigo (ex.: logs.csv) para as partições e marca o manifesto.
+
+        Pode ser repetido depois de uma falha: o que já foi copiado não é duplicado.
+        """
+        df = df.reindex(columns=self.colunas).fillna("").astype(str)
+        linhas = df.sort_values("data_hora", kind="stable").values.tolist()
+        return (
+            self.anexar(linhas, mensagem, sem_repetir=True)
+            and self._atualizar_manifesto({}, mensagem, {"legado_migrado": True})
+        )
+
+    # ---------- leitura ----------
+    def chaves_no_periodo(self, inicio, fim):
+        """Partições do manifesto que cruzam [inicio, fim] (datas ou textos AAAA-MM-DD)."""
+        ini = str(inicio)[:10][:self.tamanho_chave]
+        fim = str(fim)[:10][:self.tamanho_chave]
+        return sorted(c for c in self.ler_manifesto().get("particoes", {}) if ini <= c <= fim)
+
+    def carregar(self, inicio, fim, usuarios=None, acoes=None):
+        """Eventos entre as datas `inicio` e `fim` (inclusive), mais recentes primeiro.
+
+        Só as partições do período são baixadas; usuarios/acoes (listas)
+        filtram antes de devolver.
+        """
+        partes = []
+        for chave in self.chaves_no_periodo(inicio, fim):
+            status, df = self.particao(chave).obter()
+            if status in (200, 304) and df is not None:
+                partes.append(df)
+        df = pd.concat(partes, ignore_index=True) if partes else pd.DataFrame(columns=self.colunas)
+        return filtrar(df, inicio, fim, usuarios, acoes)
+
+
+def filtrar(df, inicio, fim, usuarios=None, acoes=None):
+    """Filtra logs por período (datas, inclusive), usuários e ações; ordena do mais recente."""
+    if df.empty:
+        return df
+    quando = pd.to_datetime(df["data_hora"], errors="coerce", format="%Y-%m-%d %H:%M:%S")
+    mascara = (quando >= pd.Timestamp(inicio)) & (quando < pd.Timestamp(fim) + pd.Timedelta(days=1))
+    if usuarios:
+        mascara &= df["usuario"].isin(usuarios)
+    if acoes:
+        mascara &= df["acao"].isin(acoes)
+    mascara = mascara.to_numpy()
+    ordem = np.argsort(quando[mascara].to_numpy(), kind="stable")[::-1]
+    return df[mascara].iloc[ordem].reset_index(drop=True)
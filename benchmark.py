@@ -0,0 +1,257 @@
+# benchmark.py
+"""Benchmark dos caminhos principais do app com dados sintéticos e a Contents API falsa.
+
+Uso:
+    python benchmark.py --tamanhos 10000,100000 --logs 200000 --saida resultados.json
+    python benchmark.py --tamanhos 1000000 --repeticoes 1
+
+O app.py lê st.secrets e desenha a página ao ser importado, então o
+benchmark mede as funções compartilhadas que ele chama (engine, github_api,
+journal, audit_log, exportacao), do mesmo jeito que as páginas as usam.
+Cada caso roda `--repeticoes` vezes; o resultado (JSON) traz mínimo, mediana
+e máximo em segundos e as requisições feitas ao servidor falso.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import audit_log
+import engine
+import exportacao
+import fake_github
+import github_api
+import journal
+import particoes
+import sintetico
+import snapshot_cache
+
+UFS_USUARIO = ["AM", "PA"]  # usuário comum do benchmark (filtrar_por_usuario)
+EVENTOS_LOG = 200            # eventos por repetição de registrar_log
+DIAS_LOGS = 30               # período carregado na página de Logs
+
+
+class Medidor:
+    """Roda os casos e acumula os resultados (tempos e requisições ao servidor falso)."""
+
+    def __init__(self, repo, repeticoes):
+        self.repo = repo
+        self.repeticoes = repeticoes
+        self.resultados = []
+
+    def medir(self, caso, n, func, preparar=None, **extra):
+        """Mede `func(preparado)`; `preparar()` roda antes de cada repetição, fora do tempo."""
+        tempos = []
+        antes = dict(self.repo.estatisticas)
+        for _ in range(self.repeticoes):
+            arg = preparar() if preparar else None
+            t0 = time.perf_counter()
+            func(arg)
+            tempos.append(time.perf_counter() - t0)
+        depois = self.repo.estatisticas
+        resultado = {
+            "caso": caso,
+            "linhas": n,
+            "repeticoes": self.repeticoes,
+            "min_s": round(min(tempos), 6),
+            "mediana_s": round(statistics.median(tempos), 6),
+            "max_s": round(max(tempos), 6),
+            "requisicoes": {k: depois[k] - antes[k] for k in depois if depois[k] != antes[k]},
+            **extra,
+        }
+        self.resultados.append(resultado)
+        print(f"{caso:<28} {n:>9} {resultado['mediana_s']:>10.4f}s  (min {resultado['min_s']:.4f}s)")
+        return resultado
+
+
+def _checar(status):
+    if status not in (200, 304):
+        raise RuntimeError(f"falha ao ler da Contents API falsa (código {status})")
+
+
+def _exigir(ok, erro=""):
+    if not ok:
+        raise RuntimeError(f"falha ao gravar na Contents API falsa {erro}".strip())
+
+
+def _planilha(url, sessao, cache=None):
+    return github_api.ArquivoRevalidado(f"{url}/SALDO_PECAS.xlsx", engine.ler_planilha, cache=cache, sessao=sessao)
+
+
+def bench_planilha(med, url, sessao, n, seed, dir_cache):
+    """Carga, filtros, vencimento, busca, gravação e exportação da planilha de `n` linhas."""
+    hoje = pd.Timestamp.today().normalize()
+    df = sintetico.pecas(n, seed=seed, hoje=hoje)
+    conteudo = sintetico.planilha_xlsx(df)
+    med.repo.arquivos["SALDO_PECAS.xlsx"] = conteudo
+    med.repo.arquivos.pop("SALDO_PECAS.journal.jsonl", None)
+    tamanho = {"bytes_xlsx": len(conteudo)}
+
+    # ---------- carga ----------
+    med.medir("parse_xlsx", n, lambda _: engine.ler_planilha(conteudo), **tamanho)
+    med.medir("carga_fria", n, lambda arq: _checar(arq.obter()[0]),
+              preparar=lambda: _planilha(url, sessao), **tamanho)
+    arq = _planilha(url, sessao)
+    _checar(arq.obter()[0])
+    med.medir("revalidacao_304", n, lambda _: (arq.invalidar(), _checar(arq.obter()[0])))
+
+    cache_dir = os.path.join(dir_cache, f"planilha-{n}")
+    _checar(_planilha(url, sessao, snapshot_cache.CacheDeSnapshots(cache_dir)).obter()[0])
+    med.medir("carga_cache_disco", n,
+              lambda _: _checar(_planilha(url, sessao, snapshot_cache.CacheDeSnapshots(cache_dir)).obter()[0]))
+    snap = arq.valor
+
+    # layout por UF (particoes.py): o usuário comum só baixa as UFs dele
+    base_uf = f"{url}/pecas-{n}"
+    _exigir(particoes.PlanilhaPorUF(base_uf, sessao=sessao).migrar(snap) is not None)
+    med.medir("carga_fria_por_uf", n, lambda pu: _checar(pu.obter(ufs=UFS_USUARIO)[0]),
+              preparar=lambda: particoes.PlanilhaPorUF(base_uf, sessao=sessao))
+    med.medir("carga_fria_por_uf_admin", n, lambda pu: _checar(pu.obter()[0]),
+              preparar=lambda: particoes.PlanilhaPorUF(base_uf, sessao=sessao))
+
+    # ---------- leitura (frio = snapshot novo, sem nada derivado ainda) ----------
+    novo = lambda: engine.Snapshot(snap.df)
+    med.medir("filtrar_por_usuario_frio", n, lambda s: s.da_uf(UFS_USUARIO), preparar=novo)
+    med.medir("filtrar_por_usuario", n, lambda _: snap.da_uf(UFS_USUARIO))
+    med.medir("vencidas_frio", n, lambda s: s.vencidas(hoje), preparar=novo)
+    med.medir("vencidas", n, lambda _: snap.vencidas(hoje, ufs=UFS_USUARIO))
+    med.medir("a_vencer", n, lambda _: snap.a_vencer(hoje, 30, ufs=UFS_USUARIO))
+    med.medir("consulta_pagina", n, lambda _: snap.consulta(ufs=UFS_USUARIO, fru="A", ordenar_por="DATA_FIM_DT"))
+    fru = str(snap.df["FRU"].iloc[n // 2])
+    med.medir("buscar_frio", n, lambda s: s.buscar(fru[:4]), preparar=novo)
+    med.medir("buscar", n, lambda _: snap.buscar(fru[:4], ufs=UFS_USUARIO))
+
+    # ---------- gravação ----------
+    med.medir("serializar_xlsx", n, lambda _: engine.serializar_planilha(snap.df))
+    journal_arq = github_api.ArquivoRevalidado(f"{url}/SALDO_PECAS.journal.jsonl", journal.ler,
+                                               manter_bruto=True, sessao=sessao)
+    planilha = journal.PlanilhaComJournal(arq, journal_arq, engine.serializar_planilha, max_ops=10 ** 9)
+    ids = snap.df.index
+    rng = np.random.default_rng(seed)
+    campos = {"DATA_FIM": hoje.strftime("%d/%m/%y"), "STATUS": "DENTRO"}
+
+    def renovar(_):
+        _exigir(*planilha.registrar([journal.atualizar(ids[rng.integers(len(ids))], campos)]))
+        _checar(planilha.obter()[0])
+    med.medir("journal_registrar", n, renovar)
+    med.medir("journal_compactar", n, lambda _: _exigir(planilha.compactar()), preparar=lambda: renovar(None))
+
+    def substituir(_):
+        status, base = planilha.obter()
+        _checar(status)
+        ok, erro, _conflitos = planilha.substituir(base.df, base)
+        _exigir(ok, erro)
+    med.medir("salvar_planilha", n, substituir)
+
+    # ---------- exportação ----------
+    _status, snap = planilha.obter()
+    for formato in ("CSV", "XLSX"):
+        med.medir(f"exportar_{formato.lower()}", n,
+                  lambda _, f=formato: exportacao.para_buffer(exportacao.exportar(snap.df, f)))
+
+
+def _ler_logs(conteudo):
+    # como app._ler_logs_bytes
+    return pd.read_csv(io.BytesIO(conteudo), dtype=str, keep_default_na=False)
+
+
+def bench_logs(med, url, sessao, n, seed, dir_spool):
+    """logs.csv antigo x partições, e o registrar_log (spool local + envio em lote)."""
+    hoje = pd.Timestamp.today().normalize()
+    df = sintetico.logs(n, seed=seed, hoje=hoje)
+    conteudo = sintetico.logs_csv(df)
+    med.repo.arquivos["logs.csv"] = conteudo
+    inicio, fim = (hoje - pd.Timedelta(days=DIAS_LOGS)).date(), hoje.date()
+    tamanho = {"bytes_csv": len(conteudo)}
+
+    def legado(_):
+        arq = github_api.ArquivoRevalidado(f"{url}/logs.csv", _ler_logs, sessao=sessao)
+        status, todos = arq.obter()
+        _checar(status)
+        audit_log.filtrar(todos, inicio, fim)
+    med.medir("logs_legado_periodo", n, legado, **tamanho)
+
+    base = f"{url}/logs-{n}"
+    particionados = audit_log.LogsParticionados(base, sintetico.COLUNAS_LOG, sessao=sessao)
+    med.medir("logs_migrar", n, lambda _: _exigir(particionados.importar(df)), **tamanho)
+    med.medir("logs_particoes_periodo", n, lambda _: audit_log.LogsParticionados(
+        base, sintetico.COLUNAS_LOG, sessao=sessao).carregar(inicio, fim))
+
+    spool = os.path.join(dir_spool, f"logs-{n}.csv")
+    fila = audit_log.FilaDeLogs(spool, sintetico.COLUNAS_LOG, lambda b, _n: particionados.anexar_csv(b),
+                                intervalo=10 ** 6, lote=10 ** 9)
+    eventos = sintetico.logs(EVENTOS_LOG, seed=seed + 1, hoje=hoje).to_dict("records")
+
+    def registrar(_):
+        for evento in eventos:
+            fila.registrar(evento)
+    med.medir("registrar_log", EVENTOS_LOG, registrar)
+    med.medir("enviar_lote_logs", EVENTOS_LOG, lambda _: _exigir(fila.descarregar()),
+              preparar=lambda: registrar(None))
+
+
+def _git_sha():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark com dados sintéticos e Contents API falsa.")
+    parser.add_argument("--tamanhos", default="10000,100000",
+                        help="linhas da planilha, separadas por vírgula (ex.: 10000,100000,1000000)")
+    parser.add_argument("--logs", default="100000", help="linhas do logs.csv, separadas por vírgula (0 = pula)")
+    parser.add_argument("--repeticoes", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--saida", default="benchmark.json", help="arquivo JSON com os resultados")
+    args = parser.parse_args()
+
+    repo = fake_github.RepositorioFalso()
+    servidor, url = fake_github.iniciar(repo)
+    sessao = github_api.SessaoGitHub()
+    med = Medidor(repo, args.repeticoes)
+    tmp = tempfile.mkdtemp(prefix="bench_pecas_")
+    inicio = time.time()
+    try:
+        for n in (int(t) for t in args.tamanhos.split(",") if t.strip()):
+            bench_planilha(med, url, sessao, n, args.seed, tmp)
+        for n in (int(t) for t in args.logs.split(",") if t.strip()):
+            if n:
+                bench_logs(med, url, sessao, n, args.seed, tmp)
+    finally:
+        servidor.shutdown()
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    resultado = {
+        "meta": {
+            "data": datetime.now().isoformat(timespec="seconds"),
+            "duracao_s": round(time.time() - inicio, 1),
+            "git_sha": _git_sha(),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "plataforma": platform.platform(),
+            "repeticoes": args.repeticoes,
+            "seed": args.seed,
+        },
+        "resultados": med.resultados,
+    }
+    with open(args.saida, "w", encoding="utf-8") as f:
+        json.dump(resultado, f, ensure_ascii=False, indent=1)
+    print(f"Resultados em {args.saida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,831 @@
+# engine.py
+# Operações vetorizadas sobre a planilha de peças, sem dependência do Streamlit.
+import io
+import threading
+import uuid
+from collections import OrderedDict
+from functools import cached_property
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+import metricas
+from github_api import blob_sha
+
+# UFs atendidas (lista do cadastro)
+UFS = ["AM", "BA", "CE", "DF", "GO", "MA", "MG", "PA", "PE", "RJ", "TO"]
+ABA_PRINCIPAL = "PRINCIPAL"
+
+# =========================
+# IDENTIFICADOR ESTÁVEL DE LINHA
+# =========================
+# Gravado na planilha e usado como índice do DataFrame em memória; o journal
+# de operações (journal.py) se refere às linhas por ele.
+COL_ID = "ID_LINHA"
+
+
+def novo_id():
+    return uuid.uuid4().hex[:12]
+
+
+def preparar_ids(df, prefixo):
+    """Usa COL_ID como índice, preenchendo linhas sem id (ou com id repetido).
+
+    Linhas antigas ganham um id derivado de `prefixo` (o sha do arquivo) e da
+    posição, estável enquanto o arquivo não muda; ele passa a ser gravado na
+    próxima compactação.
+    """
+    if COL_ID in df.columns:
+        ids = df[COL_ID].astype(object)
+        ids = ids.where(ids.notna() & (ids.astype(str).str.strip() != ""), None).astype(object)
+        ids[ids.duplicated() & ids.notna()] = None
+        df = df.drop(columns=[COL_ID])
+    else:
+        ids = pd.Series(None, index=df.index, dtype=object)
+    faltando = ids.isna().to_numpy()
+    if faltando.any():
+        pos = np.flatnonzero(faltando)
+        ids[faltando] = [f"{prefixo}-{p}" for p in pos]
+    df.index = pd.Index(ids.astype(str).to_numpy(), name=COL_ID)
+    return df
+
+
+def para_gravar(df):
+    """DataFrame como vai para a planilha: o índice (ids) vira a coluna COL_ID."""
+    return df.rename_axis(COL_ID).reset_index()
+
+
+# =========================
+# MERGE DE 3 VIAS (POR LINHA)
+# =========================
+def _linhas_alteradas(df, base):
+    comuns = df.index.intersection(base.index)
+    if comuns.empty:
+        return comuns
+    a = df.loc[comuns].astype(object)
+    b = base.loc[comuns].astype(object)
+    iguais = (a == b) | (a.isna() & b.isna())
+    return comuns[~iguais.all(axis=1).to_numpy()]
+
+
+def mesclar_linhas(base, nosso, deles):
+    """Mescla duas edições (nosso, deles) feitas a partir da mesma base, por id de linha.
+
+    Inserções, exclusões e alterações que não mexem na mesma linha são
+    combinadas sobre a versão deles. Quando os dois lados mexem na mesma
+    linha com resultados diferentes, vale a versão deles e o id entra na
+    lista de conflitos. Retorna (df, conflitos).
+    """
+    colunas = list(deles.columns) + [c for c in nosso.columns if c not in deles.columns]
+    # os três com as mesmas colunas (uma coluna nova nossa fica vazia na base e na deles)
+    base = base.reindex(columns=colunas)
+    nosso = nosso.reindex(columns=colunas)
+    deles = deles.reindex(columns=colunas)
+    resultado = para_editar(deles)
+
+    nossos_ins = nosso.index.difference(base.index)
+    nossos_del = base.index.difference(nosso.index)
+    nossos_mod = _linhas_alteradas(nosso, base)
+    deles_del = base.index.difference(deles.index)
+    deles_mod = _linhas_alteradas(deles, base)
+
+    # conjuntos por id: alterada por nós e excluída por eles, alterada pelos
+    # dois com valores diferentes, excluída por nós e alterada por eles
+    mod_del = nossos_mod.intersection(deles_del)
+    mod_mod = _linhas_alteradas(nosso.loc[nossos_mod.intersection(deles_mod)], resultado)
+    del_mod = nossos_del.intersection(deles_mod)
+    conflitos = list(mod_del) + list(mod_mod) + list(del_mod)
+
+    aplicar = nossos_mod.difference(mod_del).difference(mod_mod)
+    if len(aplicar):
+        try:
+            resultado.loc[aplicar] = nosso.loc[aplicar]
+        except (TypeError, ValueError):
+            # coluna numérica recebendo texto (ou vice-versa)
+            resultado = resultado.astype(object)
+            resultado.loc[aplicar] = nosso.loc[aplicar]
+    remover = nossos_del.difference(deles_mod).intersection(resultado.index)
+    if len(remover):
+        resultado = resultado.drop(index=remover)
+    novos = nossos_ins.difference(resultado.index)
+    if len(novos):
+        resultado = pd.concat([resultado, nosso.loc[novos]])
+    return resultado, conflitos
+
+
+# =========================
+# TIPOS DAS COLUNAS
+# =========================
+# Esquema da aba PRINCIPAL, aplicado a todo Snapshot. Colunas de poucos
+# valores viram category; códigos e textos ficam em str (pyarrow). As datas
+# (DATA_FIM, CONTRATO_DATA) ficam como foram digitadas, em formatos
+# misturados, para voltarem iguais à planilha; o datetime64 delas é
+# calculado uma vez por snapshot (Snapshot.datas_fim).
+ESQUEMA = {
+    "UF": "category",
+    "SLA": "category",
+    "STATUS": "category",
+    "DATA_VERIFICACAO": "category",
+    "FRU": "str",
+    "SUB1": "str",
+    "SUB2": "str",
+    "SUB3": "str",
+    "DESCRICAO": "str",
+    "MAQUINAS": "str",
+    "CLIENTE": "str",
+    "CLIENTE_NOME": "str",
+    "SERIAL": "str",
+    "CONTRATO_DATA": "str",
+}
+
+
+def _no_tipo(serie, tipo):
+    if tipo == "category":
+        return isinstance(serie.dtype, pd.CategoricalDtype)
+    return isinstance(serie.dtype, pd.StringDtype)
+
+
+def _converter(serie, tipo):
+    if tipo == "category":
+        return serie.astype("category")
+    if pd.api.types.is_float_dtype(serie) and (serie.dropna() % 1 == 0).all():
+        # coluna de números inteiros com células vazias: "12", não "12.0"
+        serie = serie.astype("Int64")
+    # "str" é o StringDtype do pandas 3 (pyarrow, células vazias como NaN); no
+    # pandas 2 viraria object com o texto "nan" (requirements.txt fixa pandas>=3)
+    return serie.astype("str")
+
+
+def aplicar_esquema(df):
+    """`df` com os tipos de ESQUEMA nas colunas conhecidas (o próprio df se já estiverem)."""
+    mudar = {col: _converter(df[col], tipo) for col, tipo in ESQUEMA.items()
+             if col in df.columns and not _no_tipo(df[col], tipo)}
+    return df.assign(**mudar) if mudar else df
+
+
+def para_editar(df):
+    """Cópia editável de um df de snapshot: colunas category voltam a object,
+    então aceitam qualquer valor novo. O Snapshot criado depois reaplica o esquema.
+    """
+    novo = df.copy()
+    for col in novo.columns:
+        if isinstance(novo[col].dtype, pd.CategoricalDtype):
+            novo[col] = novo[col].astype(object)
+    return novo
+
+
+# =========================
+# ARQUIVO DA PLANILHA (xlsx)
+# =========================
+def ler_planilha(conteudo):
+    """Snapshot a partir dos bytes do SALDO_PECAS.xlsx (aba PRINCIPAL)."""
+    with metricas.medir("read_excel", ABA_PRINCIPAL) as span:
+        span["bytes"] = len(conteudo)
+        df = pd.read_excel(io.BytesIO(conteudo), sheet_name=ABA_PRINCIPAL)
+    return Snapshot(preparar_ids(df, blob_sha(conteudo)[:8]))
+
+
+def serializar_planilha(df):
+    """Bytes do xlsx (aba PRINCIPAL) com o id de linha como coluna."""
+    output = io.BytesIO()
+    with metricas.medir("to_excel", ABA_PRINCIPAL) as span:
+        with pd.ExcelWriter(output, engine="openpyxl") as writer:
+            para_gravar(df).to_excel(writer, sheet_name=ABA_PRINCIPAL, index=False)
+        span["bytes"] = output.tell()
+    return output.getvalue()
+
+
+# =========================
+# DATAS
+# =========================
+# Serial do Excel: dia 1 = 1900-01-01, contando o 29/02/1900 que não existiu
+EXCEL_EPOCH = pd.Timestamp("1899-12-30")
+EXCEL_SERIAL_MAX = 2958465  # 31/12/9999
+
+_FORMATOS_TEXTO = (
+    (r"\d{1,2}/\d{1,2}/\d{4}", "%d/%m/%Y"),
+    (r"\d{1,2}/\d{1,2}/\d{2}", "%d/%m/%y"),
+)
+
+
+def normalizar_datas(serie):
+    """Converte uma coluna de datas mistas em datetime64 (NaT quando não reconhece).
+
+    Aceita datetime/Timestamp, "dd/mm/aa", "dd/mm/aaaa", ISO ("aaaa-mm-dd",
+    com ou sem hora) e serial numérico do Excel, em poucas passadas vetorizadas
+    (uma por formato) em vez de testar formato por formato em cada célula.
+    """
+    serie = pd.Series(serie)
+    out = pd.Series(pd.NaT, index=serie.index, dtype="datetime64[ns]")
+    if serie.empty:
+        return out
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        return serie.dt.normalize()
+    if pd.api.types.is_numeric_dtype(serie) and not pd.api.types.is_bool_dtype(serie):
+        return _serial_excel(serie)
+
+    # datetime/date viram "aaaa-mm-dd[ hh:mm:ss]" e caem no formato ISO
+    txt = serie.astype(str).str.strip()
+    resto = serie.notna()
+
+    for padrao, fmt in _FORMATOS_TEXTO:
+        m = resto & txt.str.fullmatch(padrao).fillna(False).astype(bool)
+        if m.any():
+            out[m] = pd.to_datetime(txt[m], format=fmt, errors="coerce")
+            resto &= ~m
+
+    m = resto & txt.str.match(r"\d{4}-\d{2}-\d{2}").fillna(False).astype(bool)
+    if m.any():
+        out[m] = pd.to_datetime(txt[m].str.slice(0, 10), format="%Y-%m-%d", errors="coerce")
+        resto &= ~m
+
+    if resto.any():
+        out[resto] = _serial_excel(pd.to_numeric(txt[resto], errors="coerce"))
+
+    return out
+
+
+def _serial_excel(numeros):
+    numeros = pd.to_numeric(numeros, errors="coerce").astype("float64")
+    validos = (numeros >= 1) & (numeros <= EXCEL_SERIAL_MAX)
+    dias = np.floor(numeros.where(validos))
+    return (EXCEL_EPOCH + pd.to_timedelta(dias, unit="D")).astype("datetime64[ns]")
+
+
+# =========================
+# STATUS DO CONTRATO
+# =========================
+# Gravado na planilha pelo job em lote (recalcular_status.py) e pelas telas
+# que mexem em DATA_FIM; mesmas fronteiras de Snapshot.vencidas/a_vencer
+STATUS_DENTRO = "DENTRO"
+STATUS_A_VENCER = "A_VENCER"
+STATUS_VENCIDO = "VENCIDO"
+DIAS_A_VENCER = 30  # janela padrão do "a vencer" (a mesma do Relatório)
+
+
+def calcular_status(datas, hoje, dias=DIAS_A_VENCER):
+    """STATUS de cada data (datetime64): VENCIDO antes de `hoje`, A_VENCER até
+    `hoje` + `dias` (inclusive), DENTRO depois disso; None sem data válida.
+    """
+    datas = pd.Series(datas)
+    hoje = pd.Timestamp(hoje).normalize()
+    limite = hoje + pd.Timedelta(days=int(dias) + 1)
+    status = np.select(
+        [(datas < hoje).to_numpy(), (datas < limite).to_numpy(), datas.notna().to_numpy()],
+        [STATUS_VENCIDO, STATUS_A_VENCER, STATUS_DENTRO],
+        default=None,
+    )
+    return pd.Series(status, index=datas.index, dtype=object)
+
+
+def status_da_data(data, hoje, dias=DIAS_A_VENCER):
+    """calcular_status de uma data só (cadastro, renovação)."""
+    return calcular_status(normalizar_datas([data]), hoje, dias).iloc[0] or STATUS_DENTRO
+
+
+# =========================
+# CLIENTE ESTRUTURADO
+# =========================
+# Colunas gravadas pela migração (migrar_cliente) e pelos cadastros novos
+COLUNAS_CLIENTE = ["CLIENTE_NOME", "SERIAL", "CONTRATO_DATA"]
+_PARTES_CLIENTE = COLUNAS_CLIENTE + ["SLA", "UF"]
+_FORMATOS_CLIENTE = (
+    # app.py:     "NOME - (SERIAL dd/mm/aa_SLA) - UF"
+    r"^(?P<CLIENTE_NOME>.*?)\s*-\s*\(\s*(?P<SERIAL>.*?)\s+(?P<CONTRATO_DATA>\d{1,2}/\d{1,2}/\d{2,4})_(?P<SLA>[^)]*?)\s*\)\s*-\s*(?P<UF>[A-Z]{2})$",
+    # new_app.py: "NOME(SERIAL_aaaa-mm-dd_SLA)UF"
+    r"^(?P<CLIENTE_NOME>.*?)\s*\(\s*(?P<SERIAL>[^()]*?)_(?P<CONTRATO_DATA>\d{4}-\d{2}-\d{2})_(?P<SLA>[^)]*?)\s*\)\s*(?P<UF>[A-Z]{2})$",
+)
+
+
+def _vazio(serie):
+    return serie.isna().to_numpy() | (serie.astype("string").str.strip() == "").fillna(True).to_numpy()
+
+
+def decompor_cliente(serie):
+    """Separa CLIENTE em CLIENTE_NOME, SERIAL, CONTRATO_DATA (datetime64), SLA e UF.
+
+    Reconhece os dois formatos gravados pelos apps, um str.extract por
+    formato sobre a coluna inteira. Texto fora dos dois formatos fica todo
+    em CLIENTE_NOME, com as outras partes vazias.
+    """
+    texto = serie.astype("string").str.strip().str.upper()
+    partes = pd.DataFrame(pd.NA, index=serie.index, columns=_PARTES_CLIENTE, dtype=object)
+    resto = ~_vazio(texto)
+    for padrao in _FORMATOS_CLIENTE:
+        if not resto.any():
+            break
+        achou = texto[resto].str.extract(padrao)
+        ok = achou["SERIAL"].notna().to_numpy()
+        pos = np.flatnonzero(resto)[ok]
+        partes.iloc[pos] = achou[ok][_PARTES_CLIENTE].to_numpy(dtype=object)
+        resto[pos] = False
+    partes.iloc[np.flatnonzero(resto), 0] = texto[resto].to_numpy(dtype=object)
+    partes["CONTRATO_DATA"] = normalizar_datas(partes["CONTRATO_DATA"])
+    return partes
+
+
+def campos_cliente(nome, serial, data):
+    """Colunas estruturadas de um cadastro novo (mesmo formato gravado pela migração)."""
+    return {"CLIENTE_NOME": nome, "SERIAL": serial, "CONTRATO_DATA": pd.Timestamp(data).strftime("%d/%m/%y")}
+
+
+def clientes_sem_migrar(df):
+    """Quantas linhas têm CLIENTE mas ainda não têm CLIENTE_NOME gravado."""
+    if "CLIENTE" not in df.columns:
+        return 0
+    sem_nome = _vazio(df["CLIENTE_NOME"]) if "CLIENTE_NOME" in df.columns else np.ones(len(df), dtype=bool)
+    return int((sem_nome & ~_vazio(df["CLIENTE"])).sum())
+
+
+def migrar_cliente(df):
+    """Grava CLIENTE_NOME / SERIAL / CONTRATO_DATA (e SLA / UF vazios) a partir de CLIENTE.
+
+    Só mexe nas linhas ainda sem CLIENTE_NOME; rodar de novo não muda nada.
+    Retorna (df novo, número de linhas migradas).
+    """
+    if "CLIENTE" not in df.columns:
+        return df, 0
+    novo = para_editar(df)
+    for col in _PARTES_CLIENTE:
+        novo[col] = novo[col].astype(object) if col in novo.columns else pd.Series(pd.NA, index=novo.index, dtype=object)
+    faltando = _vazio(novo["CLIENTE_NOME"]) & ~_vazio(novo["CLIENTE"])
+    if not faltando.any():
+        return novo, 0
+    partes = decompor_cliente(novo.loc[faltando, "CLIENTE"])
+    partes["CONTRATO_DATA"] = partes["CONTRATO_DATA"].dt.strftime("%d/%m/%y").astype(object)
+    for col in COLUNAS_CLIENTE:
+        novo.loc[faltando, col] = partes[col].to_numpy(dtype=object)
+    for col in ("SLA", "UF"):
+        # SLA / UF já preenchidos na planilha prevalecem sobre o texto do CLIENTE
+        preencher = faltando & _vazio(novo[col])
+        novo.loc[preencher, col] = partes[col].to_numpy(dtype=object)[preencher[faltando]]
+    return novo, int(faltando.sum())
+
+
+# =========================
+# ÍNDICE DE VENCIMENTO
+# =========================
+class IndiceVencimento:
+    """Rótulos das linhas ordenados por DATA_FIM, separados por UF.
+
+    "Vencidas até X" e "a vencer nos próximos N dias" viram busca binária
+    (np.searchsorted) em cada UF. Linhas sem data válida ficam de fora.
+    """
+
+    def __init__(self, datas, ufs):
+        self._particoes = {}
+        self._linha = {}  # rótulo -> (uf, data em ns)
+        validas = datas.notna()
+        if not validas.any():
+            return
+        ns = datas[validas].to_numpy(dtype="datetime64[ns]").astype("int64")
+        rotulos = datas.index[validas].to_numpy()
+        ufs = ufs[validas].to_numpy()
+        ordem = np.lexsort((ns, ufs))
+        ns, rotulos, ufs = ns[ordem], rotulos[ordem], ufs[ordem]
+        inicios = np.flatnonzero(np.r_[True, ufs[1:] != ufs[:-1]])
+        fins = np.r_[inicios[1:], len(ufs)]
+        for i, f in zip(inicios, fins):
+            self._particoes[ufs[i]] = (ns[i:f], rotulos[i:f])
+        self._linha = dict(zip(rotulos.tolist(), zip(ufs.tolist(), ns.tolist())))
+
+    def copy(self):
+        novo = IndiceVencimento.__new__(IndiceVencimento)
+        novo._particoes = dict(self._particoes)
+        novo._linha = dict(self._linha)
+        return novo
+
+    def _intervalo(self, inicio, fim, ufs):
+        """Rótulos com inicio <= data < fim (None = sem limite)."""
+        ini = None if inicio is None else pd.Timestamp(inicio).value
+        lim = None if fim is None else pd.Timestamp(fim).value
+        chaves = self._particoes if ufs is None else {str(u).strip().upper() for u in ufs}
+        partes = []
+        for uf in chaves:
+            if uf not in self._particoes:
+                continue
+            ns, rotulos = self._particoes[uf]
+            a = 0 if ini is None else np.searchsorted(ns, ini, side="left")
+            b = len(ns) if lim is None else np.searchsorted(ns, lim, side="left")
+            if b > a:
+                partes.append(rotulos[a:b])
+        if not partes:
+            return np.empty(0, dtype=object)
+        return np.concatenate(partes)
+
+    def vencidas(self, data, ufs=None):
+        """Rótulos com DATA_FIM anterior a `data`."""
+        return self._intervalo(None, pd.Timestamp(data).normalize(), ufs)
+
+    def a_vencer(self, data, dias, ufs=None):
+        """Rótulos com DATA_FIM de `data` até `data` + `dias` (inclusive)."""
+        inicio = pd.Timestamp(data).normalize()
+        return self._intervalo(inicio, inicio + pd.Timedelta(days=int(dias) + 1), ufs)
+
+    def remover(self, rotulo):
+        atual = self._linha.pop(rotulo, None)
+        if atual is None:
+            return
+        uf, valor = atual
+        ns, rotulos = self._particoes[uf]
+        a = np.searchsorted(ns, valor, side="left")
+        b = np.searchsorted(ns, valor, side="right")
+        i = a + np.flatnonzero(rotulos[a:b] == rotulo)[0]
+        self._particoes[uf] = (np.delete(ns, i), np.delete(rotulos, i))
+
+    def atualizar(self, rotulo, data, uf):
+        """Insere ou move uma linha (data NaT tira a linha do índice)."""
+        self.remover(rotulo)
+        if pd.isna(data):
+            return
+        valor = pd.Timestamp(data).value
+        ns, rotulos = self._particoes.get(uf, (np.empty(0, dtype="int64"), np.empty(0, dtype=object)))
+        i = np.searchsorted(ns, valor, side="right")
+        self._particoes[uf] = (np.insert(ns, i, valor), np.insert(rotulos.astype(object), i, rotulo))
+        self._linha[rotulo] = (uf, valor)
+
+
+# =========================
+# ÍNDICE DE BUSCA
+# =========================
+COLUNAS_PECA = ["FRU", "SUB1", "SUB2", "SUB3"]
+COLUNAS_BUSCA = COLUNAS_PECA + ["DESCRICAO", "MAQUINAS", "CLIENTE"]
+_FIM_PREFIXO = "\U0010ffff"
+
+
+def _normalizar_texto(serie):
+    """Maiúsculas, sem espaços nas pontas; nulos viram ''."""
+    # "string" primeiro: aceita colunas de tipos mistos (números e texto)
+    return serie.astype("string").astype(pd.ArrowDtype(pa.string())).fillna("").str.upper().str.strip()
+
+
+def _termos(serie):
+    # acentos são decompostos (NFKD) e removidos antes da pontuação virar
+    # espaço: "ALIMENTAÇÃO" vira um termo só, ALIMENTACAO
+    texto = (_normalizar_texto(serie).str.normalize("NFKD").str.replace(r"\p{Mn}+", "", regex=True)
+             .str.replace(r"[^A-Z0-9]+", " ", regex=True))
+    return texto.str.strip().str.split(" ")
+
+
+def termos(texto):
+    """Termos de busca de um texto livre (mesma regra usada para indexar)."""
+    return [t for t in _termos(pd.Series([texto])).iloc[0] if t]
+
+
+def _agrupar(chaves, pos):
+    """(chaves distintas ordenadas, início de cada uma, posições): chave k -> pos[inicios[k]:inicios[k+1]]."""
+    codigos, distintas = pd.factorize(chaves, sort=True)
+    ordem = np.lexsort((pos, codigos))
+    codigos, pos = codigos[ordem], pos[ordem]
+    # a mesma chave repetida na mesma linha (em colunas diferentes) conta uma vez
+    unico = np.ones(len(pos), dtype=bool)
+    unico[1:] = (codigos[1:] != codigos[:-1]) | (pos[1:] != pos[:-1])
+    codigos, pos = codigos[unico], pos[unico]
+    distintas = np.asarray(distintas, dtype=object)
+    return distintas, np.searchsorted(codigos, np.arange(len(distintas) + 1)), pos
+
+
+class IndiceBusca:
+    """Índice invertido (termo -> posições das linhas) com busca por prefixo.
+
+    Os termos ficam num array ordenado e as posições de todos eles num único
+    array, termo após termo; um prefixo vira um intervalo contíguo
+    (np.searchsorted), sem percorrer as linhas. Guarda também, para
+    FRU/SUB1-3, o código exato de cada linha, usado para expandir a busca
+    para as peças substitutas.
+    """
+
+    def __init__(self, df):
+        n = len(df)
+        vazio = pd.Series([], dtype=pd.ArrowDtype(pa.string()))
+        listas = [
+            _termos(df[col]).set_axis(np.arange(n)).explode()
+            for col in COLUNAS_BUSCA if col in df.columns
+        ]
+        tudo = pd.concat(listas) if listas else vazio
+        tudo = tudo[tudo.notna() & (tudo != "")]
+        self.termos, self._inicios, self._posicoes = _agrupar(tudo, tudo.index.to_numpy(dtype=np.intp))
+
+        # código de peça de cada linha (n x 4) e código -> posições
+        pecas = [_normalizar_texto(df[c]).set_axis(np.arange(n)) for c in COLUNAS_PECA if c in df.columns]
+        self._codigos = (
+            np.column_stack([p.to_numpy(dtype=object) for p in pecas]) if pecas else np.empty((n, 0), dtype=object)
+        )
+        tudo = pd.concat(pecas) if pecas else vazio
+        tudo = tudo[tudo != ""]
+        self._pecas, self._inicios_peca, self._posicoes_peca = _agrupar(tudo, tudo.index.to_numpy(dtype=np.intp))
+
+    def prefixo(self, termo):
+        """Posições (ordenadas) das linhas com algum termo começando por `termo`."""
+        ini, fim = np.searchsorted(self.termos, [termo, termo + _FIM_PREFIXO])
+        return np.unique(self._posicoes[self._inicios[ini]:self._inicios[fim]])
+
+    def buscar(self, texto):
+        """Linhas que têm todos os termos do texto (cada um como prefixo)."""
+        resultado = None
+        for termo in termos(texto):
+            pos = self.prefixo(termo)
+            resultado = pos if resultado is None else np.intersect1d(resultado, pos, assume_unique=True)
+            if not len(resultado):
+                break
+        return resultado if resultado is not None else np.array([], dtype=np.intp)
+
+    def substitutos(self, posicoes):
+        """Linhas que compartilham algum código FRU/SUB1-3 com as linhas dadas (exceto elas)."""
+        codigos = np.array(sorted({c for c in self._codigos[posicoes].ravel() if c}), dtype=object)
+        k = np.searchsorted(self._pecas, codigos)
+        partes = [self._posicoes_peca[self._inicios_peca[i]:self._inicios_peca[i + 1]] for i in k]
+        if not partes:
+            return np.array([], dtype=np.intp)
+        return np.setdiff1d(np.unique(np.concatenate(partes)), posicoes, assume_unique=True)
+
+
+# =========================
+# SNAPSHOT DA PLANILHA
+# =========================
+class Snapshot:
+    """Uma versão da planilha (somente leitura) e o que é derivado dela.
+
+    Cada estrutura derivada é calculada uma única vez por versão e
+    compartilhada por todas as sessões; para editar, use para_editar(df).
+    """
+
+    # aumente quando mudar o que vai para o cache em disco (__getstate__)
+    VERSAO = 3
+    CONSULTAS_GUARDADAS = 32
+
+    def __init__(self, df):
+        self.df = aplicar_esquema(df)
+        self._lock = threading.Lock()
+        self._por_ufs = {}
+        self._consultas = OrderedDict()
+        self._distintos = {}
+
+    def __getstate__(self):
+        # no cache em disco vai só a planilha; o resto é recalculado sob demanda
+        return {"df": self.df}
+
+    def __setstate__(self, estado):
+        self.__init__(estado["df"])
+
+    def aquecer(self):
+        """Calcula de antemão o que toda página usa (datas, UFs, índice de vencimento)."""
+        self.posicoes_uf
+        self.indice_vencimento
+        return self
+
+    @cached_property
+    def datas_fim(self):
+        """DATA_FIM normalizada (datetime64, mesmo índice de df)."""
+        if "DATA_FIM" not in self.df.columns:
+            return pd.Series(pd.NaT, index=self.df.index, dtype="datetime64[ns]")
+        with metricas.medir("parse_datas", "DATA_FIM"):
+            return normalizar_datas(self.df["DATA_FIM"])
+
+    @cached_property
+    def ufs(self):
+        """UF normalizada (sem espaços, maiúscula) de cada linha; "" quando em branco."""
+        if "UF" not in self.df.columns:
+            return pd.Series("", index=self.df.index, dtype=object)
+        # astype(str) mantém NaN, que não ordena junto com texto (IndiceVencimento)
+        return self.df["UF"].astype(object).fillna("").astype(str).str.strip().str.upper()
+
+    @cached_property
+    def posicoes_uf(self):
+        """UF -> posições (np.ndarray, em ordem) das linhas daquela UF."""
+        if "UF" not in self.df.columns:
+            return {}
+        return dict(self.ufs.groupby(self.ufs, sort=False).indices)
+
+    def da_uf(self, ufs):
+        """Linhas das UFs pedidas, na ordem da planilha e com o índice original.
+
+        O resultado é guardado por conjunto de UFs: usuários com a mesma
+        permissão recebem o mesmo DataFrame (somente leitura), sem nova cópia.
+        """
+        chave = frozenset(str(u).strip().upper() for u in ufs)
+        with self._lock:
+            df = self._por_ufs.get(chave)
+        if df is None:
+            partes = [self.posicoes_uf[u] for u in chave if u in self.posicoes_uf]
+            pos = np.sort(np.concatenate(partes)) if partes else np.empty(0, dtype=np.intp)
+            df = self.df.take(pos)
+            with self._lock:
+                df = self._por_ufs.setdefault(chave, df)
+        return df
+
+    def distintos(self, coluna):
+        """Valores distintos (texto, maiúsculo, ordenados) de uma coluna, p/ montar filtros."""
+        with self._lock:
+            valores = self._distintos.get(coluna)
+        if valores is None:
+            if coluna in self.df.columns:
+                serie = self.df[coluna].dropna().astype(str).str.strip().str.upper()
+                valores = sorted(v for v in serie.unique() if v)
+            else:
+                valores = []
+            with self._lock:
+                self._distintos[coluna] = valores
+        return valores
+
+    def consulta(self, ufs=None, fru="", slas=(), data_de=None, data_ate=None, ordenar_por=None, decrescente=False):
+        """Posições (np.ndarray) das linhas que passam nos filtros, na ordem pedida.
+
+        ufs=None não filtra UF; fru filtra por trecho (sem diferenciar
+        maiúsculas); data_de/data_ate limitam DATA_FIM (inclusive). O resultado
+        fica guardado por combinação de filtros (as últimas
+        CONSULTAS_GUARDADAS), então trocar de página só fatia as posições.
+        """
+        chave = (
+            None if ufs is None else frozenset(str(u).strip().upper() for u in ufs),
+            str(fru or "").strip().upper(),
+            frozenset(str(s).strip().upper() for s in slas),
+            None if data_de is None else pd.Timestamp(data_de),
+            None if data_ate is None else pd.Timestamp(data_ate),
+            ordenar_por,
+            bool(decrescente),
+        )
+        with self._lock:
+            pos = self._consultas.get(chave)
+            if pos is not None:
+                self._consultas.move_to_end(chave)
+                return pos
+
+        ufs, fru, slas, data_de, data_ate = chave[:5]
+        mascara = np.ones(len(self.df), dtype=bool)
+        if ufs is not None:
+            mascara &= self.ufs.isin(ufs).to_numpy()
+        if fru:
+            if "FRU" not in self.df.columns:
+                mascara[:] = False
+            else:
+                mascara &= self.df["FRU"].astype(str).str.upper().str.contains(fru, regex=False).to_numpy()
+        if slas:
+            if "SLA" not in self.df.columns:
+                mascara[:] = False
+            else:
+                mascara &= self.df["SLA"].astype(str).str.strip().str.upper().isin(slas).to_numpy()
+        if data_de is not None or data_ate is not None:
+            datas = self.datas_fim.to_numpy()
+            if data_de is not None:
+                mascara &= datas >= data_de.to_datetime64()
+            if data_ate is not None:
+                mascara &= datas < (data_ate + pd.Timedelta(days=1)).to_datetime64()
+        pos = np.flatnonzero(mascara)
+
+        if ordenar_por is not None and ordenar_por in self.df.columns and len(pos):
+            if ordenar_por == "DATA_FIM":
+                valores = self.datas_fim.iloc[pos]
+            else:
+                valores = self.df[ordenar_por].iloc[pos]
+                if not pd.api.types.is_numeric_dtype(valores):
+                    valores = valores.astype("string").str.upper()
+            ordem = valores.reset_index(drop=True).sort_values(
+                ascending=not decrescente, kind="stable", na_position="last"
+            ).index.to_numpy()
+            pos = pos[ordem]
+
+        with self._lock:
+            self._consultas[chave] = pos
+            while len(self._consultas) > self.CONSULTAS_GUARDADAS:
+                self._consultas.popitem(last=False)
+        return pos
+
+    @cached_property
+    def cliente(self):
+        """CLIENTE decomposto (CLIENTE_NOME, SERIAL, CONTRATO_DATA, SLA, UF), mesmo índice de df.
+
+        Linhas já migradas usam as colunas gravadas; só as demais passam
+        pelo parser (decompor_cliente). SLA e UF da planilha prevalecem.
+        """
+        with metricas.medir("parse_cliente"):
+            return self._decompor_cliente(self.df)
+
+    @staticmethod
+    def _decompor_cliente(df):
+        if "CLIENTE" not in df.columns:
+            return pd.DataFrame(pd.NA, index=df.index, columns=_PARTES_CLIENTE, dtype=object)
+        if all(c in df.columns for c in COLUNAS_CLIENTE):
+            gravado = ~_vazio(df["CLIENTE_NOME"])
+        else:
+            gravado = np.zeros(len(df), dtype=bool)
+        partes = decompor_cliente(df["CLIENTE"].iloc[~gravado])
+        if gravado.any():
+            ja = df.iloc[gravado].reindex(columns=_PARTES_CLIENTE).astype(object)
+            ja["CONTRATO_DATA"] = normalizar_datas(ja["CONTRATO_DATA"])
+            partes = pd.concat([partes, ja]).reindex(df.index)
+        for col in ("SLA", "UF"):
+            if col in df.columns:
+                planilha = df[col].astype("string").str.strip().str.upper()
+                partes[col] = planilha.where(~_vazio(planilha), partes[col]).astype(object)
+        for col in ("CLIENTE_NOME", "SERIAL"):
+            partes[col] = partes[col].astype("string").str.strip().str.upper().astype(object)
+        return partes
+
+    def por_serial(self, serial, ufs=None):
+        """Linhas do SERIAL (comparação exata, sem diferenciar maiúsculas)."""
+        mascara = (self.cliente["SERIAL"] == str(serial).strip().upper()).fillna(False).to_numpy(dtype=bool)
+        if ufs is not None:
+            mascara &= self.ufs.isin({str(u).strip().upper() for u in ufs}).to_numpy()
+        return self.df.iloc[np.flatnonzero(mascara)]
+
+    def resumo_clientes(self, data, ufs=None):
+        """Por CLIENTE_NOME: peças, seriais distintos, vencidas em `data` e próximo vencimento."""
+        cliente = self.cliente
+        base = pd.DataFrame({
+            "CLIENTE_NOME": cliente["CLIENTE_NOME"],
+            "SERIAL": cliente["SERIAL"],
+            "DATA_FIM": self.datas_fim,
+        })
+        if ufs is not None:
+            base = base[self.ufs.isin({str(u).strip().upper() for u in ufs}).to_numpy()]
+        base = base[base["CLIENTE_NOME"].notna()]
+        data = pd.Timestamp(data).normalize()
+        futuras = base["DATA_FIM"].where(base["DATA_FIM"] >= data)
+        resumo = base.assign(VENCIDA=base["DATA_FIM"] < data, FUTURA=futuras).groupby("CLIENTE_NOME").agg(
+            PECAS=("SERIAL", "size"),
+            SERIAIS=("SERIAL", "nunique"),
+            VENCIDAS=("VENCIDA", "sum"),
+            PROXIMO_VENCIMENTO=("FUTURA", "min"),
+        )
+        return resumo.sort_values(["VENCIDAS", "PECAS"], ascending=False)
+
+    @cached_property
+    def indice_busca(self):
+        with metricas.medir("indice_busca"):
+            return IndiceBusca(self.df)
+
+    def buscar(self, texto, ufs=None, substitutos=True):
+        """(diretas, via_substitutos): linhas que casam com `texto` e as que
+        compartilham com elas um código FRU/SUB1-3, restritas às `ufs`
+        (None: todas). Cada termo do texto vale como prefixo.
+        """
+        indice = self.indice_busca
+        diretas = indice.buscar(texto)
+        extras = indice.substitutos(diretas) if substitutos and len(diretas) else np.array([], dtype=np.intp)
+        if ufs is not None:
+            permitidas = self.ufs.isin({str(u).strip().upper() for u in ufs}).to_numpy()
+            diretas, extras = diretas[permitidas[diretas]], extras[permitidas[extras]]
+        return self.df.take(diretas), self.df.take(extras)
+
+    @cached_property
+    def indice_vencimento(self):
+        datas_fim = self.datas_fim
+        with metricas.medir("indice_vencimento"):
+            return IndiceVencimento(datas_fim, self.ufs)
+
+    def _na_ordem(self, rotulos):
+        # devolve as linhas na ordem da planilha
+        return self.df.iloc[np.sort(self.df.index.get_indexer(rotulos))]
+
+    def vencidas(self, data, ufs=None):
+        """Linhas com DATA_FIM anterior a `data` (ufs=None: todas as UFs)."""
+        return self._na_ordem(self.indice_vencimento.vencidas(data, ufs))
+
+    def a_vencer(self, data, dias, ufs=None):
+        """Linhas com DATA_FIM entre `data` e `data` + `dias`."""
+        return self._na_ordem(self.indice_vencimento.a_vencer(data, dias, ufs))
+
+    def com_status(self, hoje, dias=DIAS_A_VENCER):
+        """Cópia do df com STATUS recalculado pela DATA_FIM e DATA_VERIFICACAO = `hoje`.
+
+        Linhas sem DATA_FIM reconhecível mantêm o STATUS que tinham.
+        """
+        hoje = pd.Timestamp(hoje).normalize()
+        with metricas.medir("status"):
+            status = calcular_status(self.datas_fim, hoje, dias)
+            df = self.df.copy()
+            if "STATUS" in df.columns:
+                status = status.fillna(df["STATUS"])
+            df["STATUS"] = status
+            df["DATA_VERIFICACAO"] = hoje.strftime("%d/%m/%y")
+        return df
+
+    def derivar(self, df_novo, alterados=(), removidos=()):
+        """Snapshot de `df_novo`, que é este df com poucas linhas inseridas/alteradas/removidas.
+
+        As estruturas que já foram calculadas e aceitam atualização
+        incremental (datas_fim, indice_vencimento, cliente) são levadas adiante
+        aplicando só as linhas mexidas, sem reconstruir do zero.
+        """
+        novo = Snapshot(df_novo)
+        alterados, removidos = list(alterados), list(removidos)
+        if "datas_fim" in self.__dict__ and "DATA_FIM" in df_novo.columns:
+            datas = self.datas_fim.drop(index=removidos + alterados, errors="ignore")
+            if alterados:
+                datas = pd.concat([datas, normalizar_datas(df_novo.loc[alterados, "DATA_FIM"])])
+            novo.__dict__["datas_fim"] = datas.reindex(df_novo.index)
+            if "indice_vencimento" in self.__dict__:
+                indice = self.indice_vencimento.copy()
+                for rotulo in removidos:
+                    indice.remover(rotulo)
+                for rotulo in alterados:
+                    indice.atualizar(rotulo, novo.datas_fim[rotulo], novo.ufs[rotulo])
+                novo.__dict__["indice_vencimento"] = indice
+        if "cliente" in self.__dict__:
+            partes = self.cliente.drop(index=removidos + alterados, errors="ignore")
+            if alterados:
+                partes = pd.concat([partes, self._decompor_cliente(df_novo.loc[alterados])])
+            novo.__dict__["cliente"] = partes.reindex(df_novo.index)
+        return novo
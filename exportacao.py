@@ -0,0 +1,82 @@
+# exportacao.py
+# Exportação em blocos (CSV / TSV / XLSX) com seleção de colunas e filtros no servidor.
+import io
+import tempfile
+
+import numpy as np
+from openpyxl import Workbook
+
+import metricas
+
+LINHAS_POR_BLOCO = 5000
+TAMANHO_LEITURA = 256 * 1024
+EM_MEMORIA_ATE = 8 * 1024 * 1024  # acima disso o arquivo temporário vai para o disco
+
+# rótulo -> (extensão, mime, separador; None = xlsx)
+FORMATOS = {
+    "CSV": ("csv", "text/csv", ","),
+    "TXT (tabulado)": ("txt", "text/tab-separated-values", "\t"),
+    "XLSX": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", None),
+}
+
+
+def posicoes_filtradas(df, filtros=None):
+    """Posições das linhas que contêm o texto de cada filtro ({coluna: texto}), sem copiar o df."""
+    mascara = np.ones(len(df), dtype=bool)
+    for coluna, texto in (filtros or {}).items():
+        texto = str(texto).strip()
+        if texto and coluna in df.columns:
+            mascara &= df[coluna].astype(str).str.contains(texto, case=False, regex=False).to_numpy()
+    return np.flatnonzero(mascara)
+
+
+def _blocos(df, colunas, posicoes):
+    for inicio in range(0, len(posicoes), LINHAS_POR_BLOCO):
+        yield df.take(posicoes[inicio:inicio + LINHAS_POR_BLOCO])[colunas]
+
+
+def blocos_texto(df, colunas, posicoes, sep=",", encoding="utf-8"):
+    """Gera o CSV/TSV já codificado, um bloco de linhas por vez."""
+    yield (sep.join(map(str, colunas)) + "\n").encode(encoding)
+    for bloco in _blocos(df, colunas, posicoes):
+        yield bloco.to_csv(index=False, header=False, sep=sep, lineterminator="\n").encode(encoding)
+
+
+def blocos_xlsx(df, colunas, posicoes, aba="dados"):
+    """Gera o XLSX com o modo write-only do openpyxl (linhas não ficam em memória)."""
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(aba)
+    ws.append([str(c) for c in colunas])
+    for bloco in _blocos(df, colunas, posicoes):
+        valores = bloco.astype(object).where(bloco.notna(), None)
+        for linha in valores.itertuples(index=False, name=None):
+            ws.append(list(linha))
+    with tempfile.SpooledTemporaryFile(max_size=EM_MEMORIA_ATE) as tmp:
+        wb.save(tmp)
+        tmp.seek(0)
+        while True:
+            pedaco = tmp.read(TAMANHO_LEITURA)
+            if not pedaco:
+                break
+            yield pedaco
+
+
+def exportar(df, formato, colunas=None, filtros=None):
+    """Gerador de bytes do arquivo no `formato` (chave de FORMATOS)."""
+    colunas = [c for c in (colunas or df.columns) if c in df.columns]
+    posicoes = posicoes_filtradas(df, filtros)
+    sep = FORMATOS[formato][2]
+    if sep is None:
+        return blocos_xlsx(df, colunas, posicoes)
+    return blocos_texto(df, colunas, posicoes, sep=sep)
+
+
+def para_buffer(blocos, detalhe=""):
+    """Escreve os blocos num BytesIO (o download_button lê o buffer sem outra cópia em str)."""
+    buf = io.BytesIO()
+    with metricas.medir("exportar", detalhe) as span:
+        for pedaco in blocos:
+            buf.write(pedaco)
+        span["bytes"] = buf.tell()
+    buf.seek(0)
+    return buf
@@ -0,0 +1,187 @@
+# fake_github.py
+"""Servidor local que imita a Contents API do GitHub (GET/PUT) para testes offline.
+
+Uso:
+    python fake_github.py --dir . --porta 8765
+
+e rode o app apontando para ele:
+    PECAS_API_BASE=http://127.0.0.1:8765/repos/otavilobato/pecas1/contents streamlit run app.py
+"""
+import argparse
+import base64
+import hashlib
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from github_api import blob_sha
+
+REPO_PADRAO = "otavilobato/pecas1"
+
+
+class RepositorioFalso:
+    """Arquivos em memória com o mesmo controle de sha que a Contents API aplica."""
+
+    def __init__(self, arquivos=None):
+        self.arquivos = dict(arquivos or {})
+        self.lock = threading.RLock()
+        self.estatisticas = {
+            "get": 0,
+            "get_304": 0,
+            "put": 0,
+            "put_conflito": 0,
+            "bytes_enviados": 0,
+            "bytes_recebidos": 0,
+        }
+
+    @classmethod
+    def de_diretorio(cls, diretorio):
+        arquivos = {}
+        for raiz, pastas, nomes in os.walk(diretorio):
+            pastas[:] = [p for p in pastas if not p.startswith(".") and p != "__pycache__"]
+            for nome in nomes:
+                if nome.startswith("."):
+                    continue
+                caminho = os.path.join(raiz, nome)
+                rel = os.path.relpath(caminho, diretorio).replace(os.sep, "/")
+                with open(caminho, "rb") as f:
+                    arquivos[rel] = f.read()
+        return cls(arquivos)
+
+    def contar(self, chave, n=1):
+        with self.lock:
+            self.estatisticas[chave] += n
+
+
+class _Handler(BaseHTTPRequestHandler):
+    repo = None
+    prefixo = f"/repos/{REPO_PADRAO}/contents"
+
+    def log_message(self, *args):
+        pass
+
+    def _caminho(self):
+        path = self.path.split("?", 1)[0]
+        if not path.startswith(self.prefixo):
+            return None
+        return path[len(self.prefixo):].strip("/")
+
+    def _responder(self, status, corpo=None, headers=None):
+        dados = json.dumps(corpo).encode("utf-8") if corpo is not None else b""
+        self.send_response(status)
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        if corpo is not None:
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(dados)))
+        self.end_headers()
+        self.wfile.write(dados)
+        self.repo.contar("bytes_enviados", len(dados))
+
+    def do_GET(self):
+        caminho = self._caminho()
+        if caminho is None:
+            return self._responder(404, {"message": "Not Found"})
+        self.repo.contar("get")
+        with self.repo.lock:
+            conteudo = self.repo.arquivos.get(caminho)
+            listagem = None
+            if conteudo is None:
+                pref = f"{caminho}/" if caminho else ""
+                nomes = sorted({
+                    p[len(pref):].split("/", 1)[0]
+                    for p in self.repo.arquivos if p.startswith(pref)
+                })
+                if nomes:
+                    listagem = []
+                    for nome in nomes:
+                        p = pref + nome
+                        dados = self.repo.arquivos.get(p)
+                        listagem.append({
+                            "name": nome,
+                            "path": p,
+                            "type": "file" if dados is not None else "dir",
+                            "sha": blob_sha(dados) if dados is not None else None,
+                            "size": len(dados) if dados is not None else 0,
+                        })
+        if listagem is not None:
+            return self._responder(200, listagem)
+        if conteudo is None:
+            return self._responder(404, {"message": "Not Found"})
+
+        sha = blob_sha(conteudo)
+        etag = f'"{sha}"'
+        if_none = (self.headers.get("If-None-Match") or "").replace("W/", "")
+        if if_none == etag:
+            self.repo.contar("get_304")
+            return self._responder(304, headers={"ETag": etag})
+        corpo = {
+            "name": caminho.rsplit("/", 1)[-1],
+            "path": caminho,
+            "sha": sha,
+            "size": len(conteudo),
+            "type": "file",
+            "encoding": "base64",
+            "content": base64.encodebytes(conteudo).decode("ascii"),
+        }
+        self._responder(200, corpo, headers={"ETag": etag})
+
+    def do_PUT(self):
+        caminho = self._caminho()
+        if not caminho:
+            return self._responder(404, {"message": "Not Found"})
+        tamanho = int(self.headers.get("Content-Length") or 0)
+        bruto = self.rfile.read(tamanho)
+        self.repo.contar("bytes_recebidos", len(bruto))
+        try:
+            corpo = json.loads(bruto)
+            conteudo = base64.b64decode(corpo["content"])
+        except Exception:
+            return self._responder(400, {"message": "Problems parsing JSON"})
+
+        with self.repo.lock:
+            self.repo.estatisticas["put"] += 1
+            atual = self.repo.arquivos.get(caminho)
+            if atual is not None:
+                if not corpo.get("sha"):
+                    return self._responder(422, {"message": "Invalid request.\n\n\"sha\" wasn't supplied."})
+                if corpo["sha"] != blob_sha(atual):
+                    self.repo.estatisticas["put_conflito"] += 1
+                    return self._responder(409, {"message": f"{caminho} does not match {corpo['sha']}"})
+            self.repo.arquivos[caminho] = conteudo
+        sha = blob_sha(conteudo)
+        resposta = {
+            "content": {"name": caminho.rsplit("/", 1)[-1], "path": caminho, "sha": sha, "size": len(conteudo)},
+            "commit": {"sha": hashlib.sha1(bruto).hexdigest(), "message": corpo.get("message", "")},
+        }
+        self._responder(201 if atual is None else 200, resposta)
+
+
+def iniciar(repo=None, porta=0, host="127.0.0.1"):
+    """Sobe o servidor numa thread daemon. Retorna (servidor, url_base_contents)."""
+    repo = repo or RepositorioFalso()
+    handler = type("Handler", (_Handler,), {"repo": repo})
+    servidor = ThreadingHTTPServer((host, porta), handler)
+    servidor.repo = repo
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    url_base = f"http://{host}:{servidor.server_address[1]}{_Handler.prefixo}"
+    return servidor, url_base
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Contents API falsa do GitHub para testes offline.")
+    parser.add_argument("--dir", default=".", help="diretório com os arquivos iniciais")
+    parser.add_argument("--porta", type=int, default=8765)
+    args = parser.parse_args()
+
+    servidor, url_base = iniciar(RepositorioFalso.de_diretorio(args.dir), porta=args.porta)
+    print(f"Contents API falsa em {url_base}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        servidor.shutdown()
+
+
+if __name__ == "__main__":
+    main()
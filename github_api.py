@@ -0,0 +1,304 @@
+# github_api.py
+# Acesso à Contents API do GitHub compartilhado pelos apps.
+import base64
+import hashlib
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import metricas
+
+
+def blob_sha(conteudo):
+    """sha do blob no formato do git (o mesmo que a Contents API devolve)."""
+    return hashlib.sha1(b"blob %d\0" % len(conteudo) + conteudo).hexdigest()
+
+
+# =========================
+# SESSÃO HTTP (pool de conexões + timeout + retry)
+# =========================
+TIMEOUT = (5, 30)          # (conexão, leitura) em segundos
+TENTATIVAS = 3
+ESPERA_MAXIMA = 30         # teto para o Retry-After do GitHub, em segundos
+
+
+class _RetryGitHub(Retry):
+    # O limite secundário do GitHub responde 403 (ou 429) com Retry-After
+    RETRY_AFTER_STATUS_CODES = frozenset({403, 413, 429, 503})
+
+    def get_retry_after(self, response):
+        espera = super().get_retry_after(response)
+        return None if espera is None else min(espera, ESPERA_MAXIMA)
+
+
+class SessaoGitHub(requests.Session):
+    """Session com keep-alive, timeout padrão e retry com backoff.
+
+    Repete em 5xx e no limite secundário (respeitando o Retry-After). PUT
+    também é repetido: um PUT que chegou a gravar volta como 409 na repetição
+    (o sha mudou) e cai no tratamento de conflito de quem chamou.
+    O token vai no cabeçalho da sessão, montado uma vez só.
+    """
+
+    def __init__(self, token=None, timeout=TIMEOUT, tentativas=TENTATIVAS, conexoes=10):
+        super().__init__()
+        self.timeout = timeout
+        if token:
+            self.headers["Authorization"] = f"token {token}"
+        retry = _RetryGitHub(
+            total=tentativas,
+            backoff_factor=0.5,
+            status_forcelist=(500, 502, 503, 504),
+            allowed_methods=frozenset({"GET", "PUT"}),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adaptador = HTTPAdapter(pool_connections=conexoes, pool_maxsize=conexoes, max_retries=retry)
+        self.mount("https://", adaptador)
+        self.mount("http://", adaptador)
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        with metricas.medir(f"github.{method.upper()}", _nome_arquivo(url)) as span:
+            resp = super().request(method, url, **kwargs)
+            span["bytes"] = len(resp.content) + len(resp.request.body or b"")
+            span["detalhe"] += f" {resp.status_code}"
+        metricas.contar(f"github.{method.upper()}.{resp.status_code}")
+        return resp
+
+
+def _nome_arquivo(url):
+    return url.split("?", 1)[0].rsplit("/", 1)[-1]
+
+
+_sessao_padrao = None
+
+
+def sessao_padrao():
+    """Sessão sem token, compartilhada por quem não recebeu uma."""
+    global _sessao_padrao
+    if _sessao_padrao is None:
+        _sessao_padrao = SessaoGitHub()
+    return _sessao_padrao
+
+
+# =========================
+# LEITURA COM REVALIDAÇÃO (ETag / If-None-Match)
+# =========================
+class ArquivoRevalidado:
+    """Guarda a última versão parseada de um arquivo da Contents API e revalida por ETag.
+
+    Em um 304 devolve o valor já parseado sem baixar nem decodificar o conteúdo.
+    Com manter_bruto=True guarda também os bytes (útil para anexar ao arquivo).
+    Com um `cache` (ver snapshot_cache.CacheDeSnapshots) o parse de um sha já
+    conhecido é lido do disco, e um processo novo começa servindo o último
+    snapshot enquanto a primeira revalidação roda em segundo plano. O cache
+    guarda só o valor parseado, então não combina com manter_bruto.
+    Com `intervalo` (segundos) a API só é consultada de novo depois desse tempo.
+    As requisições usam `sessao` (ver SessaoGitHub) ou a sessao_padrao().
+    `atualizado_em` (epoch) é a última vez em que a API confirmou o valor.
+    """
+
+    def __init__(self, url, parser, manter_bruto=False, cache=None, intervalo=0, sessao=None):
+        self.url = url
+        self.sessao = sessao or sessao_padrao()
+        self.parser = parser
+        self.manter_bruto = manter_bruto
+        self.cache = cache
+        self.intervalo = intervalo
+        self.sha = None
+        self.etag = None
+        self.valor = None
+        self.conteudo = None
+        self._lock = threading.Lock()
+        self._verificado_em = 0.0
+        self.atualizado_em = None
+        self._semeado = False
+        if cache is not None:
+            ultimo = cache.ultimo()
+            if ultimo is not None:
+                self.sha, self.etag, self.valor = ultimo
+                self._semeado = True
+
+    def obter(self, headers=None):
+        """Retorna (status, valor). status é 200, 304 ou o código de erro da API."""
+        if self._semeado:
+            self._semeado = False
+            metricas.contar("cache.semeado")
+            # partida a frio: serve o snapshot do disco e revalida em paralelo
+            threading.Thread(target=self.obter, args=(headers,), daemon=True).start()
+            return 200, self.valor
+        if self._recente():
+            metricas.contar("cache.recente")
+            return 304, self.valor
+        with self._lock:
+            if self._recente():
+                metricas.contar("cache.recente")
+                return 304, self.valor
+            return self._revalidar(headers)
+
+    def revalidar(self, headers=None):
+        """Consulta a API agora (GET condicional), mesmo dentro do `intervalo`. Retorna (status, valor)."""
+        with self._lock:
+            return self._revalidar(headers)
+
+    def invalidar(self):
+        """Força consultar a API na próxima chamada (ex.: depois de gravar o arquivo)."""
+        self._verificado_em = 0.0
+
+    def _recente(self):
+        return (
+            self.intervalo > 0
+            and self.valor is not None
+            and time.monotonic() - self._verificado_em < self.intervalo
+        )
+
+    def _revalidar(self, headers):
+        h = dict(headers or {})
+        if self.etag:
+            h["If-None-Match"] = self.etag
+        r = self.sessao.get(self.url, headers=h)
+        if r.status_code == 304:
+            metricas.contar("cache.304")
+            self._verificado_em = time.monotonic()
+            self.atualizado_em = time.time()
+            return 304, self.valor
+        if r.status_code == 404:
+            self.atualizado_em = time.time()
+        if r.status_code != 200:
+            return r.status_code, None
+
+        j = r.json()
+        sha = j.get("sha")
+        etag = r.headers.get("ETag")
+        self._verificado_em = time.monotonic()
+        self.atualizado_em = time.time()
+        if sha and sha == self.sha:
+            # mesmo blob (o ETag cobre a resposta inteira): reaproveita o parse
+            metricas.contar("cache.mesmo_sha")
+            self.etag = etag
+            return 200, self.valor
+
+        # O campo 'content' vem base64-encoded; pode vir com quebras de linha
+        content_b64 = j.get("content", "")
+        valor = self.cache.ler(sha) if self.cache is not None else None
+        conteudo = None
+        if valor is None:
+            metricas.contar("cache.parse" if self.cache is None else "cache.disco_miss")
+            nome = _nome_arquivo(self.url)
+            with metricas.medir("base64.decode", nome) as span:
+                conteudo = base64.b64decode(content_b64) if content_b64 else b""
+                span["bytes"] = len(conteudo)
+            with metricas.medir("parse", nome) as span:
+                span["bytes"] = len(conteudo)
+                valor = self.parser(conteudo) if conteudo else None
+        else:
+            metricas.contar("cache.disco_hit")
+        if self.cache is not None:
+            self.cache.salvar(sha, valor, etag)
+        self.sha, self.etag, self.valor = sha, etag, valor
+        self.conteudo = conteudo if self.manter_bruto else None
+        return 200, valor
+
+    def registrar_escrita(self, sha, conteudo=None, valor=None):
+        """Atualiza o estado local depois de um PUT bem-sucedido, sem novo download.
+
+        Se `valor` não vier, ele é obtido passando `conteudo` pelo parser.
+        """
+        with self._lock:
+            if valor is None and conteudo:
+                with metricas.medir("parse", _nome_arquivo(self.url)) as span:
+                    span["bytes"] = len(conteudo)
+                    valor = self.parser(conteudo)
+            self.sha = sha
+            self.valor = valor
+            self.conteudo = conteudo if self.manter_bruto else None
+            self._verificado_em = time.monotonic()
+            self.atualizado_em = time.time()
+            if self.cache is not None:
+                self.cache.salvar(sha, valor)
+
+
+# =========================
+# ATUALIZAÇÃO EM SEGUNDO PLANO (stale-while-revalidate)
+# =========================
+class Atualizador:
+    """Thread do processo que revalida as fontes em segundo plano.
+
+    Cada tarefa é uma função sem argumentos (ex.: ArquivoRevalidado.revalidar)
+    e todas rodam a cada `intervalo` segundos, ou antes quando agora() é
+    chamado. Com as fontes num `intervalo` longo, as páginas leem o valor já
+    parseado em memória e não esperam pela API; o parse de uma versão nova
+    acontece aqui, fora da renderização.
+    """
+
+    def __init__(self, tarefas=(), intervalo=5, nome="atualizador"):
+        self.tarefas = list(tarefas)
+        self.intervalo = intervalo
+        self.ultima_rodada = None  # epoch do fim da última rodada
+        self.ultimo_erro = None
+        self._acordar = threading.Event()
+        self._fim_rodada = threading.Condition()
+        self._rodadas = 0
+        self._rodando = False
+        threading.Thread(target=self._loop, name=nome, daemon=True).start()
+
+    def _loop(self):
+        while True:
+            self._rodar()
+            self._acordar.wait(self.intervalo)
+            self._acordar.clear()
+
+    def _rodar(self):
+        with self._fim_rodada:
+            self._rodando = True
+        erro = None
+        for tarefa in self.tarefas:
+            try:
+                with metricas.medir("atualizador", getattr(tarefa, "__name__", "")):
+                    tarefa()
+            except Exception as e:
+                erro = f"{type(e).__name__}: {e}"
+                print("Erro no atualizador:", erro)
+        with self._fim_rodada:
+            self._rodando = False
+            self._rodadas += 1
+            self.ultima_rodada = time.time()
+            self.ultimo_erro = erro
+            self._fim_rodada.notify_all()
+
+    def agora(self, esperar=None):
+        """Antecipa a próxima rodada. Com `esperar` (segundos), aguarda uma rodada
+        iniciada depois da chamada terminar; retorna True se ela terminou a tempo."""
+        with self._fim_rodada:
+            # uma rodada em andamento pode ter lido a API antes do pedido
+            alvo = self._rodadas + (2 if self._rodando else 1)
+        self._acordar.set()
+        if not esperar:
+            return False
+        with self._fim_rodada:
+            return self._fim_rodada.wait_for(lambda: self._rodadas >= alvo, timeout=esperar)
+
+
+# =========================
+# ESCRITA
+# =========================
+def put_conteudo(url, conteudo, mensagem, sha=None, headers=None, sessao=None):
+    """Grava `conteudo` (bytes) via PUT na Contents API. Retorna o Response."""
+    with metricas.medir("base64.encode", _nome_arquivo(url)) as span:
+        span["bytes"] = len(conteudo)
+        data = {"message": mensagem, "content": base64.b64encode(conteudo).decode("utf-8")}
+    if sha:
+        data["sha"] = sha
+    return (sessao or sessao_padrao()).put(url, headers=headers or {}, json=data)
+
+
+def sha_da_resposta(resp):
+    """sha do blob gravado, a partir da resposta de um PUT."""
+    try:
+        return resp.json().get("content", {}).get("sha")
+    except ValueError:
+        return None
@@ -0,0 +1,84 @@
+# importacao.py
+# Importação em lote de peças (CSV / XLSX): leitura, normalização e validação vetorizada.
+import io
+import unicodedata
+
+import pandas as pd
+
+import engine
+
+# Colunas do arquivo de entrada (depois de normalizar o cabeçalho)
+COLUNAS = ["UF", "FRU", "SUB1", "SUB2", "SUB3", "DESCRICAO", "MAQUINAS", "CLIENTE", "SERIAL", "DATA", "SLA"]
+# Nomes alternativos aceitos no cabeçalho
+SINONIMOS = {
+    "CLIENTES": "CLIENTE",
+    "MAQUINA": "MAQUINAS",
+    "DATA_CONTRATO": "DATA",
+    "DATA_DO_CONTRATO": "DATA",
+    "DATA_FIM": "DATA",
+}
+OBRIGATORIOS = ["UF", "FRU", "SERIAL", "DATA"]
+TAMANHO_CODIGO = 7  # FRU e SUBx
+
+
+def _nome_coluna(nome):
+    nome = unicodedata.normalize("NFKD", str(nome)).encode("ascii", "ignore").decode("ascii")
+    nome = "_".join(nome.strip().upper().split())
+    return SINONIMOS.get(nome, nome)
+
+
+def modelo_csv():
+    """CSV vazio só com o cabeçalho esperado."""
+    return (",".join(COLUNAS) + "\n").encode("utf-8")
+
+
+def ler_arquivo(nome, conteudo):
+    """DataFrame de texto a partir dos bytes de um .csv (',' ou ';') ou .xlsx."""
+    if nome.lower().endswith((".xlsx", ".xls")):
+        bruto = pd.read_excel(io.BytesIO(conteudo), dtype=str)
+    else:
+        bruto = pd.read_csv(io.BytesIO(conteudo), dtype=str, sep=None, engine="python", encoding="utf-8-sig")
+    return bruto.rename(columns=_nome_coluna)
+
+
+def validar(bruto, ufs_permitidas=None, obrigatorios=OBRIGATORIOS):
+    """Aplica as regras do cadastro a todas as linhas de uma vez.
+
+    Retorna (validas, erros): `validas` tem as COLUNAS em maiúsculas, com DATA
+    já em datetime64; `erros` tem LINHA (número da linha no arquivo, contando
+    o cabeçalho) e ERROS (todas as regras violadas pela linha).
+    `ufs_permitidas` None ou contendo "ALL" libera qualquer UF.
+    """
+    faltando = [c for c in obrigatorios if c not in bruto.columns]
+    if faltando:
+        raise ValueError("colunas obrigatórias ausentes: " + ", ".join(faltando))
+
+    df = bruto.reindex(columns=COLUNAS).fillna("").astype(str)
+    for col in COLUNAS:
+        df[col] = df[col].str.strip().str.upper()
+    df["DATA"] = engine.normalizar_datas(bruto["DATA"]) if "DATA" in bruto.columns else pd.NaT
+
+    erros = pd.Series("", index=df.index)
+
+    def regra(mascara, mensagem):
+        nonlocal erros
+        erros = erros.mask(mascara, erros + mensagem + "; ")
+
+    for col in obrigatorios:
+        if col == "DATA":
+            regra(df["DATA"].isna(), "DATA ausente ou inválida")
+        else:
+            regra(df[col] == "", f"{col} é obrigatório")
+    regra((df["FRU"] != "") & (df["FRU"].str.len() != TAMANHO_CODIGO), f"FRU deve ter {TAMANHO_CODIGO} caracteres")
+    for col in ("SUB1", "SUB2", "SUB3"):
+        regra((df[col] != "") & (df[col].str.len() != TAMANHO_CODIGO), f"{col} deve ter {TAMANHO_CODIGO} caracteres")
+    if ufs_permitidas is not None and "ALL" not in ufs_permitidas:
+        permitidas = [u.strip().upper() for u in ufs_permitidas]
+        regra((df["UF"] != "") & ~df["UF"].isin(permitidas), "UF sem permissão para este usuário")
+
+    invalidas = erros != ""
+    relatorio = pd.DataFrame({
+        "LINHA": (pd.RangeIndex(len(df)) + 2)[invalidas.to_numpy()],
+        "ERROS": erros[invalidas].str.rstrip("; ").to_numpy(),
+    })
+    return df[~invalidas].reset_index(drop=True), relatorio
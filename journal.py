@@ -0,0 +1,333 @@
+# journal.py
+# Journal de operações por linha sobre a planilha (SALDO_PECAS.journal.jsonl).
+#
+# A planilha (base) só é regravada na compactação. Cada cadastro, renovação ou
+# exclusão vira uma linha JSON anexada ao journal, e a leitura aplica o journal
+# sobre o último snapshot da base. Formato:
+#   {"base": "<sha da planilha a que o journal se refere>"}
+#   {"op": "insert", "id": "...", "linha": {...}, "ts": "...", "usuario": "..."}
+#   {"op": "update", "id": "...", "campos": {...}, ...}
+#   {"op": "delete", "id": "...", ...}
+import json
+import threading
+import time
+from datetime import datetime
+
+import pandas as pd
+
+import engine
+import github_api
+import metricas
+
+
+# =========================
+# OPERAÇÕES
+# =========================
+def _op(tipo, id_linha, usuario, **extra):
+    op = {"op": tipo, "id": str(id_linha), "ts": datetime.now().strftime("%Y-%m-%d %H:%M:%S"), "usuario": usuario}
+    op.update(extra)
+    return op
+
+
+def inserir(linha, usuario="", id_linha=None):
+    return _op("insert", id_linha or engine.novo_id(), usuario, linha=linha)
+
+
+def atualizar(id_linha, campos, usuario=""):
+    return _op("update", id_linha, usuario, campos=campos)
+
+
+def remover(id_linha, usuario=""):
+    return _op("delete", id_linha, usuario)
+
+
+class Journal:
+    """Conteúdo parseado do arquivo de journal."""
+
+    def __init__(self, base=None, ops=None):
+        self.base = base
+        self.ops = list(ops or [])
+
+
+def ler(conteudo):
+    base, ops = None, []
+    for linha in conteudo.decode("utf-8").splitlines():
+        if not linha.strip():
+            continue
+        item = json.loads(linha)
+        if "op" in item:
+            ops.append(item)
+        elif "base" in item:
+            base = item["base"]
+    return Journal(base, ops)
+
+
+def serializar(base, ops):
+    linhas = [json.dumps({"base": base})]
+    linhas += [json.dumps(op, ensure_ascii=False, default=str) for op in ops]
+    return ("\n".join(linhas) + "\n").encode("utf-8")
+
+
+def aplicar(snap, ops):
+    """Snapshot com as operações aplicadas, em ordem. Reaplicar é inofensivo:
+
+    insert de um id existente vale como update e update/delete de um id
+    ausente são ignorados.
+    """
+    if not ops:
+        return snap
+    with metricas.medir("journal.aplicar", f"{len(ops)} ops"):
+        return _aplicar(snap, ops)
+
+
+def _aplicar(snap, ops):
+    df = snap.df
+    novos, mudancas, removidos = {}, {}, set()
+    for op in ops:
+        id_linha = op["id"]
+        if op["op"] == "insert":
+            if id_linha in df.index and id_linha not in removidos:
+                mudancas.setdefault(id_linha, {}).update(op["linha"])
+            else:
+                # id novo, ou excluído antes nesta lista: a linha entra inteira
+                # e a da base (se havia) continua em removidos
+                novos[id_linha] = dict(op["linha"])
+        elif op["op"] == "update":
+            if id_linha in novos:
+                novos[id_linha].update(op["campos"])
+            elif id_linha in df.index and id_linha not in removidos:
+                mudancas.setdefault(id_linha, {}).update(op["campos"])
+        elif op["op"] == "delete":
+            if novos.pop(id_linha, None) is None and id_linha in df.index:
+                removidos.add(id_linha)
+                mudancas.pop(id_linha, None)
+
+    df_novo = df.drop(index=list(removidos)) if removidos else df.copy()
+    # uma atribuição por coluna para todas as linhas alteradas (ex.: renovação em lote)
+    por_coluna = {}
+    for id_linha, campos in mudancas.items():
+        for col, valor in campos.items():
+            por_coluna.setdefault(col, {})[id_linha] = valor
+    for col, valores in por_coluna.items():
+        ids, novos_valores = list(valores), list(valores.values())
+        try:
+            df_novo.loc[ids, col] = novos_valores
+        except (TypeError, ValueError):
+            # coluna numérica recebendo texto (ou vice-versa), ou categoria nova
+            df_novo[col] = df_novo[col].astype(object)
+            df_novo.loc[ids, col] = novos_valores
+    if novos:
+        extra = pd.DataFrame.from_dict(novos, orient="index")
+        extra.index.name = df_novo.index.name
+        df_novo = pd.concat([df_novo, extra])
+    return snap.derivar(df_novo, alterados=list(mudancas) + list(novos), removidos=list(removidos))
+
+
+# =========================
+# PLANILHA = BASE + JOURNAL
+# =========================
+class PlanilhaComJournal:
+    """Junta a planilha base e o journal, ambos revalidados por ETag.
+
+    obter() devolve o snapshot combinado, calculado uma vez por par
+    (sha da base, sha do journal); se o journal só cresceu, aplica apenas as
+    operações novas. registrar() anexa operações com um PUT do journal
+    (pequeno) e dispara a compactação em segundo plano quando o journal passa
+    de `max_ops` operações ou a mais antiga tem mais de `max_idade` segundos.
+    substituir() regrava a planilha inteira com concorrência otimista.
+    """
+
+    def __init__(self, base, journal, serializar_base, max_ops=200, max_idade=24 * 3600):
+        self.base = base
+        self.journal = journal
+        self.serializar_base = serializar_base
+        self.max_ops = max_ops
+        self.max_idade = max_idade
+        self._lock = threading.Lock()
+        self._compactando = threading.Lock()
+        self._chave = None
+        self._snap = None
+        self._base_snap = None
+        self._n_ops = 0
+        self._avisado = None
+
+    def _ops_validas(self):
+        j = self.journal.valor
+        if j is None:
+            return []
+        if j.base != self.base.sha and j.ops:
+            # journal de outra base: compactação interrompida entre o PUT da
+            # base e o do journal, ou base regravada por fora. As operações
+            # são reaplicadas sobre a base atual (aplicar() é idempotente) e
+            # o próximo registrar() as regrava com o sha certo
+            if self._avisado != self.journal.sha:
+                self._avisado = self.journal.sha
+                metricas.contar("journal.outra_base")
+                print(f"Journal de outra base ({j.base} != {self.base.sha}): reaplicando {len(j.ops)} operações")
+        return j.ops
+
+    def obter(self, headers=None):
+        """Retorna (status, snapshot); status é o da leitura da base."""
+        status, base_snap = self.base.obter(headers)
+        if status not in (200, 304) or base_snap is None:
+            return status, base_snap
+        self.journal.obter(headers)
+        with self._lock:
+            return status, self._combinar(base_snap)
+
+    def atualizar(self, headers=None):
+        """Revalida base e journal agora (mesmo dentro do intervalo) e combina. Retorna (status, snapshot)."""
+        status, base_snap = self.base.revalidar(headers)
+        if status not in (200, 304) or base_snap is None:
+            return status, base_snap
+        self.journal.revalidar(headers)
+        with self._lock:
+            return status, self._combinar(base_snap)
+
+    @property
+    def atualizado_em(self):
+        """Última confirmação (epoch) de base e journal junto à API; None se ainda não houve."""
+        momentos = [self.base.atualizado_em, self.journal.atualizado_em]
+        return None if None in momentos else min(momentos)
+
+    def _combinar(self, base_snap):
+        chave = (self.base.sha, self.journal.sha)
+        if chave == self._chave:
+            return self._snap
+        ops = self._ops_validas()
+        if self._base_snap is base_snap and len(ops) >= self._n_ops:
+            snap = aplicar(self._snap, ops[self._n_ops:])
+        else:
+            snap = aplicar(base_snap, ops)
+        self._chave, self._snap, self._base_snap, self._n_ops = chave, snap, base_snap, len(ops)
+        return snap
+
+    def registrar(self, ops, headers=None, mensagem="Atualização SALDO_PECAS"):
+        """Anexa `ops` ao journal. Retorna (ok, detalhe do erro)."""
+        for tentativa in range(3):
+            if tentativa:
+                time.sleep(0.2 * 2 ** (tentativa - 1))
+            # base e journal relidos da API: com a base do cache o journal
+            # sairia carimbado com um sha já compactado por outro processo
+            status, base_snap = self.base.revalidar(headers)
+            if status not in (200, 304) or base_snap is None:
+                return False, f"falha ao ler a planilha (código {status})"
+            status_j, _j = self.journal.revalidar(headers)
+            if status_j not in (200, 304, 404):
+                return False, f"falha ao ler o journal (código {status_j})"
+            sha_journal = self.journal.sha if status_j != 404 else None
+            atuais = self._ops_validas()
+
+            conteudo = serializar(self.base.sha, atuais + list(ops))
+            resp = github_api.put_conteudo(
+                self.journal.url, conteudo, mensagem, sha=sha_journal, headers=headers, sessao=self.journal.sessao
+            )
+            if resp.status_code in (200, 201):
+                self.journal.registrar_escrita(github_api.sha_da_resposta(resp), conteudo=conteudo)
+                with self._lock:
+                    self._combinar(base_snap)
+                if self._precisa_compactar():
+                    threading.Thread(target=self.compactar, args=(headers,), daemon=True).start()
+                return True, ""
+            if resp.status_code not in (409, 422):
+                return False, f"erro ao gravar journal ({resp.status_code}): {resp.text}"
+            # 409/422: o journal mudou desde a leitura; relê e tenta de novo
+        return False, "o journal mudou várias vezes seguidas; tente novamente"
+
+    def _precisa_compactar(self):
+        ops = self._ops_validas()
+        if len(ops) >= self.max_ops:
+            return True
+        if ops:
+            try:
+                primeira = datetime.strptime(ops[0]["ts"], "%Y-%m-%d %H:%M:%S")
+                return time.time() - primeira.timestamp() > self.max_idade
+            except (KeyError, ValueError):
+                return False
+        return False
+
+    def _estado(self, headers):
+        """(status, snapshot, sha da base, nº de ops do journal já aplicadas), lidos juntos."""
+        status, _snap = self.obter(headers)
+        with self._lock:
+            return status, self._snap, self.base.sha, self._n_ops
+
+    def _gravar_base(self, df, snap, sha_base, n_ops, headers, mensagem):
+        """PUT da planilha com o sha lido; se der certo, zera o journal (mantendo ops novas)."""
+        conteudo = self.serializar_base(df)
+        resp = github_api.put_conteudo(
+            self.base.url, conteudo, mensagem, sha=sha_base, headers=headers, sessao=self.base.sessao
+        )
+        if resp.status_code not in (200, 201):
+            self.base.invalidar()
+            return resp
+        sha_nova = github_api.sha_da_resposta(resp)
+
+        # journal novo só com o que chegou depois da leitura da base. Lido
+        # direto da API (o cache pode não ter as ops de outros processos) e
+        # regravado mesmo vazio: quem ainda tem o sha do journal antigo
+        # recebe 409 ao anexar e relê tudo
+        for _ in range(5):
+            status_j, j = self.journal.revalidar(headers)
+            if j is not None and j.base == sha_nova:
+                # outro processo já anexou operações sobre a base nova
+                break
+            restantes = j.ops[n_ops:] if j is not None else []
+            conteudo_j = serializar(sha_nova, restantes)
+            resp_j = github_api.put_conteudo(
+                self.journal.url, conteudo_j, mensagem, sha=self.journal.sha if status_j != 404 else None,
+                headers=headers, sessao=self.journal.sessao
+            )
+            if resp_j.status_code in (200, 201):
+                self.journal.registrar_escrita(github_api.sha_da_resposta(resp_j), conteudo=conteudo_j)
+                break
+            self.journal.invalidar()
+        # o snapshot gravado já é a nova base (índices aproveitados quando é o mesmo df)
+        self.base.registrar_escrita(sha_nova, valor=snap if df is snap.df else engine.Snapshot(df))
+        return resp
+
+    def substituir(self, df_novo, base_snap, headers=None, mensagem="Atualização SALDO_PECAS", tentativas=4):
+        """Regrava a planilha inteira com `df_novo`, editado a partir de `base_snap`.
+
+        A gravação leva o sha da versão lida (concorrência otimista). Se outra
+        pessoa gravou nesse meio-tempo, as linhas são mescladas com a versão
+        atual (engine.mesclar_linhas) e o PUT é repetido, com espera crescente.
+        Retorna (ok, erro, ids em conflito).
+        """
+        for tentativa in range(tentativas):
+            if tentativa:
+                time.sleep(0.5 * 2 ** (tentativa - 1))
+                self.base.invalidar()
+                self.journal.invalidar()
+            status, atual, sha_base, n_ops = self._estado(headers)
+            if status not in (200, 304) or atual is None:
+                return False, f"falha ao ler a planilha (código {status})", []
+            if atual is not base_snap:
+                df_novo, conflitos = engine.mesclar_linhas(base_snap.df, df_novo, atual.df)
+                if conflitos:
+                    return False, "outra pessoa alterou as mesmas linhas", conflitos
+                base_snap = atual
+            resp = self._gravar_base(df_novo, atual, sha_base, n_ops, headers, mensagem)
+            if resp.status_code in (200, 201):
+                return True, "", []
+            if resp.status_code not in (409, 422):
+                return False, f"erro ao gravar planilha ({resp.status_code}): {resp.text}", []
+        return False, "a planilha mudou várias vezes seguidas; tente novamente", []
+
+    def compactar(self, headers=None, mensagem="Compactação SALDO_PECAS"):
+        """Grava base + journal como uma planilha nova e zera o journal."""
+        if not self._compactando.acquire(blocking=False):
+            return False
+        try:
+            status, snap, sha_base, n_ops = self._estado(headers)
+            if status not in (200, 304) or snap is None:
+                return False
+            if not n_ops:
+                return True
+            resp = self._gravar_base(snap.df, snap, sha_base, n_ops, headers, mensagem)
+            if resp.status_code not in (200, 201):
+                print(f"Compactação abortada ({resp.status_code}): {resp.text}")
+                return False
+            return True
+        finally:
+            self._compactando.release()
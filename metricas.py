@@ -0,0 +1,100 @@
+# metricas.py
+# Spans de tempo e contadores do processo (requisições ao GitHub, parse, filtros, render).
+import csv
+import io
+import json
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+MAX_SPANS = 5000  # spans mais recentes guardados em memória
+COLUNAS = ["inicio", "nome", "ms", "bytes", "detalhe", "erro"]
+
+
+class Metricas:
+    """Registro em memória, compartilhado pelas sessões do processo.
+
+    Cada span é um dict com COLUNAS; os mais antigos saem quando passa de
+    `max_spans`. Registrar é só um append numa deque e um perf_counter, então
+    pode ficar ligado o tempo todo.
+    """
+
+    def __init__(self, max_spans=MAX_SPANS):
+        self._spans = deque(maxlen=max_spans)
+        self._contadores = Counter()
+        self._lock = threading.Lock()
+        self.desde = time.time()
+
+    @contextmanager
+    def medir(self, nome, detalhe=""):
+        """Mede o bloco `with`; o dict devolvido aceita "bytes" e "detalhe" durante o bloco."""
+        span = {"inicio": time.time(), "nome": nome, "ms": 0.0, "bytes": 0, "detalhe": detalhe, "erro": ""}
+        t0 = time.perf_counter()
+        try:
+            yield span
+        except Exception as e:
+            # st.rerun()/st.stop() (BaseException) não contam como erro
+            span["erro"] = type(e).__name__
+            raise
+        finally:
+            span["ms"] = (time.perf_counter() - t0) * 1000
+            self._spans.append(span)
+
+    def contar(self, nome, n=1):
+        with self._lock:
+            self._contadores[nome] += n
+
+    def contadores(self):
+        with self._lock:
+            return dict(sorted(self._contadores.items()))
+
+    def spans(self, desde=None):
+        """DataFrame dos spans guardados (opcionalmente só os iniciados depois de `desde`, epoch)."""
+        df = pd.DataFrame(list(self._spans), columns=COLUNAS)
+        if desde is not None:
+            df = df[df["inicio"] >= desde]
+        return df
+
+    def percentis(self, desde=None):
+        """Por nome de span: quantidade, p50/p90/p99/máximo em ms e bytes somados."""
+        df = self.spans(desde)
+        if df.empty:
+            return pd.DataFrame(columns=["nome", "n", "p50_ms", "p90_ms", "p99_ms", "max_ms", "bytes", "erros"])
+        linhas = []
+        for nome, grupo in df.groupby("nome", sort=True):
+            ms = grupo["ms"].to_numpy()
+            p50, p90, p99 = np.percentile(ms, [50, 90, 99])
+            linhas.append({
+                "nome": nome, "n": len(ms), "p50_ms": round(p50, 2), "p90_ms": round(p90, 2),
+                "p99_ms": round(p99, 2), "max_ms": round(ms.max(), 2),
+                "bytes": int(grupo["bytes"].sum()), "erros": int((grupo["erro"] != "").sum()),
+            })
+        return pd.DataFrame(linhas).sort_values("p90_ms", ascending=False, ignore_index=True)
+
+    def exportar_json(self):
+        dados = {"desde": self.desde, "contadores": self.contadores(),
+                 "spans": self.spans().to_dict("records")}
+        return json.dumps(dados, ensure_ascii=False, default=str).encode("utf-8")
+
+    def exportar_csv(self):
+        buf = io.StringIO()
+        w = csv.writer(buf, lineterminator="\n")
+        w.writerow(COLUNAS)
+        w.writerows([s[c] for c in COLUNAS] for s in list(self._spans))
+        return buf.getvalue().encode("utf-8")
+
+    def limpar(self):
+        with self._lock:
+            self._spans.clear()
+            self._contadores.clear()
+            self.desde = time.time()
+
+
+# Registro do processo, usado pelos módulos e pelos dois apps
+PADRAO = Metricas()
+medir = PADRAO.medir
+contar = PADRAO.contar
@@ -1,11 +1,15 @@
 # new_app.py
 import streamlit as st
 import pandas as pd
-import base64
-import requests
+import time
 from io import BytesIO
 from datetime import datetime, date
 
+import engine
+import github_api
+import importacao
+import metricas
+
 # --------------------------
 # CONFIGURAÇÃO DA PÁGINA
 # --------------------------
@@ -14,72 +18,146 @@ st.set_page_config(page_title="SALDO_PECAS - Sistema", layout="wide")
 # --------------------------
 # HELPERS / GITHUB I/O
 # --------------------------
-def github_read_excel():
-    """Lê o arquivo Excel do GitHub (branch main). Retorna DataFrame ou None."""
+# Atualização em segundo plano (mesmo esquema do app.py): a página lê o Excel
+# já parseado em memória e uma thread do processo revalida por ETag
+ATUALIZACAO_INTERVALO = 5   # segundos
+REVALIDACAO_MAXIMA = 300    # segundos
+ESPERA_ATUALIZACAO = 15     # segundos que o botão "Atualizar agora" espera pela API
+
+@st.cache_resource
+def _sessao_github(token):
+    """Sessão HTTP do processo (keep-alive, timeout e retry), uma por token."""
+    return github_api.SessaoGitHub(token)
+
+def _config_github():
+    """(token, repo, file_path) de st.secrets['github'], ou None (com o erro na tela)."""
     try:
-        token = st.secrets["github"]["token"]
-        repo = st.secrets["github"]["repo"]
-        file_path = st.secrets["github"]["file_path"]
+        return st.secrets["github"]["token"], st.secrets["github"]["repo"], st.secrets["github"]["file_path"]
     except Exception:
         st.error("Chaves do GitHub ausentes em st.secrets['github']. Verifique seu secrets.toml.")
         return None
 
-    url = f"https://raw.githubusercontent.com/{repo}/main/{file_path}"
-    headers = {"Authorization": f"token {token}"}
-    r = requests.get(url, headers=headers)
-    if r.status_code != 200:
-        st.error(f"Erro ao carregar arquivo no GitHub (status {r.status_code}). Verifique repo/token/file_path.")
-        return None
+def _ler_excel(conteudo):
+    # Snapshot (um por sha do blob); None quando o arquivo existe mas está vazio / inválido
     try:
-        df = pd.read_excel(BytesIO(r.content))
+        with metricas.medir("read_excel") as span:
+            span["bytes"] = len(conteudo)
+            df = pd.read_excel(BytesIO(conteudo))
     except Exception as e:
+        print("Erro ao ler o Excel:", e)
+        return None
+    return engine.Snapshot(engine.preparar_ids(df, github_api.blob_sha(conteudo)[:8]))
+
+@st.cache_resource
+def _arquivo_excel(token, repo, file_path):
+    """Excel parseado do processo, revalidado por ETag na Contents API."""
+    url = f"https://api.github.com/repos/{repo}/contents/{file_path}"
+    return github_api.ArquivoRevalidado(url, _ler_excel, intervalo=REVALIDACAO_MAXIMA, sessao=_sessao_github(token))
+
+@st.cache_resource
+def _atualizador(token, repo, file_path):
+    arq = _arquivo_excel(token, repo, file_path)
+
+    def revalidar_excel():
+        status, _snap = arq.revalidar()
+        if status not in (200, 304):
+            raise IOError(f"código {status} ao ler {file_path}")
+
+    return github_api.Atualizador([revalidar_excel], intervalo=ATUALIZACAO_INTERVALO, nome="atualizador-excel")
+
+def github_read_snapshot():
+    """Lê o arquivo Excel do GitHub. Retorna (engine.Snapshot, sha do blob) ou (None, None).
+
+    O snapshot é um por versão do arquivo, compartilhado entre sessões e
+    renders: o índice de vencimento dele só é montado uma vez."""
+    config = _config_github()
+    if config is None:
+        return None, None
+    _atualizador(*config)
+    arq = _arquivo_excel(*config)
+    status, snap = arq.obter()
+    if status not in (200, 304):
+        st.error(f"Erro ao carregar arquivo no GitHub (status {status}). Verifique repo/token/file_path.")
+        return None, None
+    if snap is None:
         # se o arquivo existir mas estiver vazio / inválido, retornamos DataFrame vazio
-        st.warning(f"Atenção: não foi possível ler o Excel como esperado ({e}). Será usado DataFrame vazio.")
-        df = pd.DataFrame()
-    return df
+        st.warning("Atenção: não foi possível ler o Excel como esperado. Será usado DataFrame vazio.")
+        snap = engine.Snapshot(engine.preparar_ids(pd.DataFrame(), (arq.sha or "")[:8]))
+    # sha do blob lido: é a versão sobre a qual o usuário vai editar
+    return snap, arq.sha
 
-def github_write_excel(df, commit_message="Atualização via Streamlit"):
-    """Grava o DataFrame como Excel no GitHub (substitui o arquivo)."""
-    try:
-        token = st.secrets["github"]["token"]
-        repo = st.secrets["github"]["repo"]
-        file_path = st.secrets["github"]["file_path"]
-    except Exception:
-        st.error("Chaves do GitHub ausentes em st.secrets['github']. Verifique seu secrets.toml.")
-        return False
+def github_read_excel():
+    """Lê o arquivo Excel do GitHub. Retorna (DataFrame, sha do blob) ou (None, None).
 
-    get_url = f"https://api.github.com/repos/{repo}/contents/{file_path}"
-    get_r = requests.get(get_url, headers={"Authorization": f"token {token}"})
-    if get_r.status_code not in (200,):
-        st.error(f"Erro ao obter info do arquivo no GitHub (status {get_r.status_code}).")
-        return False
-    sha = get_r.json().get("sha")
-    # converter df para excel bytes
+    O DataFrame vem indexado pelo id estável de linha (engine.COL_ID) e é
+    compartilhado entre as sessões: para editar, use copy() / concat()."""
+    snap, sha = github_read_snapshot()
+    return (None, None) if snap is None else (snap.df, sha)
+
+def _excel_bytes(df):
     buf = BytesIO()
-    try:
-        df.to_excel(buf, index=False)
-    except Exception as e:
-        st.error(f"Erro ao gerar excel em memória: {e}")
-        return False
-    content_b64 = base64.b64encode(buf.getvalue()).decode()
-    data = {"message": commit_message, "content": content_b64, "sha": sha}
-    put_r = requests.put(get_url, json=data, headers={"Authorization": f"token {token}"})
-    if put_r.status_code in (200, 201):
-        return True
-    else:
-        st.error(f"Erro ao gravar arquivo no GitHub: {put_r.status_code} - {put_r.text}")
+    with metricas.medir("to_excel") as span:
+        engine.para_gravar(df).to_excel(buf, index=False)
+        span["bytes"] = buf.tell()
+    return buf.getvalue()
+
+def github_write_excel(df, commit_message="Atualização via Streamlit", sha_base=None, df_base=None, tentativas=4):
+    """Grava o DataFrame como Excel no GitHub (substitui o arquivo).
+
+    Com sha_base/df_base (a versão lida por github_read_excel) a gravação só
+    vale se ninguém gravou depois; se gravou, as linhas não conflitantes são
+    mescladas com a versão atual e a gravação é repetida com espera crescente."""
+    config = _config_github()
+    if config is None:
         return False
-
-def parse_date_safe(val):
-    """Converte valores em date, se possível. Retorna date ou None."""
-    if pd.isna(val) or val is None:
-        return None
-    if isinstance(val, date):
-        return val
-    try:
-        return pd.to_datetime(val).date()
-    except Exception:
-        return None
+    token, _repo, _file_path = config
+    arq = _arquivo_excel(*config)
+    sessao = _sessao_github(token)
+    sha = sha_base
+    if sha is None:
+        status, _df = arq.revalidar()
+        if status not in (200, 304):
+            st.error(f"Erro ao obter info do arquivo no GitHub (status {status}).")
+            return False
+        sha = arq.sha
+
+    for tentativa in range(tentativas):
+        if tentativa:
+            time.sleep(0.5 * 2 ** (tentativa - 1))
+        # converter df para excel bytes
+        try:
+            conteudo = _excel_bytes(df)
+        except Exception as e:
+            st.error(f"Erro ao gerar excel em memória: {e}")
+            return False
+        put_r = github_api.put_conteudo(arq.url, conteudo, commit_message, sha=sha, sessao=sessao)
+        if put_r.status_code in (200, 201):
+            # o df gravado já é a versão atual: as próximas leituras não baixam nem parseiam de novo
+            arq.registrar_escrita(github_api.sha_da_resposta(put_r), valor=engine.Snapshot(df))
+            return True
+        if put_r.status_code not in (409, 422) or df_base is None:
+            st.error(f"Erro ao gravar arquivo no GitHub: {put_r.status_code} - {put_r.text}")
+            return False
+
+        # conflito: outra pessoa gravou depois da nossa leitura -> mescla com a versão atual
+        status, atual = arq.revalidar()
+        if status not in (200, 304) or atual is None:
+            st.error(f"Erro ao obter info do arquivo no GitHub (status {status}).")
+            return False
+        sha = arq.sha
+        df, conflitos = engine.mesclar_linhas(df_base, df, atual.df)
+        if conflitos:
+            st.error("Outra pessoa alterou as mesmas linhas; recarregue e refaça: " + ", ".join(map(str, conflitos)))
+            return False
+        df_base = atual.df
+
+    st.error("O arquivo mudou várias vezes seguidas no GitHub; tente novamente.")
+    return False
+
+def pecas_vencidas(snap, hoje):
+    """Linhas com DATA_FIM anterior a `hoje`, pelo índice de vencimento do snapshot."""
+    with metricas.medir("filtro.vencidas"):
+        return snap.vencidas(hoje).copy()
 
 # --------------------------
 # AUTENTICAÇÃO / LOGIN
@@ -168,7 +246,7 @@ def cadastro_screen():
         return
 
     if st.button("Salvar Registro", key="btn_salvar"):
-        df = github_read_excel()
+        df, sha = github_read_excel()
         if df is None:
             return
 
@@ -184,55 +262,114 @@ def cadastro_screen():
             "CLIENTE": CLIENTE_FINAL,
             "DATA_FIM": str(DATA_FIM),
             "SLA": SLA,
-            "Cadastrado_por": st.session_state.get("username", "")
+            "Cadastrado_por": st.session_state.get("username", ""),
+            **engine.campos_cliente(CLIENTE_raw, SERIAL, DATA_FIM),
         }
 
+        nova = pd.DataFrame([row], index=pd.Index([engine.novo_id()], name=engine.COL_ID))
         try:
             if df.empty:
-                df = pd.DataFrame([row])
+                df_novo = nova
             else:
-                df = pd.concat([df, pd.DataFrame([row])], ignore_index=True)
+                df_novo = pd.concat([df, nova])
         except Exception:
-            df = pd.DataFrame([row])
+            df_novo = nova
 
-        ok = github_write_excel(df, commit_message=f"Cadastro por {st.session_state.get('username','')}")
+        ok = github_write_excel(df_novo, commit_message=f"Cadastro por {st.session_state.get('username','')}",
+                                sha_base=sha, df_base=df)
         if ok:
             st.success("✔ Registro salvo com sucesso.")
         else:
             st.error("❌ Erro ao salvar no GitHub.")
 
+def importacao_screen():
+    st.header("📥 Importação em Lote (CSV / XLSX)")
+    st.write("Colunas: " + ", ".join(importacao.COLUNAS) + " (DATA = DATA FIM).")
+    st.download_button("Baixar modelo (CSV)", importacao.modelo_csv(), file_name="modelo_importacao.csv", mime="text/csv")
+
+    arquivo = st.file_uploader("Arquivo de peças", type=["csv", "xlsx"], key="arquivo_importacao")
+    if arquivo is None:
+        return
+    try:
+        bruto = importacao.ler_arquivo(arquivo.name, arquivo.getvalue())
+        # aqui todos os campos do cadastro são obrigatórios
+        validas, erros = importacao.validar(bruto, obrigatorios=[c for c in importacao.COLUNAS if not c.startswith("SUB")])
+    except Exception as e:
+        st.error(f"Não foi possível ler o arquivo: {e}")
+        return
+
+    st.write(f"{len(validas)} linha(s) válida(s), {len(erros)} com erro.")
+    if len(erros):
+        st.dataframe(erros, hide_index=True)
+    if validas.empty:
+        return
+
+    data = validas["DATA"].dt.strftime("%Y-%m-%d")
+    linhas = pd.DataFrame({
+        "UF": validas["UF"],
+        "FRU": validas["FRU"],
+        "SUB1": validas["SUB1"],
+        "SUB2": validas["SUB2"],
+        "SUB3": validas["SUB3"],
+        "DESCRICAO": validas["DESCRICAO"],
+        "MAQUINAS": validas["MAQUINAS"],
+        "CLIENTE": validas["CLIENTE"] + "(" + validas["SERIAL"] + "_" + data + "_" + validas["SLA"] + ")" + validas["UF"],
+        "DATA_FIM": data,
+        "SLA": validas["SLA"],
+        "Cadastrado_por": st.session_state.get("username", ""),
+        "CLIENTE_NOME": validas["CLIENTE"],
+        "SERIAL": validas["SERIAL"],
+        "CONTRATO_DATA": validas["DATA"].dt.strftime("%d/%m/%y"),
+    })
+    linhas.index = pd.Index([engine.novo_id() for _ in range(len(linhas))], name=engine.COL_ID)
+    st.dataframe(linhas)
+
+    if st.button(f"Importar {len(linhas)} registro(s)", key="btn_importar"):
+        df, sha = github_read_excel()
+        if df is None:
+            return
+        df_novo = linhas if df.empty else pd.concat([df, linhas])
+        ok = github_write_excel(df_novo, commit_message=f"Importação de {len(linhas)} registros por {st.session_state.get('username','')}",
+                                sha_base=sha, df_base=df)
+        if ok:
+            st.success(f"✔ {len(linhas)} registro(s) importado(s).")
+        else:
+            st.error("❌ Erro ao salvar no GitHub.")
+
 def renovar_contrato_screen():
     st.header("🛠 Renovar Contrato - Peças Vencidas")
 
-    df = github_read_excel()
-    if df is None:
+    snap, sha = github_read_snapshot()
+    if snap is None:
         return
+    df = snap.df
 
     if "DATA_FIM" not in df.columns:
         st.info("Arquivo não contém coluna DATA_FIM.")
         return
 
-    df["_DATA_FIM_parsed"] = df["DATA_FIM"].apply(parse_date_safe)
     hoje = date.today()
-    vencidos = df[df["_DATA_FIM_parsed"].apply(lambda d: d is not None and d < hoje)].copy()
+    vencidos = pecas_vencidas(snap, hoje)
 
     if vencidos.empty:
         st.info("Nenhuma peça vencida encontrada.")
         return
 
     st.subheader(f"Peças vencidas ({len(vencidos)})")
-    st.dataframe(vencidos.drop(columns=["_DATA_FIM_parsed"], errors="ignore"))
+    st.dataframe(vencidos)
 
     escolha = st.selectbox("Selecione índice (linha) para renovar", options=vencidos.index.tolist(), key="sel_renovar")
     registro = df.loc[escolha]
     st.markdown("**Registro selecionado:**")
-    st.write(registro.drop(labels=["_DATA_FIM_parsed"], errors="ignore"))
+    st.write(registro)
 
     nova_data = st.date_input("Nova DATA_FIM", value=hoje, key=f"nova_data_{escolha}")
 
     if st.button("Salvar Renovação", key=f"btn_renovar_{escolha}"):
-        df.at[escolha, "DATA_FIM"] = str(nova_data)
-        ok = github_write_excel(df, commit_message=f"Renovação por {st.session_state.get('username','')}")
+        df_novo = df.copy()
+        df_novo.at[escolha, "DATA_FIM"] = str(nova_data)
+        ok = github_write_excel(df_novo, commit_message=f"Renovação por {st.session_state.get('username','')}",
+                                sha_base=sha, df_base=df)
         if ok:
             st.success("✔ Renovação salva com sucesso.")
         else:
@@ -241,17 +378,16 @@ def renovar_contrato_screen():
 def gerar_relatorio_screen():
     st.header("📄 Gerar Relatório de Peças Vencidas (TXT)")
 
-    df = github_read_excel()
-    if df is None:
+    snap, _sha = github_read_snapshot()
+    if snap is None:
         return
 
-    if "DATA_FIM" not in df.columns:
+    if "DATA_FIM" not in snap.df.columns:
         st.info("Arquivo não contém coluna DATA_FIM.")
         return
 
-    df["_DATA_FIM_parsed"] = df["DATA_FIM"].apply(parse_date_safe)
     hoje = date.today()
-    vencidos = df[df["_DATA_FIM_parsed"].apply(lambda d: d is not None and d < hoje)].copy()
+    vencidos = pecas_vencidas(snap, hoje)
 
     if vencidos.empty:
         st.info("Nenhuma peça vencida para gerar relatório.")
@@ -270,7 +406,24 @@ def gerar_relatorio_screen():
 # --------------------------
 def sidebar_menu():
     st.sidebar.markdown(f"**Usuário:** {st.session_state.get('username','')}")
-    return st.sidebar.radio("📌 Navegação", ["Cadastro", "Renovar Contrato", "Gerar Relatório", "Sair"])
+    opcao = st.sidebar.radio("📌 Navegação", ["Cadastro", "Importar Lote", "Renovar Contrato", "Gerar Relatório", "Sair"])
+    barra_atualizacao()
+    return opcao
+
+def barra_atualizacao():
+    """Data da última confirmação do Excel junto ao GitHub e o botão "Atualizar agora"."""
+    config = _config_github()
+    if config is None:
+        return
+    atualizador = _atualizador(*config)
+    if st.sidebar.button("🔄 Atualizar agora"):
+        if not atualizador.agora(esperar=ESPERA_ATUALIZACAO):
+            st.sidebar.warning("O GitHub não respondeu a tempo; mostrando os últimos dados lidos.")
+    momento = _arquivo_excel(*config).atualizado_em
+    quando = datetime.fromtimestamp(momento).strftime("%d/%m/%Y %H:%M:%S") if momento else "ainda não carregados"
+    st.sidebar.caption(f"📅 Dados de {quando}")
+    if atualizador.ultimo_erro:
+        st.sidebar.caption(f"⚠️ Última atualização falhou: {atualizador.ultimo_erro}")
 
 # --------------------------
 # MAIN
@@ -281,13 +434,19 @@ def main():
         st.session_state["username"] = None
 
     if not st.session_state["logged"]:
-        login_screen()
+        with metricas.medir("render", "Login"):
+            login_screen()
         return
 
     opcao = sidebar_menu()
+    with metricas.medir("render", opcao):
+        _mostrar_tela(opcao)
 
+def _mostrar_tela(opcao):
     if opcao == "Cadastro":
         cadastro_screen()
+    elif opcao == "Importar Lote":
+        importacao_screen()
     elif opcao == "Renovar Contrato":
         renovar_contrato_screen()
     elif opcao == "Gerar Relatório":
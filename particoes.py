@@ -0,0 +1,346 @@
+# particoes.py
+# Planilha dividida em um arquivo por UF (pecas/<UF>.xlsx + journal) e um manifesto.
+#
+# Layout opcional: cada UF é uma PlanilhaComJournal própria, então um usuário
+# regional só baixa e grava as UFs dele e gravações de UFs diferentes não
+# conflitam entre si. pecas/manifest.json lista as UFs existentes:
+#   {"ufs": ["AM", "PA", ...], "colunas": [...], "origem": "<sha da planilha migrada>"}
+import json
+import os
+import threading
+from datetime import datetime
+
+import pandas as pd
+
+import engine
+import github_api
+import journal
+import metricas
+import snapshot_cache
+
+SEM_UF = "SEM_UF"      # arquivo das linhas sem UF (só administradores veem)
+COMBINADOS_GUARDADOS = 16
+
+
+def _uf(valor):
+    uf = str(valor if valor is not None and not pd.isna(valor) else "").strip().upper()
+    return uf or SEM_UF
+
+
+def _ufs_de(df):
+    """Arquivo (UF normalizada ou SEM_UF) de cada linha de `df`, como array."""
+    if "UF" not in df.columns:
+        return pd.Series(SEM_UF, index=df.index).to_numpy()
+    return df["UF"].map(_uf).to_numpy()
+
+
+def _iguais(a, b):
+    # compara valores, não tipos (category de um snapshot x object de uma cópia editada)
+    return a.index.equals(b.index) and list(a.columns) == list(b.columns) and a.astype(object).equals(b.astype(object))
+
+
+class PlanilhaPorUF:
+    """Uma PlanilhaComJournal por UF, lidas e gravadas só quando alguém precisa delas.
+
+    obter(ufs) junta só os arquivos das `ufs` pedidas (None: todas); a junção
+    fica guardada enquanto nenhum dos arquivos muda, e com uma UF só o
+    snapshot é o próprio do arquivo. registrar() manda cada operação para o
+    arquivo da UF da linha; substituir() regrava só as UFs que mudaram.
+    """
+
+    def __init__(self, url_base, sessao=None, dir_cache=None, intervalo=2, max_ops=200, max_idade=24 * 3600):
+        self.url_base = url_base.rstrip("/")
+        self.sessao = sessao
+        self.dir_cache = dir_cache
+        self.intervalo = intervalo
+        self.max_ops = max_ops
+        self.max_idade = max_idade
+        cache = None
+        if dir_cache:
+            # manifesto em disco: a partida a frio já sabe se o layout é por UF
+            cache = snapshot_cache.CacheDeSnapshots(os.path.join(dir_cache, "manifesto"))
+        self.manifesto = github_api.ArquivoRevalidado(
+            f"{self.url_base}/manifest.json", lambda b: json.loads(b.decode("utf-8")),
+            cache=cache, intervalo=intervalo, sessao=sessao,
+        )
+        self._ativa = None
+        self._fatias = {}
+        self._combinados = {}
+        self._lock = threading.Lock()
+
+    # ---------- manifesto ----------
+    def _ler_manifesto(self, revalidar=False, headers=None):
+        status, valor = self.manifesto.revalidar(headers) if revalidar else self.manifesto.obter(headers)
+        if status in (200, 304) and valor is not None:
+            self._ativa = True
+        elif status == 404:
+            self._ativa = False
+        return status
+
+    def ativa(self, esperar=True):
+        """True se o manifesto existe. A API só é consultada na primeira vez; depois atualizar() mantém.
+
+        Com esperar=False e nada conhecido ainda (nem manifesto no cache em
+        disco), devolve False sem consultar a API: quem responde é a próxima
+        chamada de atualizar_manifesto() (a thread de atualização do app).
+        """
+        if self._ativa is None:
+            if not esperar and self.manifesto.valor is None:
+                return False
+            self._ler_manifesto()
+        return bool(self._ativa)
+
+    def atualizar_manifesto(self, headers=None):
+        """Consulta o manifesto agora (a thread de atualização chama a cada rodada)."""
+        return self._ler_manifesto(revalidar=True, headers=headers)
+
+    def ufs(self):
+        return list((self.manifesto.valor or {}).get("ufs", [])) if self.ativa() else []
+
+    def _gravar_manifesto(self, alterar, mensagem, headers=None):
+        for tentativa in range(3):
+            if tentativa:
+                self.manifesto.invalidar()
+            status = self._ler_manifesto(revalidar=tentativa > 0, headers=headers)
+            if status not in (200, 304, 404):
+                return False
+            novo = alterar(dict(self.manifesto.valor or {}) if status != 404 else {})
+            conteudo = json.dumps(novo, ensure_ascii=False, indent=1, sort_keys=True).encode("utf-8")
+            sha = self.manifesto.sha if status != 404 else None
+            resp = github_api.put_conteudo(self.manifesto.url, conteudo, f"{mensagem} [manifesto]",
+                                           sha=sha, headers=headers, sessao=self.sessao)
+            if resp.status_code in (200, 201):
+                self.manifesto.registrar_escrita(github_api.sha_da_resposta(resp), conteudo=conteudo)
+                self._ativa = True
+                return True
+            if resp.status_code not in (409, 422):
+                print(f"Erro ao salvar manifesto da planilha: {resp.status_code} {resp.text}")
+                return False
+        return False
+
+    # ---------- arquivos por UF ----------
+    def fatia(self, uf):
+        """PlanilhaComJournal da UF (criada na primeira vez que é pedida)."""
+        with self._lock:
+            planilha = self._fatias.get(uf)
+            if planilha is None:
+                cache = None
+                if self.dir_cache:
+                    cache = snapshot_cache.CacheDeSnapshots(os.path.join(self.dir_cache, uf))
+                base = github_api.ArquivoRevalidado(
+                    f"{self.url_base}/{uf}.xlsx", engine.ler_planilha, cache=cache,
+                    intervalo=self.intervalo, sessao=self.sessao,
+                )
+                cache_journal = None
+                if self.dir_cache:
+                    cache_journal = snapshot_cache.CacheDeSnapshots(os.path.join(self.dir_cache, f"{uf}.journal"))
+                journal_uf = github_api.ArquivoRevalidado(
+                    f"{self.url_base}/{uf}.journal.jsonl", journal.ler, cache=cache_journal,
+                    intervalo=self.intervalo, sessao=self.sessao,
+                )
+                planilha = journal.PlanilhaComJournal(base, journal_uf, engine.serializar_planilha,
+                                                      max_ops=self.max_ops, max_idade=self.max_idade)
+                self._fatias[uf] = planilha
+            return planilha
+
+    def _criar_fatia(self, uf, colunas, headers=None, mensagem="Nova UF na planilha"):
+        """Grava a planilha vazia da UF (se ainda não existe) e acrescenta a UF ao manifesto."""
+        planilha = self.fatia(uf)
+        status, _snap = planilha.base.revalidar(headers)
+        if status == 404:
+            vazio = pd.DataFrame(columns=list(colunas))
+            vazio.index.name = engine.COL_ID
+            conteudo = engine.serializar_planilha(vazio)
+            resp = github_api.put_conteudo(planilha.base.url, conteudo, f"{mensagem} [{uf}]",
+                                           headers=headers, sessao=self.sessao)
+            if resp.status_code in (200, 201):
+                planilha.base.registrar_escrita(github_api.sha_da_resposta(resp), valor=engine.Snapshot(vazio))
+            elif resp.status_code not in (409, 422):  # 409/422: alguém criou antes
+                return False
+            planilha.base.invalidar()
+        elif status not in (200, 304):
+            return False
+        if uf in self.ufs():
+            return True
+        return self._gravar_manifesto(lambda m: {**m, "ufs": sorted(set(m.get("ufs", [])) | {uf})},
+                                      mensagem, headers)
+
+    def _colunas(self):
+        return (self.manifesto.valor or {}).get("colunas", [])
+
+    # ---------- leitura ----------
+    def obter(self, headers=None, ufs=None):
+        """(status, snapshot) das `ufs` pedidas (None: todas as do manifesto)."""
+        existentes = self.ufs()
+        if ufs is None:
+            pedidas = existentes
+        else:
+            pedidas = sorted({_uf(u) for u in ufs} & set(existentes))
+        snaps = []
+        for uf in pedidas:
+            status, snap = self.fatia(uf).obter(headers)
+            if status not in (200, 304) or snap is None:
+                return status, snap
+            snaps.append(snap)
+        return 200, self._combinar(pedidas, snaps)
+
+    def _combinar(self, ufs, snaps):
+        if len(snaps) == 1:
+            return snaps[0]
+        chave = tuple(ufs)
+        with self._lock:
+            guardado = self._combinados.get(chave)
+        if guardado is not None and len(guardado[0]) == len(snaps) and all(
+                a is b for a, b in zip(guardado[0], snaps)):
+            return guardado[1]
+        with metricas.medir("particoes.combinar", f"{len(snaps)} UFs"):
+            if snaps:
+                df = pd.concat([s.df for s in snaps])
+            else:
+                df = pd.DataFrame(columns=self._colunas())
+                df.index.name = engine.COL_ID
+            combinado = engine.Snapshot(df)
+        with self._lock:
+            self._combinados.pop(chave, None)
+            self._combinados[chave] = (snaps, combinado)
+            while len(self._combinados) > COMBINADOS_GUARDADOS:
+                self._combinados.pop(next(iter(self._combinados)))
+        return combinado
+
+    def atualizar(self, headers=None):
+        """Revalida as UFs já carregadas e refaz/aquece as junções em uso.
+
+        Retorna (status, versao): versao muda quando algum arquivo carregado muda.
+        O manifesto é revalidado à parte (atualizar_manifesto).
+        """
+        with self._lock:
+            fatias = dict(self._fatias)
+            pedidas = list(self._combinados)
+        versao = []
+        for uf, planilha in sorted(fatias.items()):
+            status, snap = planilha.atualizar(headers)
+            if status not in (200, 304, 404):
+                return status, None
+            if snap is not None:
+                snap.aquecer()
+            versao.append((uf, id(snap)))
+        for ufs in pedidas:
+            _status, snap = self.obter(headers, ufs=list(ufs))
+            if snap is not None:
+                snap.aquecer()
+        return 200, tuple(versao)
+
+    @property
+    def atualizado_em(self):
+        with self._lock:
+            fatias = list(self._fatias.values())
+        momentos = [self.manifesto.atualizado_em] + [f.atualizado_em for f in fatias]
+        return None if None in momentos else min(momentos)
+
+    # ---------- escrita ----------
+    def _onde_esta(self, id_linha, headers):
+        # primeiro as UFs já carregadas (as do usuário), depois as demais
+        with self._lock:
+            carregadas = [uf for uf, f in self._fatias.items() if f.base.valor is not None]
+        for uf in carregadas + [u for u in self.ufs() if u not in carregadas]:
+            status, snap = self.fatia(uf).obter(headers)
+            if status in (200, 304) and snap is not None and id_linha in snap.df.index:
+                return uf, snap
+        return None, None
+
+    def registrar(self, ops, headers=None, mensagem="Atualização SALDO_PECAS"):
+        """Anexa cada operação ao journal da UF da linha. Retorna (ok, detalhe do erro).
+
+        As operações de uma UF vão num único commit; uma ação que mexe em
+        várias UFs faz um commit por UF.
+        """
+        por_uf = {}
+        for op in ops:
+            if op["op"] == "insert":
+                por_uf.setdefault(_uf(op["linha"].get("UF")), []).append(op)
+                continue
+            uf, snap = self._onde_esta(op["id"], headers)
+            if uf is None:
+                return False, f"linha {op['id']} não encontrada"
+            nova_uf = _uf(op["campos"]["UF"]) if op["op"] == "update" and "UF" in op["campos"] else uf
+            if nova_uf == uf:
+                por_uf.setdefault(uf, []).append(op)
+            else:
+                # mudou de UF: sai do arquivo antigo e entra inteira no novo
+                linha = {**snap.df.loc[op["id"]].dropna().to_dict(), **op["campos"]}
+                por_uf.setdefault(uf, []).append(journal.remover(op["id"], op.get("usuario", "")))
+                por_uf.setdefault(nova_uf, []).append(journal.inserir(linha, op.get("usuario", ""), op["id"]))
+
+        colunas = self._colunas()
+        for uf, ops_uf in sorted(por_uf.items()):
+            if uf not in self.ufs() and not self._criar_fatia(uf, colunas, headers):
+                return False, f"não foi possível criar o arquivo da UF {uf}"
+            ok, erro = self.fatia(uf).registrar(ops_uf, headers=headers, mensagem=f"{mensagem} [{uf}]")
+            if not ok:
+                return False, f"{uf}: {erro}"
+        return True, ""
+
+    def substituir(self, df_novo, base_snap, headers=None, mensagem="Atualização SALDO_PECAS", tentativas=4):
+        """Regrava só as UFs cujas linhas mudaram entre `base_snap` e `df_novo`.
+
+        Cada UF passa pelo substituir() do próprio arquivo, com a mesma mescla
+        de linhas em caso de gravação concorrente. Retorna (ok, erro, conflitos).
+        """
+        antes = base_snap.df
+        ufs_novas, ufs_antes = _ufs_de(df_novo), _ufs_de(antes)
+        colunas = list(df_novo.columns)
+        for uf in sorted(set(ufs_novas) | set(ufs_antes)):
+            novo = df_novo[ufs_novas == uf]
+            anterior = antes[ufs_antes == uf]
+            if _iguais(novo, anterior):
+                continue
+            if uf not in self.ufs() and not self._criar_fatia(uf, colunas, headers):
+                return False, f"não foi possível criar o arquivo da UF {uf}", []
+            planilha = self.fatia(uf)
+            # o substituir() da UF só mescla se o snapshot passado não for o
+            # atual dela; se ninguém mexeu na UF desde a leitura, passa o atual
+            status, atual = planilha.obter(headers)
+            if status not in (200, 304) or atual is None:
+                return False, f"{uf}: falha ao ler a planilha (código {status})", []
+            base_uf = atual if _iguais(atual.df, anterior) else engine.Snapshot(anterior)
+            ok, erro, conflitos = planilha.substituir(
+                novo, base_uf, headers=headers, mensagem=f"{mensagem} [{uf}]", tentativas=tentativas,
+            )
+            if not ok:
+                return False, f"{uf}: {erro}", conflitos
+        return True, "", []
+
+    # ---------- migração ----------
+    def migrar(self, snap, sha_origem=None, headers=None, mensagem="Divisão da planilha por UF"):
+        """Copia o snapshot da planilha única para um arquivo por UF e grava o manifesto.
+
+        Pode ser repetido depois de uma falha: UFs já gravadas são regravadas
+        com o mesmo conteúdo. A planilha única não é apagada. Retorna
+        {UF: linhas} ou None se algo falhou.
+        """
+        df = snap.df
+        contagem = {}
+        for uf, grupo in df.groupby(_ufs_de(df), sort=True):
+            planilha = self.fatia(uf)
+            status, _snap = planilha.base.revalidar(headers)
+            if status not in (200, 304, 404):
+                return None
+            conteudo = engine.serializar_planilha(grupo)
+            resp = github_api.put_conteudo(planilha.base.url, conteudo, f"{mensagem} [{uf}]",
+                                           sha=planilha.base.sha if status != 404 else None,
+                                           headers=headers, sessao=self.sessao)
+            if resp.status_code not in (200, 201):
+                print(f"Erro ao gravar {uf}: {resp.status_code} {resp.text}")
+                return None
+            planilha.base.registrar_escrita(github_api.sha_da_resposta(resp), valor=engine.Snapshot(grupo))
+            planilha.journal.invalidar()
+            contagem[uf] = int(len(grupo))
+
+        def alterar(m):
+            return {**m, "ufs": sorted(set(m.get("ufs", [])) | set(contagem)), "colunas": list(df.columns),
+                    "origem": sha_origem, "migrado_em": datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+        if not self._gravar_manifesto(alterar, mensagem, headers):
+            return None
+        with self._lock:
+            self._combinados.clear()
+        return contagem
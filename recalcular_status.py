@@ -0,0 +1,74 @@
+# recalcular_status.py
+"""Job em lote: recalcula STATUS e DATA_VERIFICACAO de todas as linhas da planilha.
+
+STATUS vem da DATA_FIM (VENCIDO / A_VENCER nos próximos --dias / DENTRO) e
+DATA_VERIFICACAO passa a ser a data do job. Tudo é calculado de uma vez
+(engine.Snapshot.com_status) e gravado numa única regravação da planilha
+(uma por UF no layout por UF; cada uma grava a base e zera o journal), com
+a mesma concorrência otimista do app.
+
+Uso (ex.: cron todo dia às 2h):
+    GITHUB_TOKEN=... python recalcular_status.py
+    python recalcular_status.py --simular
+    python recalcular_status.py --api-base http://127.0.0.1:8765/repos/otavilobato/pecas1/contents --data 2025-01-31
+
+O token vem da seção [token] do secrets.toml do app ou da variável GITHUB_TOKEN.
+Sai com código 1 se a leitura ou a gravação falhar.
+"""
+import argparse
+import os
+import sys
+import tomllib
+
+import pandas as pd
+
+import armazenamento
+import engine
+import github_api
+
+SECRETS_PADRAO = os.path.join(".streamlit", "secrets.toml")
+
+
+def _token(caminho_secrets):
+    # mesma ordem do app.get_github_token: [token] GITHUB_TOKEN, GITHUB_TOKEN solto, variável de ambiente
+    secrets = {}
+    if os.path.exists(caminho_secrets):
+        with open(caminho_secrets, "rb") as f:
+            secrets = tomllib.load(f)
+    t = secrets.get("token")
+    if isinstance(t, dict):
+        t = t.get("GITHUB_TOKEN") or t.get("github_token")
+    return t or secrets.get("GITHUB_TOKEN") or os.getenv("GITHUB_TOKEN")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recalcula STATUS e DATA_VERIFICACAO da planilha de peças.")
+    parser.add_argument("--dias", type=int, default=engine.DIAS_A_VENCER,
+                        help="janela do A_VENCER em dias (padrão: %(default)s)")
+    parser.add_argument("--data", help="data de referência aaaa-mm-dd (padrão: hoje)")
+    parser.add_argument("--api-base", default=armazenamento.REPO_API_BASE, help="URL base da Contents API")
+    parser.add_argument("--secrets", default=SECRETS_PADRAO, help="secrets.toml do app (para o token)")
+    parser.add_argument("--simular", action="store_true", help="só mostra a contagem, sem gravar")
+    args = parser.parse_args()
+
+    token = _token(args.secrets)
+    if not token and not args.simular:
+        print("Token do GitHub não configurado (GITHUB_TOKEN ou secrets.toml).", file=sys.stderr)
+        return 1
+    hoje = pd.Timestamp(args.data) if args.data else None
+
+    sessao = github_api.SessaoGitHub(token)
+    planilha = armazenamento.escolher(armazenamento.planilha_unica(args.api_base, sessao),
+                                      armazenamento.planilha_por_uf(args.api_base, sessao))
+    ok, erro, contagem = armazenamento.recalcular_status(planilha, hoje=hoje, dias=args.dias,
+                                                         simular=args.simular)
+    if not ok:
+        print(f"Falha: {erro}", file=sys.stderr)
+        return 1
+    resumo = ", ".join(f"{status}: {n}" for status, n in sorted(contagem.items()))
+    print(f"{'Simulação' if args.simular else 'Gravado'} - {resumo or 'planilha vazia'}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,125 @@
+# sintetico.py
+# Geradores de dados sintéticos (planilha de peças e logs) para o benchmark.py.
+import io
+
+import numpy as np
+import pandas as pd
+
+import engine
+import importacao
+
+# Mesmas colunas de app.LOG_COLS
+COLUNAS_LOG = ["data_hora", "usuario", "acao", "detalhes", "antes", "depois"]
+ACOES_LOG = ["LOGIN", "LOGOUT", "CADASTRO", "RENOVACAO", "EXCLUSAO", "EXPORTACAO", "BUSCA", "IMPORTACAO"]
+SLAS = ["24H", "12H", "8H", "4H", "NBD"]
+MAQUINAS = ["9117-MMC", "8286-42A", "9009-22A", "2076-624", "2145-DH8", "3584-L53", "8247-22L", "9080-M9S"]
+DESCRICOES = ["DISCO", "FONTE", "MEMORIA", "VENTILADOR", "PLACA", "CONTROLADORA", "BATERIA", "CABO"]
+_ALFABETO = np.array(list("0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"))
+
+# proporção de cada formato de DATA_FIM (o que já existe na planilha real)
+FORMATOS_DATA = {"dd/mm/aa": 0.45, "dd/mm/aaaa": 0.25, "iso": 0.15, "serial": 0.15}
+# proporção de cada formato de CLIENTE (app.py, new_app.py e já migrado)
+FORMATOS_CLIENTE = {"app": 0.6, "new_app": 0.2, "migrado": 0.2}
+
+
+def _codigos(rng, n, tamanho=importacao.TAMANHO_CODIGO):
+    """`n` códigos alfanuméricos de `tamanho` caracteres."""
+    letras = _ALFABETO[rng.integers(0, len(_ALFABETO), (n, tamanho))]
+    return np.ascontiguousarray(letras).view(f"<U{tamanho}").ravel()
+
+
+def _sortear_formato(rng, n, proporcoes):
+    nomes = list(proporcoes)
+    return np.asarray(nomes)[rng.choice(len(nomes), n, p=list(proporcoes.values()))]
+
+
+def _texto(serie):
+    return pd.Series(serie, dtype=object).astype(str)
+
+
+def pecas(n, seed=0, ufs=engine.UFS, hoje=None, dias_antes=400, dias_depois=800, fracao_subs=0.4):
+    """DataFrame de `n` peças no formato da aba PRINCIPAL (sem ID_LINHA, como a planilha antiga).
+
+    DATA_FIM vem num dos formatos de FORMATOS_DATA (inclusive serial numérico
+    do Excel) e CLIENTE num dos formatos de FORMATOS_CLIENTE; as datas caem
+    entre `dias_antes` dias atrás e `dias_depois` dias à frente de `hoje`, então
+    há vencidas e a vencer. Os SUBx saem do mesmo conjunto de códigos do FRU.
+    """
+    rng = np.random.default_rng(seed)
+    hoje = pd.Timestamp(hoje or pd.Timestamp.today()).normalize()
+    pool = _codigos(rng, max(50, n // 4))
+
+    uf = np.asarray(ufs)[rng.integers(0, len(ufs), n)]
+    sla = np.asarray(SLAS)[rng.integers(0, len(SLAS), n)]
+    fim = hoje + pd.to_timedelta(rng.integers(-dias_antes, dias_depois, n), unit="D")
+    contrato = fim - pd.to_timedelta(rng.integers(180, 3 * 365, n), unit="D")
+
+    df = pd.DataFrame({"UF": uf, "FRU": pool[rng.integers(0, len(pool), n)]})
+    for col in ("SUB1", "SUB2", "SUB3"):
+        tem = rng.random(n) < fracao_subs
+        df[col] = np.where(tem, pool[rng.integers(0, len(pool), n)], None)
+        fracao_subs /= 2
+    df["DESCRICAO"] = (_texto(np.asarray(DESCRICOES)[rng.integers(0, len(DESCRICOES), n)]) + " "
+                       + _texto(rng.integers(1, 1000, n)))
+    df["MAQUINAS"] = np.asarray(MAQUINAS)[rng.integers(0, len(MAQUINAS), n)]
+
+    nome = "CLIENTE " + _texto(rng.integers(1, max(2, n // 20), n)).str.zfill(5)
+    serial = pd.Series(_codigos(rng, n))
+    formato = _sortear_formato(rng, n, FORMATOS_CLIENTE)
+    cliente_app = (nome + " - (" + serial + " " + _texto(contrato.strftime("%d/%m/%y")) + "_"
+                   + _texto(sla) + ") - " + _texto(uf))
+    cliente_new = (nome + "(" + serial + "_" + _texto(contrato.strftime("%Y-%m-%d")) + "_"
+                   + _texto(sla) + ")" + _texto(uf))
+    df["CLIENTE"] = np.where(formato == "new_app", cliente_new, cliente_app)
+
+    formato = _sortear_formato(rng, n, FORMATOS_DATA)
+    serial_excel = (fim - engine.EXCEL_EPOCH).days.to_numpy()
+    data_fim = np.where(formato == "dd/mm/aa", fim.strftime("%d/%m/%y").to_numpy(dtype=object), None)
+    data_fim = np.where(formato == "dd/mm/aaaa", fim.strftime("%d/%m/%Y").to_numpy(dtype=object), data_fim)
+    data_fim = np.where(formato == "iso", fim.strftime("%Y-%m-%d 00:00:00").to_numpy(dtype=object), data_fim)
+    data_fim = np.where(formato == "serial", serial_excel.astype(object), data_fim)
+    df["DATA_FIM"] = data_fim
+    df["SLA"] = sla
+    df["DATA_VERIFICACAO"] = hoje.strftime("%d/%m/%y")
+    df["STATUS"] = np.where(fim < hoje, "VENCIDO", "DENTRO")
+
+    migrado = (_sortear_formato(rng, n, FORMATOS_CLIENTE) == "migrado")
+    df["CLIENTE_NOME"] = np.where(migrado, nome, None)
+    df["SERIAL"] = np.where(migrado, serial, None)
+    df["CONTRATO_DATA"] = np.where(migrado, _texto(contrato.strftime("%d/%m/%y")), None)
+    return df
+
+
+def logs(n, seed=0, usuarios=None, hoje=None, dias=730):
+    """DataFrame de `n` eventos de log (COLUNAS_LOG, tudo texto) nos últimos `dias` dias, em ordem."""
+    rng = np.random.default_rng(seed)
+    hoje = pd.Timestamp(hoje or pd.Timestamp.today()).normalize()
+    usuarios = usuarios or [f"usuario{i:02d}" for i in range(20)]
+    segundos = np.sort(rng.integers(0, dias * 86400, n))
+    quando = hoje + pd.Timedelta(days=1) - pd.to_timedelta(dias * 86400 - segundos, unit="s")
+    acao = np.asarray(ACOES_LOG)[rng.integers(0, len(ACOES_LOG), n)]
+    fru = pd.Series(_codigos(rng, n))
+    com_dados = np.isin(acao, ["CADASTRO", "RENOVACAO", "EXCLUSAO"])
+    antes = '{"FRU": "' + fru + '", "DATA_FIM": "01/01/25", "STATUS": "VENCIDO"}'
+    depois = '{"FRU": "' + fru + '", "DATA_FIM": "01/01/26", "STATUS": "DENTRO"}'
+    return pd.DataFrame({
+        "data_hora": quando.strftime("%Y-%m-%d %H:%M:%S"),
+        "usuario": np.asarray(usuarios)[rng.integers(0, len(usuarios), n)],
+        "acao": acao,
+        "detalhes": "FRU " + fru,
+        "antes": np.where(com_dados & (acao != "CADASTRO"), antes, ""),
+        "depois": np.where(com_dados & (acao != "EXCLUSAO"), depois, ""),
+    })
+
+
+def planilha_xlsx(df):
+    """Bytes do xlsx com `df` na aba PRINCIPAL, sem coluna de id (planilha anterior aos ids)."""
+    output = io.BytesIO()
+    with pd.ExcelWriter(output, engine="openpyxl") as writer:
+        df.to_excel(writer, sheet_name=engine.ABA_PRINCIPAL, index=False)
+    return output.getvalue()
+
+
+def logs_csv(df):
+    """Bytes do logs.csv antigo (arquivo único)."""
+    return df.to_csv(index=False, lineterminator="\n").encode("utf-8")
@@ -0,0 +1,90 @@
+# snapshot_cache.py
+# Cache em disco do DataFrame já parseado, endereçado pelo sha do blob no GitHub.
+import json
+import os
+import tempfile
+
+import pandas as pd
+
+import metricas
+
+
+class CacheDeSnapshots:
+    """Guarda um arquivo por sha (pickle do valor parseado) e aponta qual foi o último visto.
+
+    O pickle do pandas grava os blocos de colunas direto, sem passar pelo
+    openpyxl, e aceita as colunas de tipos mistos que a planilha tem hoje.
+    """
+
+    def __init__(self, diretorio, manter=5):
+        self.diretorio = diretorio
+        self.manter = manter
+        os.makedirs(diretorio, exist_ok=True)
+
+    def _caminho(self, sha):
+        return os.path.join(self.diretorio, f"{sha}.pkl")
+
+    def _gravar_atomico(self, caminho, escrever):
+        fd, tmp = tempfile.mkstemp(dir=self.diretorio, suffix=".tmp")
+        os.close(fd)
+        try:
+            escrever(tmp)
+            os.replace(tmp, caminho)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def ler(self, sha):
+        """Valor do sha, ou None se não estiver no cache."""
+        if not sha:
+            return None
+        caminho = self._caminho(sha)
+        if not os.path.exists(caminho):
+            return None
+        try:
+            with metricas.medir("cache_disco.ler", sha[:8]):
+                return pd.read_pickle(caminho)
+        except Exception:
+            return None
+
+    def salvar(self, sha, valor, etag=None):
+        if not sha or valor is None:
+            return
+        try:
+            caminho = self._caminho(sha)
+            if os.path.exists(caminho):
+                os.utime(caminho)
+            else:
+                self._gravar_atomico(caminho, lambda tmp: pd.to_pickle(valor, tmp))
+
+            def _ponteiro(tmp):
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump({"sha": sha, "etag": etag}, f)
+            self._gravar_atomico(os.path.join(self.diretorio, "ultimo.json"), _ponteiro)
+            self._limpar()
+        except Exception as e:
+            print("Erro ao gravar snapshot:", e)
+
+    def ultimo(self):
+        """(sha, etag, valor) do último snapshot gravado, ou None."""
+        try:
+            with open(os.path.join(self.diretorio, "ultimo.json"), encoding="utf-8") as f:
+                ponteiro = json.load(f)
+        except Exception:
+            return None
+        valor = self.ler(ponteiro.get("sha"))
+        if valor is None:
+            return None
+        return ponteiro["sha"], ponteiro.get("etag"), valor
+
+    def _limpar(self):
+        arquivos = [
+            os.path.join(self.diretorio, n)
+            for n in os.listdir(self.diretorio) if n.endswith(".pkl")
+        ]
+        arquivos.sort(key=os.path.getmtime, reverse=True)
+        for caminho in arquivos[self.manter:]:
+            try:
+                os.remove(caminho)
+            except OSError:
+                pass
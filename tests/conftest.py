@@ -0,0 +1,45 @@
+# Testes contra a Contents API falsa (fake_github.py), sem rede.
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import armazenamento  # noqa: E402
+import engine  # noqa: E402
+import fake_github  # noqa: E402
+import github_api  # noqa: E402
+
+
+def planilha_exemplo():
+    df = pd.DataFrame({
+        "UF": ["DF", "PA", "AM", "DF"],
+        "FRU": ["AAAAAAA", "BBBBBBB", "CCCCCCC", "DDDDDDD"],
+        "DATA_FIM": ["01/01/24", "01/01/2030", "15/06/25", "01/01/2030"],
+        "STATUS": ["", "", "", ""],
+    }, index=pd.Index(["l0", "l1", "l2", "l3"], name=engine.COL_ID))
+    return df
+
+
+@pytest.fixture
+def github():
+    """(repositório em memória, url da Contents API) com a SALDO_PECAS.xlsx de exemplo."""
+    repo = fake_github.RepositorioFalso({
+        armazenamento.ARQUIVO_PLANILHA: engine.serializar_planilha(planilha_exemplo()),
+    })
+    servidor, url = fake_github.iniciar(repo)
+    yield repo, url
+    servidor.shutdown()
+    servidor.server_close()
+
+
+@pytest.fixture
+def cliente(github):
+    """Fábrica de clientes independentes (um por processo do app), com cache de 5 min."""
+    _repo, url = github
+
+    def novo():
+        return armazenamento.planilha_unica(url, github_api.SessaoGitHub(), intervalo=300)
+    return novo
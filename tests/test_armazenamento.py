@@ -0,0 +1,119 @@
+import threading
+import time
+
+import armazenamento
+import github_api
+import journal
+
+
+class SessaoLenta:
+    """Sessão cujas requisições só saem depois de `liberar` (uma API que não responde)."""
+
+    def __init__(self):
+        self.liberar = threading.Event()
+        self.sessao = github_api.SessaoGitHub()
+        self._em_andamento = 0
+
+    def get(self, *args, **kwargs):
+        self._em_andamento += 1
+        try:
+            self.liberar.wait(10)
+            return self.sessao.get(*args, **kwargs)
+        finally:
+            self._em_andamento -= 1
+
+    def encerrar(self):
+        """Libera as requisições e espera as revalidações em segundo plano (antes do servidor sair)."""
+        self.liberar.set()
+        time.sleep(0.1)  # threads recém-criadas chegarem ao get()
+        for _ in range(100):
+            if not self._em_andamento:
+                return
+            time.sleep(0.02)
+
+
+def _partida_a_frio(abrir, ler):
+    """Lê com uma API que não responde; retorna (segundos, snapshot)."""
+    lenta = SessaoLenta()
+    planilha = abrir(lenta)
+    try:
+        inicio = time.monotonic()
+        status, snap = ler(planilha)
+        assert status == 200
+        return time.monotonic() - inicio, snap
+    finally:
+        lenta.encerrar()
+
+
+def test_planilha_unica_parte_do_disco_sem_esperar_a_api(github, tmp_path):
+    _repo, url = github
+    aquecida = armazenamento.planilha_unica(url, github_api.SessaoGitHub(), dir_cache=str(tmp_path))
+    assert aquecida.registrar([journal.inserir({"UF": "DF", "FRU": "DO_JOURNAL"})])[0]
+
+    segundos, snap = _partida_a_frio(
+        lambda sessao: armazenamento.planilha_unica(url, sessao, dir_cache=str(tmp_path), intervalo=300),
+        lambda planilha: planilha.obter(),
+    )
+    assert segundos < 2
+    assert "DO_JOURNAL" in set(snap.df["FRU"])
+
+
+def test_planilha_por_uf_parte_do_disco_sem_esperar_a_api(github, cliente, tmp_path):
+    _repo, url = github
+    _status, snap = cliente().obter()
+    aquecida = armazenamento.planilha_por_uf(url, github_api.SessaoGitHub(), dir_cache=str(tmp_path))
+    assert aquecida.migrar(snap)
+    assert aquecida.registrar([journal.atualizar("l0", {"STATUS": "VENCIDO"})])[0]
+    assert aquecida.obter(ufs=["DF"])[0] == 200
+
+    def ler(por_uf):
+        assert por_uf.ativa(esperar=False)
+        return por_uf.obter(ufs=["DF"])
+    segundos, snap = _partida_a_frio(
+        lambda sessao: armazenamento.planilha_por_uf(url, sessao, dir_cache=str(tmp_path), intervalo=300), ler,
+    )
+    assert segundos < 2
+    assert snap.df.loc["l0", "STATUS"] == "VENCIDO"
+
+
+def test_ativa_sem_esperar_nao_consulta_a_api(github, cliente, tmp_path):
+    _repo, url = github
+    lenta = SessaoLenta()
+    por_uf = armazenamento.planilha_por_uf(url, lenta, dir_cache=str(tmp_path))
+    try:
+        assert armazenamento.escolher(cliente(), por_uf, esperar=False) is not por_uf
+    finally:
+        lenta.encerrar()
+    assert por_uf.atualizar_manifesto() == 404
+    assert not por_uf.ativa(esperar=False)
+
+
+# ---------- job de STATUS (recalcular_status.py) ----------
+def test_recalcular_status(cliente):
+    # exemplo: DATA_FIM 01/01/24, 01/01/2030, 15/06/25, 01/01/2030
+    ok, erro, contagem = armazenamento.recalcular_status(cliente(), hoje="2025-06-01", dias=30)
+    assert (ok, erro) == (True, "")
+    assert contagem == {"VENCIDO": 1, "A_VENCER": 1, "DENTRO": 2}
+
+    _status, snap = cliente().atualizar()
+    assert snap.df["STATUS"].tolist() == ["VENCIDO", "DENTRO", "A_VENCER", "DENTRO"]
+    assert set(snap.df["DATA_VERIFICACAO"]) == {"01/06/25"}
+
+
+def test_recalcular_status_simulado_nao_grava(github, cliente):
+    repo, _url = github
+    antes = dict(repo.arquivos)
+    ok, _erro, contagem = armazenamento.recalcular_status(cliente(), hoje="2025-06-01", simular=True)
+    assert ok and sum(contagem.values()) == 4
+    assert repo.arquivos == antes
+
+
+def test_token_do_job_segue_a_ordem_do_app(tmp_path, monkeypatch):
+    import recalcular_status
+    monkeypatch.setenv("GITHUB_TOKEN", "do-ambiente")
+    secrets = tmp_path / "secrets.toml"
+    assert recalcular_status._token(str(secrets)) == "do-ambiente"
+    secrets.write_text('GITHUB_TOKEN = "solto"\n')
+    assert recalcular_status._token(str(secrets)) == "solto"
+    secrets.write_text('GITHUB_TOKEN = "solto"\n[token]\nGITHUB_TOKEN = "da-secao"\n')
+    assert recalcular_status._token(str(secrets)) == "da-secao"
@@ -0,0 +1,127 @@
+import types
+
+import pytest
+
+import audit_log
+import fake_github
+import github_api
+
+COLUNAS = ["data_hora", "usuario", "acao", "detalhes", "antes", "depois"]
+
+
+@pytest.fixture
+def logs():
+    repo = fake_github.RepositorioFalso()
+    servidor, url = fake_github.iniciar(repo)
+    yield repo, audit_log.LogsParticionados(f"{url}/logs", COLUNAS, sessao=github_api.SessaoGitHub())
+    servidor.shutdown()
+    servidor.server_close()
+
+
+def _linhas(repo, arquivo):
+    return repo.arquivos[arquivo].decode("utf-8").splitlines()
+
+
+LOTE = b"2026-10-17 10:00:00,ana,LOGIN,,,\n2026-10-17 10:00:05,ana,RENOVACAO,l0,,\n"
+
+
+def test_reenvio_depois_de_falha_no_manifesto_nao_duplica(logs, monkeypatch):
+    repo, particionados = logs
+    put = github_api.put_conteudo
+
+    def put_sem_manifesto(url, *args, **kwargs):
+        if url.endswith("manifest.json"):
+            return types.SimpleNamespace(status_code=500, text="erro")
+        return put(url, *args, **kwargs)
+    monkeypatch.setattr(github_api, "put_conteudo", put_sem_manifesto)
+    assert not particionados.anexar_csv(LOTE)
+
+    monkeypatch.setattr(github_api, "put_conteudo", put)
+    # a FilaDeLogs manda o mesmo lote de novo
+    assert particionados.anexar_csv(LOTE)
+    assert len(_linhas(repo, "logs/2026-10.csv")) == 3
+    assert particionados.ler_manifesto()["particoes"]["2026-10"]["linhas"] == 2
+
+
+def test_put_que_chegou_mas_voltou_409_nao_duplica(logs, monkeypatch):
+    repo, particionados = logs
+    put = github_api.put_conteudo
+    chamadas = []
+
+    def put_perde_resposta(url, *args, **kwargs):
+        resp = put(url, *args, **kwargs)
+        if url.endswith("2026-10.csv") and not chamadas:
+            chamadas.append(url)
+            return types.SimpleNamespace(status_code=409, text="conflito")
+        return resp
+    monkeypatch.setattr(github_api, "put_conteudo", put_perde_resposta)
+    assert particionados.anexar_csv(LOTE)
+    assert len(_linhas(repo, "logs/2026-10.csv")) == 3
+
+
+def test_lotes_diferentes_sao_anexados(logs):
+    repo, particionados = logs
+    assert particionados.anexar_csv(LOTE)
+    assert particionados.anexar_csv(b"2026-10-17 11:00:00,bia,LOGIN,,,\n")
+    assert particionados.anexar_csv(b"2026-11-02 08:00:00,ana,LOGIN,,,\n")
+    assert len(_linhas(repo, "logs/2026-10.csv")) == 4
+    assert particionados.chaves_no_periodo("2026-10-01", "2026-11-30") == ["2026-10", "2026-11"]
+    df = particionados.carregar("2026-10-17", "2026-10-17", usuarios=["ana"])
+    assert df["acao"].tolist() == ["RENOVACAO", "LOGIN"]
+
+
+# ---------- FilaDeLogs (spool local) ----------
+class Destino:
+    def __init__(self):
+        self.lotes = []
+        self.falhar = False
+
+    def __call__(self, linhas_csv, n_eventos):
+        if self.falhar:
+            return False
+        self.lotes.append((linhas_csv, n_eventos))
+        return True
+
+
+@pytest.fixture
+def fila(tmp_path):
+    destino = Destino()
+    caminho = str(tmp_path / "logs_local.csv")
+    return audit_log.FilaDeLogs(caminho, COLUNAS, destino, intervalo=3600, lote=1000), destino, caminho
+
+
+def test_fila_envia_eventos_num_lote(fila):
+    fila_logs, destino, caminho = fila
+    fila_logs.registrar({"data_hora": "2026-10-17 10:00:00", "usuario": "ana", "acao": "LOGIN"})
+    fila_logs.registrar({"data_hora": "2026-10-17 10:01:00", "usuario": "ana", "acao": "SAIR"})
+    assert len(fila_logs.pendentes()) == 2
+    assert fila_logs.descarregar()
+    assert destino.lotes == [(b"2026-10-17 10:00:00,ana,LOGIN,,,\n2026-10-17 10:01:00,ana,SAIR,,,\n", 2)]
+    assert fila_logs.pendentes() == []
+
+
+def test_fila_mantem_lote_que_falhou(fila):
+    fila_logs, destino, _caminho = fila
+    fila_logs.registrar({"data_hora": "2026-10-17 10:00:00", "usuario": "ana", "acao": "LOGIN"})
+    destino.falhar = True
+    assert not fila_logs.descarregar()
+    fila_logs.registrar({"data_hora": "2026-10-17 10:05:00", "usuario": "bia", "acao": "LOGIN"})
+    assert [e["usuario"] for e in fila_logs.pendentes()] == ["ana", "bia"]
+
+    destino.falhar = False
+    # a sobra vai primeiro, o spool atual na mesma chamada
+    assert fila_logs.descarregar()
+    assert [n for _lote, n in destino.lotes] == [1, 1]
+    assert fila_logs.pendentes() == []
+
+
+def test_fila_envia_sobra_de_execucao_anterior(tmp_path):
+    caminho = str(tmp_path / "logs_local.csv")
+    with open(caminho + ".enviando", "w", encoding="utf-8") as f:
+        f.write(",".join(COLUNAS) + "\n2026-10-16 09:00:00,ana,LOGIN,,,\n")
+    destino = Destino()
+    fila_logs = audit_log.FilaDeLogs(caminho, COLUNAS, destino, intervalo=3600, lote=1000)
+    fila_logs.registrar({"data_hora": "2026-10-17 10:00:00", "usuario": "bia", "acao": "LOGIN"})
+    assert fila_logs.descarregar()
+    assert [lote for lote, _n in destino.lotes] == [b"2026-10-16 09:00:00,ana,LOGIN,,,\n",
+                                                     b"2026-10-17 10:00:00,bia,LOGIN,,,\n"]
@@ -0,0 +1,223 @@
+import numpy as np
+import pandas as pd
+
+import engine
+
+
+def _base():
+    return pd.DataFrame({
+        "UF": ["DF", "PA", "AM", "RJ"],
+        "FRU": ["A", "B", "C", "D"],
+    }, index=pd.Index(["l0", "l1", "l2", "l3"], name=engine.COL_ID))
+
+
+def test_mesclar_linhas_sem_conflito():
+    base = _base()
+    nosso = base.copy()
+    nosso.loc["l0", "FRU"] = "A!"
+    nosso = pd.concat([nosso.drop(index=["l3"]), pd.DataFrame({"UF": ["MG"], "FRU": ["E"]}, index=["n1"])])
+    deles = base.copy()
+    deles.loc["l1", "FRU"] = "B!"
+
+    df, conflitos = engine.mesclar_linhas(base, nosso, deles)
+    assert conflitos == []
+    assert df["FRU"].to_dict() == {"l0": "A!", "l1": "B!", "l2": "C", "n1": "E"}
+
+
+def test_mesclar_linhas_mesma_alteracao_nao_e_conflito():
+    base = _base()
+    nosso, deles = base.copy(), base.copy()
+    nosso.loc["l0", "FRU"] = deles.loc["l0", "FRU"] = "igual"
+
+    df, conflitos = engine.mesclar_linhas(base, nosso, deles)
+    assert conflitos == []
+    assert df.loc["l0", "FRU"] == "igual"
+
+
+def test_mesclar_linhas_conflitos():
+    base = _base()
+    nosso, deles = base.copy(), base.copy()
+    # alterada pelos dois com valores diferentes
+    nosso.loc["l0", "FRU"], deles.loc["l0", "FRU"] = "nosso", "deles"
+    # alterada por nós, excluída por eles
+    nosso.loc["l1", "FRU"] = "nosso"
+    deles = deles.drop(index=["l1"])
+    # excluída por nós, alterada por eles
+    nosso = nosso.drop(index=["l2"])
+    deles.loc["l2", "FRU"] = "deles"
+
+    df, conflitos = engine.mesclar_linhas(base, nosso, deles)
+    assert sorted(conflitos) == ["l0", "l1", "l2"]
+    # em conflito vale a versão deles
+    assert df["FRU"].to_dict() == {"l0": "deles", "l2": "deles", "l3": "D"}
+
+
+def test_vencidas_com_uf_em_branco():
+    df = pd.DataFrame({
+        "UF": ["DF", None, " pa "],
+        "DATA_FIM": ["01/01/24", "01/01/24", "01/01/2030"],
+    }, index=pd.Index(["l0", "l1", "l2"], name=engine.COL_ID))
+    snap = engine.Snapshot(df)
+    assert list(snap.vencidas("2025-01-01").index) == ["l0", "l1"]
+    assert list(snap.vencidas("2025-01-01", ufs=["DF"]).index) == ["l0"]
+    assert list(snap.a_vencer("2029-12-01", 60, ufs=["PA"]).index) == ["l2"]
+
+
+def test_esquema_mantem_celulas_vazias():
+    df = pd.DataFrame({"UF": ["DF", None], "FRU": ["A", None], "SUB1": [12.0, None]},
+                      index=pd.Index(["l0", "l1"], name=engine.COL_ID))
+    snap = engine.Snapshot(df)
+    assert isinstance(snap.df["FRU"].dtype, pd.StringDtype)
+    assert pd.isna(snap.df.loc["l1", "FRU"])
+    assert snap.df.loc["l0", "SUB1"] == "12"
+    assert pd.isna(snap.df.loc["l1", "SUB1"])
+    # e volta vazia para a planilha
+    relido = engine.ler_planilha(engine.serializar_planilha(snap.df))
+    assert pd.isna(relido.df.loc["l1", "FRU"])
+
+
+def test_normalizar_datas_formatos_misturados():
+    import datetime
+    serie = pd.Series(["31/12/24", "01/02/2025", " 2025-03-04 10:00:00", 45658, "45658",
+                       datetime.date(2025, 5, 6), "lixo", None, ""], dtype=object)
+    datas = engine.normalizar_datas(serie)
+    assert datas.dtype == "datetime64[ns]"
+    assert datas.iloc[:6].dt.strftime("%Y-%m-%d").tolist() == [
+        "2024-12-31", "2025-02-01", "2025-03-04", "2025-01-01", "2025-01-01", "2025-05-06"]
+    assert datas.iloc[6:].isna().all()
+
+
+def test_normalizar_datas_serial_do_excel():
+    datas = engine.normalizar_datas(pd.Series([45658.7, 0, -3, float("nan")]))
+    assert datas.iloc[0] == pd.Timestamp("2025-01-01")
+    assert datas.iloc[1:].isna().all()
+
+
+def test_normalizar_datas_vazia_e_datetime():
+    assert engine.normalizar_datas(pd.Series([], dtype=object)).empty
+    com_hora = pd.Series(pd.to_datetime(["2025-01-02 13:45"]))
+    assert engine.normalizar_datas(com_hora).iloc[0] == pd.Timestamp("2025-01-02")
+
+
+def _datas(*valores):
+    return pd.Series(pd.to_datetime(list(valores)), index=[f"l{i}" for i in range(len(valores))])
+
+
+def test_indice_vencimento_fronteiras():
+    indice = engine.IndiceVencimento(_datas("2025-01-09", "2025-01-10", "2025-01-20", "2025-01-21", None),
+                                     pd.Series(["DF"] * 5, index=[f"l{i}" for i in range(5)]))
+    # vencida: antes do dia; a vencer: do dia até dia + dias, inclusive
+    assert sorted(indice.vencidas("2025-01-10")) == ["l0"]
+    assert sorted(indice.a_vencer("2025-01-10", 10)) == ["l1", "l2"]
+    assert sorted(indice.vencidas("2030-01-01")) == ["l0", "l1", "l2", "l3"]
+
+
+def test_indice_vencimento_por_uf():
+    indice = engine.IndiceVencimento(_datas("2024-01-01", "2024-02-01", "2024-03-01"),
+                                     pd.Series(["DF", "PA", "DF"], index=["l0", "l1", "l2"]))
+    assert sorted(indice.vencidas("2025-01-01", ufs=[" df "])) == ["l0", "l2"]
+    assert list(indice.vencidas("2025-01-01", ufs=["PA", "RJ"])) == ["l1"]
+    assert list(indice.vencidas("2025-01-01", ufs=[])) == []
+
+
+def test_indice_vencimento_incremental_igual_ao_reconstruido():
+    df = pd.DataFrame({"UF": ["DF", "PA", "DF"], "DATA_FIM": ["01/01/24", "01/02/24", "01/03/24"]},
+                      index=pd.Index(["l0", "l1", "l2"], name=engine.COL_ID))
+    snap = engine.Snapshot(df)
+    snap.vencidas("2025-01-01")
+    novo_df = engine.para_editar(df).drop(index=["l1"])
+    novo_df.loc["l0", ["UF", "DATA_FIM"]] = ["PA", "01/01/2030"]
+    novo_df.loc["l3"] = ["DF", "15/12/24"]
+    derivado = snap.derivar(novo_df, alterados=["l0", "l3"], removidos=["l1"])
+    reconstruido = engine.Snapshot(novo_df)
+    for ufs in (None, ["DF"], ["PA"]):
+        assert list(derivado.vencidas("2025-01-01", ufs).index) == list(reconstruido.vencidas("2025-01-01", ufs).index)
+        assert list(derivado.a_vencer("2029-12-15", 30, ufs).index) == list(
+            reconstruido.a_vencer("2029-12-15", 30, ufs).index)
+
+
+def _indice_busca():
+    df = pd.DataFrame({
+        "FRU": ["ABC1234", "XYZ9999", "ABC1299", "QWE0001"],
+        "SUB1": ["XYZ9999", None, None, None],
+        "DESCRICAO": ["Fonte de alimentação", "Disco rígido", "Fonte redundante", 12345],
+    })
+    return engine.IndiceBusca(df)
+
+
+def test_indice_busca_prefixo_e_todos_os_termos():
+    indice = _indice_busca()
+    assert indice.buscar("fonte").tolist() == [0, 2]
+    assert indice.buscar("abc12").tolist() == [0, 2]
+    assert indice.buscar("fonte red").tolist() == [2]
+    assert indice.buscar("fonte disco").tolist() == []
+    assert indice.buscar("123").tolist() == [3]  # prefixo de termo, não substring
+    assert indice.buscar("  ").tolist() == []
+
+
+def test_indice_busca_ignora_acentos():
+    indice = _indice_busca()
+    assert indice.buscar("alimentacao").tolist() == [0]
+    assert indice.buscar("ALIMENTAÇÃO").tolist() == [0]
+    assert indice.buscar("rigido").tolist() == [1]
+    assert engine.termos("Peça-série 3") == ["PECA", "SERIE", "3"]
+
+
+def test_indice_busca_substitutos():
+    indice = _indice_busca()
+    # ABC1234 tem XYZ9999 como SUB1: a linha do XYZ9999 é substituta
+    assert indice.substitutos(np.array([0])).tolist() == [1]
+    assert indice.substitutos(np.array([1])).tolist() == [0]
+    assert indice.substitutos(np.array([3])).tolist() == []
+
+
+def test_decompor_cliente_nos_dois_formatos():
+    partes = engine.decompor_cliente(pd.Series([
+        "Acme Ltda - (SN123 15/06/24_NBD) - df",
+        "acme(SN9_2024-06-15_24x7)PA",
+        "texto livre",
+        None,
+    ]))
+    registros = partes.to_dict("records")
+    assert registros[0] == {"CLIENTE_NOME": "ACME LTDA", "SERIAL": "SN123",
+                            "CONTRATO_DATA": pd.Timestamp("2024-06-15"), "SLA": "NBD", "UF": "DF"}
+    assert registros[1] == {"CLIENTE_NOME": "ACME", "SERIAL": "SN9",
+                            "CONTRATO_DATA": pd.Timestamp("2024-06-15"), "SLA": "24X7", "UF": "PA"}
+    # fora dos formatos: tudo no nome
+    assert registros[2]["CLIENTE_NOME"] == "TEXTO LIVRE"
+    assert partes.iloc[2, 1:].isna().all()
+    assert partes.iloc[3].isna().all()
+
+
+def test_migrar_cliente_preserva_sla_e_uf_e_e_idempotente():
+    df = pd.DataFrame({
+        "UF": ["RJ", None],
+        "SLA": [None, "4H"],
+        "CLIENTE": ["Acme - (SN1 01/02/24_NBD) - DF", "acme(SN2_2024-03-04_24X7)PA"],
+    }, index=pd.Index(["l0", "l1"], name=engine.COL_ID))
+    assert engine.clientes_sem_migrar(df) == 2
+    migrado, n = engine.migrar_cliente(df)
+    assert n == 2
+    assert migrado[["CLIENTE_NOME", "SERIAL", "CONTRATO_DATA"]].values.tolist() == [
+        ["ACME", "SN1", "01/02/24"], ["ACME", "SN2", "04/03/24"]]
+    # SLA / UF já preenchidos prevalecem
+    assert migrado["UF"].tolist() == ["RJ", "PA"]
+    assert migrado["SLA"].tolist() == ["NBD", "4H"]
+    assert engine.clientes_sem_migrar(migrado) == 0
+    assert engine.migrar_cliente(migrado)[1] == 0
+
+
+def test_mesclar_linhas_coluna_nova_e_tipo_diferente():
+    base = pd.DataFrame({"FRU": ["A", "B"], "QTD": [1, 2]}, index=pd.Index(["l0", "l1"], name=engine.COL_ID))
+    nosso = base.copy()
+    nosso["OBS"] = [None, "nova coluna"]
+    nosso["QTD"] = nosso["QTD"].astype(object)
+    nosso.loc["l1", "QTD"] = "duas"
+    deles = base.copy()
+    deles.loc["l0", "FRU"] = "A!"
+
+    df, conflitos = engine.mesclar_linhas(base, nosso, deles)
+    assert conflitos == []
+    assert df["FRU"].tolist() == ["A!", "B"]
+    assert df["QTD"].tolist() == [1, "duas"]
+    assert pd.isna(df.loc["l0", "OBS"]) and df.loc["l1", "OBS"] == "nova coluna"
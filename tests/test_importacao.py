@@ -0,0 +1,45 @@
+import pandas as pd
+import pytest
+
+import importacao
+
+
+def _arquivo(texto):
+    return importacao.ler_arquivo("pecas.csv", texto.encode("utf-8"))
+
+
+def test_ler_arquivo_normaliza_cabecalho():
+    bruto = _arquivo("uf;Fru;Clientes;Máquina;Data do contrato;SERIAL\nDF;ABC1234;ACME;X;01/01/25;S1\n")
+    assert list(bruto.columns) == ["UF", "FRU", "CLIENTE", "MAQUINAS", "DATA", "SERIAL"]
+
+
+def test_validar_separa_linhas_validas_e_erros():
+    bruto = _arquivo(
+        "UF,FRU,SUB1,SERIAL,DATA\n"
+        "df,abc1234,,s1,01/01/25\n"
+        "DF,ABC,,S2,x\n"
+        "PA,ABC1234,XY,,01/01/25\n"
+    )
+    validas, erros = importacao.validar(bruto)
+    assert validas[["UF", "FRU", "SERIAL"]].values.tolist() == [["DF", "ABC1234", "S1"]]
+    assert validas.loc[0, "DATA"] == pd.Timestamp("2025-01-01")
+    # LINHA conta o cabeçalho: a primeira linha de dados é a 2
+    assert erros["LINHA"].tolist() == [3, 4]
+    assert erros["ERROS"].tolist() == [
+        "DATA ausente ou inválida; FRU deve ter 7 caracteres",
+        "SERIAL é obrigatório; SUB1 deve ter 7 caracteres",
+    ]
+
+
+def test_validar_ufs_permitidas():
+    bruto = _arquivo("UF,FRU,SERIAL,DATA\nDF,ABC1234,S1,01/01/25\nPA,ABC1234,S2,01/01/25\n")
+    validas, erros = importacao.validar(bruto, ufs_permitidas=["df"])
+    assert validas["UF"].tolist() == ["DF"]
+    assert erros["ERROS"].tolist() == ["UF sem permissão para este usuário"]
+    validas, erros = importacao.validar(bruto, ufs_permitidas=["ALL"])
+    assert len(validas) == 2 and erros.empty
+
+
+def test_validar_sem_coluna_obrigatoria():
+    with pytest.raises(ValueError, match="SERIAL, DATA"):
+        importacao.validar(_arquivo("UF,FRU\nDF,ABC1234\n"))
@@ -0,0 +1,114 @@
+import pandas as pd
+
+import engine
+import journal
+
+
+def _frus(planilha):
+    status, snap = planilha.atualizar()
+    assert status in (200, 304)
+    return set(snap.df["FRU"])
+
+
+def test_registrar_de_dois_clientes(cliente):
+    a, b = cliente(), cliente()
+    b.obter()
+    assert a.registrar([journal.inserir({"UF": "DF", "FRU": "NOVO_A"})]) == (True, "")
+    # o cache de b ainda tem o journal sem a operação de a: o PUT dá 409 e b relê
+    assert b.registrar([journal.inserir({"UF": "PA", "FRU": "NOVO_B"})]) == (True, "")
+    assert {"NOVO_A", "NOVO_B"} <= _frus(cliente())
+
+
+def test_compactar_mantem_ops_anexadas_por_outro_cliente(cliente):
+    a, b = cliente(), cliente()
+    assert a.registrar([journal.inserir({"UF": "DF", "FRU": "OP1"})])[0]
+    a.obter()
+    assert b.registrar([journal.inserir({"UF": "DF", "FRU": "OP2"})])[0]
+    # a compacta com o journal do cache (só OP1); OP2 tem de continuar no journal novo
+    assert a.compactar()
+    c = cliente()
+    assert {"OP1", "OP2"} <= _frus(c)
+    assert c.journal.valor.base == c.base.sha
+
+
+def test_registrar_depois_de_compactacao_de_outro_cliente(cliente):
+    a, b = cliente(), cliente()
+    assert b.registrar([journal.inserir({"UF": "DF", "FRU": "OP1"})])[0]
+    assert a.registrar([journal.inserir({"UF": "DF", "FRU": "OP2"})])[0]
+    assert a.compactar()
+    # b ainda tem no cache a base de antes da compactação
+    assert b.registrar([journal.inserir({"UF": "DF", "FRU": "OP3"})])[0]
+    c = cliente()
+    assert {"OP1", "OP2", "OP3"} <= _frus(c)
+    assert c.journal.valor.base == c.base.sha
+
+
+def test_journal_de_outra_base_nao_e_descartado(github, cliente):
+    repo, _url = github
+    repo.arquivos["SALDO_PECAS.journal.jsonl"] = journal.serializar(
+        "sha-que-nao-existe", [journal.atualizar("l0", {"FRU": "REAPLICADA"})]
+    )
+    a = cliente()
+    assert "REAPLICADA" in _frus(a)
+    assert a.registrar([journal.inserir({"UF": "DF", "FRU": "NOVA"})])[0]
+    assert a.journal.valor.base == a.base.sha
+    assert {"REAPLICADA", "NOVA"} <= _frus(cliente())
+
+
+def test_substituir_mescla_edicoes_de_dois_clientes(cliente):
+    a, b = cliente(), cliente()
+    _, snap_a = a.obter()
+    _, snap_b = b.obter()
+    df_a = engine.para_editar(snap_a.df)
+    df_a.loc["l0", "DATA_FIM"] = "01/01/2031"
+    assert a.substituir(df_a, snap_a) == (True, "", [])
+    df_b = engine.para_editar(snap_b.df)
+    df_b.loc["l1", "DATA_FIM"] = "01/01/2032"
+    assert b.substituir(df_b, snap_b) == (True, "", [])
+
+    _, snap = cliente().atualizar()
+    assert snap.df.loc["l0", "DATA_FIM"] == "01/01/2031"
+    assert snap.df.loc["l1", "DATA_FIM"] == "01/01/2032"
+
+
+def test_substituir_com_conflito_na_mesma_linha(cliente):
+    a, b = cliente(), cliente()
+    _, snap_a = a.obter()
+    _, snap_b = b.obter()
+    df_a = engine.para_editar(snap_a.df)
+    df_a.loc["l0", "DATA_FIM"] = "01/01/2031"
+    assert a.substituir(df_a, snap_a)[0]
+    df_b = engine.para_editar(snap_b.df)
+    df_b.loc["l0", "DATA_FIM"] = "01/01/2032"
+    ok, _erro, conflitos = b.substituir(df_b, snap_b)
+    assert not ok
+    assert conflitos == ["l0"]
+
+    _, snap = cliente().atualizar()
+    assert snap.df.loc["l0", "DATA_FIM"] == "01/01/2031"
+
+
+def test_substituir_mantem_ops_registradas_por_outro_cliente(cliente):
+    a, b = cliente(), cliente()
+    _, snap_a = a.obter()
+    assert b.registrar([journal.inserir({"UF": "AM", "FRU": "DO_JOURNAL"})])[0]
+    df_a = engine.para_editar(snap_a.df)
+    df_a.loc["l2", "STATUS"] = "VENCIDO"
+    assert a.substituir(df_a, snap_a)[0]
+
+    _, snap = cliente().atualizar()
+    assert "DO_JOURNAL" in set(snap.df["FRU"])
+    assert snap.df.loc["l2", "STATUS"] == "VENCIDO"
+
+
+def test_aplicar_remover_e_inserir_o_mesmo_id():
+    df = pd.DataFrame({"UF": ["DF", "DF"], "FRU": ["A", "B"], "DATA_FIM": ["01/01/24", "01/01/2030"]},
+                      index=pd.Index(["l0", "l3"], name=engine.COL_ID))
+    snap = engine.Snapshot(df)
+    # índice já calculado: aplicar() o atualiza em vez de reconstruir
+    assert list(snap.vencidas("2025-01-01").index) == ["l0"]
+    novo = journal.aplicar(snap, [journal.remover("l0"), journal.inserir({"UF": "DF", "FRU": "A2"}, id_linha="l0")])
+    assert sorted(novo.df.index) == ["l0", "l3"]
+    assert novo.df.loc["l0", "FRU"] == "A2"
+    assert pd.isna(novo.df.loc["l0", "DATA_FIM"])
+    assert list(novo.vencidas("2025-01-01").index) == []
@@ -0,0 +1,134 @@
+import pytest
+
+import armazenamento
+import engine
+import github_api
+import journal
+
+
+@pytest.fixture
+def por_uf(github, cliente):
+    """Planilha de exemplo já dividida por UF; devolve uma fábrica de clientes do layout por UF."""
+    _repo, url = github
+    _status, snap = cliente().obter()
+    assert armazenamento.planilha_por_uf(url, github_api.SessaoGitHub()).migrar(snap) == {"AM": 1, "DF": 2, "PA": 1}
+
+    def novo():
+        return armazenamento.planilha_por_uf(url, github_api.SessaoGitHub(), intervalo=300)
+    return novo
+
+
+def _ids(planilha, uf):
+    planilha.fatia(uf).atualizar()
+    _status, snap = planilha.obter(ufs=[uf])
+    return set(snap.df.index)
+
+
+def test_escolher_usa_o_layout_por_uf_depois_da_migracao(github, cliente, por_uf):
+    _repo, url = github
+    planilha = armazenamento.escolher(cliente(), armazenamento.planilha_por_uf(url, github_api.SessaoGitHub()))
+    assert planilha.ativa()
+    _status, snap = planilha.obter()
+    assert set(snap.df.index) == {"l0", "l1", "l2", "l3"}
+
+
+def test_registrar_move_linha_de_uf(por_uf):
+    a = por_uf()
+    assert a.registrar([journal.atualizar("l0", {"UF": "PA", "DATA_FIM": "01/01/2031"})]) == (True, "")
+
+    b = por_uf()
+    assert _ids(b, "DF") == {"l3"}
+    assert _ids(b, "PA") == {"l0", "l1"}
+    _status, snap = b.obter(ufs=["PA"])
+    assert snap.df.loc["l0", "FRU"] == "AAAAAAA"
+    assert snap.df.loc["l0", "DATA_FIM"] == "01/01/2031"
+
+
+def test_registrar_move_linha_para_uf_nova(por_uf):
+    a = por_uf()
+    assert a.registrar([journal.atualizar("l2", {"UF": "RJ"})])[0]
+
+    b = por_uf()
+    assert "RJ" in b.ufs()
+    assert _ids(b, "AM") == set()
+    assert _ids(b, "RJ") == {"l2"}
+
+
+def test_substituir_move_linha_de_uf(por_uf):
+    a = por_uf()
+    _status, snap = a.obter()
+    df = engine.para_editar(snap.df)
+    df.loc["l3", "UF"] = "AM"
+    assert a.substituir(df, snap) == (True, "", [])
+
+    b = por_uf()
+    assert _ids(b, "DF") == {"l0"}
+    assert _ids(b, "AM") == {"l2", "l3"}
+
+
+def test_substituir_mescla_com_registro_de_outro_cliente(por_uf):
+    a, b = por_uf(), por_uf()
+    _status, snap = a.obter()
+    assert b.registrar([journal.atualizar("l0", {"STATUS": "VENCIDO"})])[0]
+    df = engine.para_editar(snap.df)
+    df.loc["l3", "DATA_FIM"] = "01/01/2033"
+    assert a.substituir(df, snap) == (True, "", [])
+
+    c = por_uf()
+    c.fatia("DF").atualizar()
+    _status, snap_df = c.obter(ufs=["DF"])
+    assert snap_df.df.loc["l0", "STATUS"] == "VENCIDO"
+    assert snap_df.df.loc["l3", "DATA_FIM"] == "01/01/2033"
+
+
+def test_substituir_sem_concorrencia_nao_mescla(por_uf, monkeypatch):
+    def mesclar(*args):
+        raise AssertionError("mesclar_linhas chamado sem gravação concorrente")
+    monkeypatch.setattr(engine, "mesclar_linhas", mesclar)
+    assert armazenamento.recalcular_status(por_uf(), hoje="2025-01-01")[0]
+    _status, snap = por_uf().obter()
+    assert snap.df.loc["l0", "STATUS"] == "VENCIDO"
+
+
+def test_registrar_move_linha_e_volta_para_a_uf(por_uf):
+    a = por_uf()
+    assert a.registrar([journal.atualizar("l0", {"UF": "PA"})])[0]
+    assert a.registrar([journal.atualizar("l0", {"UF": "DF", "DATA_FIM": "01/01/2020"})])[0]
+
+    b = por_uf()
+    b.fatia("DF").atualizar()
+    _status, snap = b.obter(ufs=["DF"])
+    assert sorted(snap.df.index) == ["l0", "l3"]
+    assert list(snap.vencidas("2025-01-01").index) == ["l0"]
+    assert _ids(b, "PA") == {"l1"}
+
+
+def test_registrar_linha_sem_uf_vai_para_sem_uf(por_uf):
+    import particoes
+    a = por_uf()
+    assert a.registrar([journal.inserir({"UF": " ", "FRU": "SEMUF01", "DATA_FIM": "01/01/24"}, id_linha="s0")])[0]
+
+    b = por_uf()
+    assert particoes.SEM_UF in b.ufs()
+    assert _ids(b, particoes.SEM_UF) == {"s0"}
+    # e a linha sem UF entra nas consultas de vencimento de quem vê tudo
+    _status, tudo = b.obter()
+    assert "s0" in set(tudo.vencidas("2025-01-01").index)
+
+
+def test_obter_reaproveita_juncao_das_mesmas_ufs(por_uf):
+    a = por_uf()
+    _status, juncao = a.obter(ufs=["DF", "pa"])
+    assert sorted(juncao.df.index) == ["l0", "l1", "l3"]
+    assert a.obter(ufs=["PA", "DF"])[1] is juncao
+    assert a.registrar([journal.atualizar("l1", {"STATUS": "VENCIDO"})])[0]
+    _status, nova = a.obter(ufs=["DF", "PA"])
+    assert nova is not juncao
+    assert nova.df.loc["l1", "STATUS"] == "VENCIDO"
+
+
+def test_migrar_de_novo_nao_duplica(github, cliente, por_uf):
+    _repo, url = github
+    _status, snap = cliente().obter()
+    assert armazenamento.planilha_por_uf(url, github_api.SessaoGitHub()).migrar(snap) == {"AM": 1, "DF": 2, "PA": 1}
+    assert _ids(por_uf(), "DF") == {"l0", "l3"}
@@ -0,0 +1,29 @@
+# versoes.py
+# Versão por conjunto de dados (planilha, logs): invalida só o cache de quem foi gravado.
+import threading
+
+import metricas
+
+
+class VersoesDeDados:
+    """Um contador por conjunto de dados, compartilhado pelas sessões do processo.
+
+    Funções com st.cache_data recebem a versão atual do conjunto que leem como
+    argumento, então ela faz parte da chave do cache. Uma gravação chama
+    incrementar() só para o conjunto gravado: as entradas antigas dele deixam
+    de ser usadas (e saem por TTL/max_entries) e as dos outros continuam valendo.
+    """
+
+    def __init__(self):
+        self._versoes = {}
+        self._lock = threading.Lock()
+
+    def atual(self, nome):
+        with self._lock:
+            return self._versoes.get(nome, 0)
+
+    def incrementar(self, nome):
+        with self._lock:
+            versao = self._versoes[nome] = self._versoes.get(nome, 0) + 1
+        metricas.contar(f"versao.{nome}")
+        return versao